@@ -1 +1 @@
-from . import data, stream, precis, preproc, share
+from . import data, stream, precis, preproc, share, search
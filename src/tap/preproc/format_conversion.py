@@ -1,4 +1,9 @@
+from pathlib import Path
 import ffmpeg
+import numpy as np
+from ..share.audio import map_mono_audio
+
+__all__ = ["mp4_to_wav", "iter_decoded_blocks", "decode_mono_audio"]
 
 
 def mp4_to_wav(input_mp4, sr="16k", output_wav=None):
@@ -13,3 +18,58 @@ def mp4_to_wav(input_mp4, sr="16k", output_wav=None):
         filename=output_wav, ac=2, ar=sr, format="wav"
     ).run(quiet=True)
     return output_wav
+
+
+def iter_decoded_blocks(input_media, sr=16000, block_s=60):
+    """
+    Decode `input_media` (any file ffmpeg can read, e.g. an MP4) to mono float32 PCM
+    at sampling rate `sr`, yielding it in arrays of `block_s` seconds (the last may
+    be shorter) as ffmpeg produces them, read from its output pipe.
+    """
+    process = (
+        ffmpeg.input(filename=str(input_media))
+        .output("pipe:", ac=1, ar=sr, format="f32le", acodec="pcm_f32le")
+        # Only errors are logged, so the unread stderr pipe cannot fill up and block
+        .global_args("-loglevel", "error", "-nostats")
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+    block_bytes = int(block_s * sr) * np.dtype("<f4").itemsize
+    try:
+        while True:
+            block = process.stdout.read(block_bytes)
+            if not block:
+                break
+            yield np.frombuffer(block, dtype="<f4")
+    finally:
+        process.stdout.close()
+        _, stderr = process.communicate()
+    if process.returncode != 0:
+        raise ValueError(f"ffmpeg failed to decode {input_media}: {stderr.decode()}")
+
+
+def decode_mono_audio(input_media, sr=16000, output_wav=None):
+    """
+    Decode `input_media` to mono audio at sampling rate `sr`, without the stereo WAV
+    `mp4_to_wav` writes (which every later step downmixes anyway).
+
+    If `output_wav` is given, ffmpeg writes the audio there as a mono 16-bit WAV (a
+    quarter of the data of float32 stereo, and half of the 16-bit stereo WAV) under
+    a ".partial" suffix, renamed once complete so an interrupted decode never leaves
+    a truncated WAV, and it is returned as a read-only memory map of its int16
+    samples (see `map_mono_audio`). Otherwise the audio is decoded in a single
+    streaming pass (see `iter_decoded_blocks`) and returned as a float32 array.
+    """
+    if output_wav is None:
+        blocks = list(iter_decoded_blocks(input_media, sr=sr))
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype="<f4")
+    output_wav = Path(output_wav)
+    partial_wav = output_wav.with_name(output_wav.name + ".partial")
+    try:
+        ffmpeg.input(filename=str(input_media)).output(
+            filename=str(partial_wav), ac=1, ar=sr, format="wav", acodec="pcm_s16le"
+        ).overwrite_output().run(quiet=True)
+    except ffmpeg.Error as e:
+        partial_wav.unlink(missing_ok=True)
+        raise ValueError(f"ffmpeg failed to decode {input_media}: {e.stderr.decode()}")
+    partial_wav.replace(output_wav)
+    return map_mono_audio(output_wav, sr=sr)
@@ -1,21 +1,107 @@
+import errno
+import os
+import shutil
 from glob import glob
+from pathlib import Path
+import ffmpeg
 
 __all__ = []
 
+# Errors from kernel-side copying that mean "not supported here" (so fall back)
+UNSUPPORTED_COPY_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP}
+
+
+def copy_file_contents(src_f, dst_f, chunk_bytes=2**30):
+    """
+    Append the contents of the file object `src_f` (from its start) to `dst_f` (a
+    file or pipe), copying within the kernel with `os.copy_file_range` if possible,
+    else `os.sendfile`, else falling back to a buffered copy through userspace.
+    """
+    dst_f.flush()
+    src_fd, dst_fd = src_f.fileno(), dst_f.fileno()
+    size = os.fstat(src_fd).st_size
+    for kernel_copy in ("copy_file_range", "sendfile"):
+        copy = getattr(os, kernel_copy, None)
+        if copy is None:
+            continue
+        copied = 0
+        try:
+            while copied < size:
+                if kernel_copy == "copy_file_range":
+                    n = copy(src_fd, dst_fd, min(chunk_bytes, size - copied), copied)
+                else:
+                    n = copy(dst_fd, src_fd, copied, min(chunk_bytes, size - copied))
+                if n == 0:
+                    break  # the source was truncated while copying
+                copied += n
+            return copied
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_COPY_ERRNOS or copied:
+                raise
+    src_f.seek(0)
+    shutil.copyfileobj(src_f, dst_f)
+    dst_f.flush()
+    return size
+
+
 def gather_m4s_to_mp4(dash_file, m4s_files, output_mp4):
     """
-    Concatenate `.dash` and `.m4s` files using the system `cat` facility.
+    Concatenate `.dash` and `.m4s` files, copying each one within the kernel
+    (see `copy_file_contents`) rather than reading it into memory.
     """
     if output_mp4.exists():
         raise ValueError(f"{output_mp4=} already exists: risk of doubled output")
-    with open(output_mp4, "ab") as f:
+    with open(output_mp4, "wb") as f:
         for mpeg in [dash_file, *m4s_files]:
             with open(mpeg, "rb") as part_f:
-                f.write(part_f.read())
+                copy_file_contents(part_f, f)
+
 
-def gather_pulled_downloads(input_dir, output_dir):
+def gather_m4s_to_wav(dash_file, m4s_files, output_wav, sr="16k"):
     """
-    Gather MPEG stream files from input_dir into a single MP4 file in output_dir
+    Decode the `.dash` and `.m4s` files to a mono 16-bit WAV at sampling rate `sr`
+    (default 16 kHz, as for `decode_mono_audio`) without writing the intermediate
+    MP4: the parts are concatenated in order straight into the decoder's input pipe.
+    The WAV is written under a ".partial" suffix and renamed once complete.
+    """
+    output_wav = Path(output_wav)
+    if output_wav.exists():
+        raise ValueError(f"{output_wav=} already exists: risk of overwriting")
+    partial_wav = output_wav.with_name(output_wav.name + ".partial")
+    process = (
+        ffmpeg.input("pipe:", format="mp4")
+        .output(
+            filename=str(partial_wav), ac=1, ar=sr, format="wav", acodec="pcm_s16le"
+        )
+        .overwrite_output()
+        # Only errors are logged, so the stderr pipe cannot fill up while writing
+        .global_args("-loglevel", "error", "-nostats")
+        .run_async(pipe_stdin=True, pipe_stderr=True)
+    )
+    try:
+        for mpeg in [dash_file, *m4s_files]:
+            with open(mpeg, "rb") as part_f:
+                copy_file_contents(part_f, process.stdin)
+    except BrokenPipeError:
+        pass  # the decoder exited early: its error is reported below
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+    stderr_output = process.stderr.read()
+    process.wait()
+    if process.returncode != 0:
+        partial_wav.unlink(missing_ok=True)
+        msg = f"ffmpeg failed to decode the stream parts: {stderr_output.decode()}"
+        raise ValueError(msg)
+    partial_wav.replace(output_wav)
+    return output_wav
+
+
+def find_pulled_downloads(input_dir):
+    """
+    Return the single `.dash` file in `input_dir` and the `.m4s` files in order
     """
     dash_globstr = f"{input_dir.absolute() / '*.dash'}"
     dash_glob = glob(dash_globstr)
@@ -27,6 +113,22 @@ def gather_pulled_downloads(input_dir, output_dir):
         dash_file = dash_glob[0]
     m4s_globstr = f"{input_dir.absolute() / '*.m4s'}"
     m4s_files = sorted(glob(m4s_globstr))
-    output_mp4 = output_dir.absolute() / "output.mp4"
+    return dash_file, m4s_files
+
+
+def gather_pulled_downloads(
+    input_dir, output_dir, to_wav=False, sr="16k", filename_stem="output"
+):
+    """
+    Gather MPEG stream files from input_dir into a single MP4 file in output_dir,
+    or if `to_wav` is True, decode them directly into a single mono WAV file (at
+    sampling rate `sr`) without an intermediate MP4. The file is named after
+    `filename_stem`.
+    """
+    dash_file, m4s_files = find_pulled_downloads(input_dir)
+    if to_wav:
+        output_wav = output_dir.absolute() / f"{filename_stem}.wav"
+        return gather_m4s_to_wav(dash_file, m4s_files, output_wav, sr=sr)
+    output_mp4 = output_dir.absolute() / f"{filename_stem}.mp4"
     gather_m4s_to_mp4(dash_file, m4s_files, output_mp4)
     return output_mp4
@@ -1,2 +1,6 @@
 from .inaseg import *
+from .inaseg_service import *
+from .inaseg_parallel import *
+from .engines import *
 from .segment_extract import *
+from .envelope import *
@@ -0,0 +1,85 @@
+"""
+Time the construction of clip intervals from many pauses, and the splicing in of
+replacement rows, on synthetic episodes (run as `python -m tap.preproc.segment.benchmark`).
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+from sys import stderr
+import numpy as np
+import pandas as pd
+from .inaseg import clip_intervals_from_pause_stops
+from ...share.pandas import insert_replacement_rows
+
+__all__ = ["baseline_clip_stops", "synthetic_pause_stops", "benchmark_intervals"]
+
+
+def baseline_clip_stops(pause_range_df, min_s):
+    """
+    The row by row loop that `clip_intervals_from_pause_stops` replaces (without
+    its final clip handling), for comparison.
+    """
+    prev_end_pt = 0.0
+    clip_stops = []
+    for row_idx, row in pause_range_df.iterrows():
+        if row.stop - prev_end_pt > min_s:
+            clip_stops.append(row.stop)
+            prev_end_pt = row.stop
+    return clip_stops
+
+
+def synthetic_pause_stops(n_pauses, mean_gap_s=2.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.exponential(mean_gap_s, n_pauses))
+
+
+def benchmark_intervals(n_pauses, min_s=5.0, sr=16000, seed=0):
+    """
+    Return the time in milliseconds to build the clip intervals and names for
+    `n_pauses` pauses by the row by row baseline and by the array-based version,
+    and to splice in a replacement for every third clip.
+    """
+    pause_stops = synthetic_pause_stops(n_pauses, seed=seed)
+    pause_range_df = pd.DataFrame({"stop": pause_stops})
+    total_frames = int((pause_stops[-1] + 1) * sr)
+    timings = {"n_pauses": n_pauses}
+    t0 = perf_counter()
+    baseline_clip_stops(pause_range_df, min_s)
+    timings["baseline_ms"] = (perf_counter() - t0) * 1e3
+    t0 = perf_counter()
+    starts, stops = clip_intervals_from_pause_stops(pause_stops, min_s, total_frames, sr)
+    zfill_len = len(str(n_pauses))
+    outputs = [Path(f"output_{str(i).zfill(zfill_len)}.wav") for i in range(len(starts))]
+    timings["intervals_ms"] = (perf_counter() - t0) * 1e3
+    timings["n_clips"] = len(starts)
+    segment_time_df = pd.DataFrame(
+        {"input": "output.wav", "output": outputs, "start": starts, "stop": stops}
+    )
+    replacements = {
+        i: [("output.wav", out, start, start + 1.0) for start in range(4)]
+        for i, out in enumerate(outputs)
+        if i % 3 == 0
+    }
+    t0 = perf_counter()
+    insert_replacement_rows(segment_time_df, replacements)
+    timings["splice_ms"] = (perf_counter() - t0) * 1e3
+    return timings
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.strip())
+    parser.add_argument("n_pauses", nargs="*", type=int, default=[1000, 10000, 50000])
+    args = parser.parse_args(argv)
+    results = [benchmark_intervals(n) for n in args.n_pauses]
+    for r in results:
+        print(
+            f"{r['n_pauses']:>7} pauses -> {r['n_clips']:>6} clips: "
+            f"row by row {r['baseline_ms']:8.1f}ms, arrays {r['intervals_ms']:6.1f}ms, "
+            f"splicing {r['splice_ms']:6.1f}ms",
+            file=stderr,
+        )
+    return results
+
+
+if __name__ == "__main__":
+    main()
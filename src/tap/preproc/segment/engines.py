@@ -0,0 +1,152 @@
+from enum import Enum
+import numpy as np
+import pandas as pd
+import soundfile as sf
+from .envelope import EnergyEnvelope
+from .inaseg_service import inaseg_service
+from .inaseg_parallel import segment_in_chunks
+
+__all__ = [
+    "SegmentationEngine",
+    "InaSegEngine",
+    "EnergyVADEngine",
+    "SegmentationEngineEnum",
+    "get_segmentation_engine",
+]
+
+
+class SegmentationEngine:
+    """
+    Base class (must be subclassed with a `segment` method defined).
+
+    A segmentation engine labels the time ranges of an episode WAV, writing them
+    to a CSV of `labels`, `start`, and `stop` columns (the format `read_csv_out`
+    reads), in which pauses are labelled "noEnergy". The CSV is named after the
+    WAV, plus the engine's `csv_suffix` (so the outputs of different engines for
+    the same episode do not overwrite each other).
+
+    An engine that `reads_audio_file` reads the WAV itself; otherwise it may be
+    passed the episode's decoded mono `audio` (a memory map of its samples, see
+    `decode_mono_audio`) to read in place of the WAV.
+    """
+    csv_suffix = ""
+    reads_audio_file = False
+
+    def segment(self, input_wav, output_csv, audio=None):
+        raise NotImplementedError(f"{type(self).__name__} has no `segment` method")
+
+    @staticmethod
+    def write_csv(segments, output_csv):
+        "Write a list of `(label, start, stop)` tuples as `batch_process` does"
+        csv_df = pd.DataFrame.from_records(segments, columns=["labels", "start", "stop"])
+        csv_df.to_csv(output_csv, sep="\t", index=False)
+        return output_csv
+
+
+class InaSegEngine(SegmentationEngine):
+    """
+    inaSpeechSegmenter (speech/music/noise classification, with gender), run by the
+    long-lived `service`, or in chunks across `n_workers` processes if given (see
+    `segment_in_chunks`). Requires TensorFlow. Reads the audio from `input_wav`.
+    """
+    reads_audio_file = True
+
+    def __init__(self, service=inaseg_service, n_workers=None):
+        self.service = service
+        self.n_workers = n_workers
+
+    def segment(self, input_wav, output_csv, audio=None):
+        if self.n_workers is None:
+            self.service.segment([input_wav], [output_csv])
+        else:
+            segment_in_chunks(
+                input_wav,
+                output_csv,
+                n_workers=self.n_workers,
+                vad_engine=self.service.vad_engine,
+                detect_gender=self.service.detect_gender,
+            )
+        return output_csv
+
+
+class EnergyVADEngine(SegmentationEngine):
+    """
+    Energy-based pause detection in numpy, from the episode's `EnergyEnvelope`: no
+    TensorFlow import or network, so much faster to start and lighter on memory, but
+    only labels "noEnergy" (pauses) and "speech" (everything else, including music).
+
+    As in inaSpeechSegmenter's own energy activity detection, a hop is active if its
+    log energy exceeds the mean log energy of the episode plus `log(ratio)`, and the
+    activity is smoothed by a running majority vote over `smoothing_s` seconds.
+    Pauses shorter than `min_pause_s` are counted as speech.
+    """
+    csv_suffix = "_energy"
+
+    def __init__(self, ratio=0.03, smoothing_s=0.21, min_pause_s=0.2):
+        self.ratio = ratio
+        self.smoothing_s = smoothing_s
+        self.min_pause_s = min_pause_s
+
+    def label_runs(self, envelope):
+        """
+        Return the start and stop hop of each run of activity or inactivity, and
+        whether each run is active.
+        """
+        energy = np.square(np.asarray(envelope.values, dtype=np.float64))
+        log_energy = np.log(energy, out=np.full_like(energy, -np.inf), where=energy > 0)
+        finite = np.isfinite(log_energy)
+        if not finite.any():
+            return np.array([0]), np.array([len(energy)]), np.array([False])
+        threshold = log_energy[finite].mean() + np.log(self.ratio)
+        active = log_energy > threshold
+        window = max(int(self.smoothing_s * envelope.rate) | 1, 1)  # odd, like medfilt
+        votes = np.convolve(active, np.ones(window, dtype=int), mode="same")
+        active = votes > window // 2
+        changes = np.flatnonzero(np.diff(active.astype(np.int8))) + 1
+        starts = np.r_[0, changes]
+        stops = np.r_[changes, len(active)]
+        return starts, stops, active[starts]
+
+    def segments(self, input_wav, envelope=None, audio=None, sr=16000):
+        """
+        Return the `(label, start, stop)` segments of `input_wav`, computed from its
+        energy envelope (reloaded or computed in one pass if not passed). If the mono
+        `audio` (at sample rate `sr`) is passed, it is read in place of `input_wav`.
+        """
+        if envelope is None:
+            envelope = EnergyEnvelope.load_or_compute(input_wav, audio=audio, sr=sr)
+        if audio is None:
+            duration = sf.info(str(input_wav)).duration
+        else:
+            duration = len(audio) / sr
+        starts, stops, active = self.label_runs(envelope)
+        segments = []
+        for start, stop, is_active in zip(starts / envelope.rate, stops / envelope.rate, active):
+            stop = min(stop, duration)
+            is_pause = not is_active and stop - start >= self.min_pause_s
+            label = "noEnergy" if is_pause else "speech"
+            if segments and segments[-1][0] == label:
+                segments[-1] = (label, segments[-1][1], stop)
+            else:
+                segments.append((label, start, stop))
+        return segments
+
+    def segment(self, input_wav, output_csv, audio=None):
+        return self.write_csv(self.segments(input_wav, audio=audio), output_csv)
+
+
+class SegmentationEngineEnum(Enum):
+    inaseg = InaSegEngine
+    energy = EnergyVADEngine
+
+
+def get_segmentation_engine(engine="inaseg", **engine_opts):
+    """
+    Return `engine` if it is already a `SegmentationEngine`, else initialise the
+    engine named by `engine` (a member of `SegmentationEngineEnum`) with `engine_opts`.
+    """
+    if isinstance(engine, SegmentationEngine):
+        return engine
+    if engine not in SegmentationEngineEnum.__members__:
+        raise ValueError(f"{engine} is not a valid SegmentationEngineEnum")
+    return SegmentationEngineEnum[engine].value(**engine_opts)
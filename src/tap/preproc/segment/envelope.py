@@ -0,0 +1,153 @@
+import json
+import numpy as np
+import soundfile as sf
+from pathlib import Path
+from ...share.audio import get_track_length, pcm_to_float
+
+__all__ = [
+    "envelope_path",
+    "envelope_source",
+    "compute_energy_envelope",
+    "EnergyEnvelope",
+]
+
+
+def envelope_path(input_wav, hop_s=0.01):
+    """
+    Path of the energy envelope of `input_wav`, stored beside it (i.e. in the
+    episode directory, next to `segment_times.tsv`).
+    """
+    input_wav = Path(input_wav)
+    hop_ms = round(hop_s * 1000)
+    return input_wav.parent / f"{input_wav.stem}_envelope_{hop_ms}ms.npy"
+
+
+def envelope_source(input_wav, audio=None, sr=16000):
+    """
+    The number of frames, sample rate and modification time (if it is a file) of
+    the audio an envelope of `input_wav` is computed from (the mono `audio` at `sr`,
+    if passed), stored beside the envelope to tell if it is stale.
+    """
+    input_wav = Path(input_wav)
+    if audio is None:
+        frames, sr = get_track_length(input_wav, unit="frames")
+    else:
+        frames = len(audio)
+    mtime_ns = input_wav.stat().st_mtime_ns if input_wav.exists() else None
+    return {"frames": int(frames), "sr": int(sr), "mtime_ns": mtime_ns}
+
+
+def compute_energy_envelope(
+    input_wav, hop_s=0.01, hops_per_block=6000, audio=None, sr=16000
+):
+    """
+    Compute the mean absolute amplitude (mono, i.e. averaged over the channels too)
+    of each `hop_s` hop of `input_wav`, in a single streaming pass reading
+    `hops_per_block` hops at a time. Return a float32 array and the sample rate.
+
+    If the mono `audio` (at sample rate `sr`) is passed, it is read in place of
+    `input_wav` (e.g. a memory map of the decoded episode, see `decode_mono_audio`),
+    with integer PCM scaled as `soundfile` reads it.
+    """
+    if audio is None:
+        sr = sf.info(str(input_wav)).samplerate
+    hop_frames = int(hop_s * sr)
+    block_frames = hop_frames * hops_per_block
+    if audio is None:
+        blocks = sf.blocks(str(input_wav), blocksize=block_frames, always_2d=True)
+    else:
+        blocks = (
+            pcm_to_float(audio[i : i + block_frames])[:, None]
+            for i in range(0, len(audio), block_frames)
+        )
+    hop_means = []
+    for block in blocks:
+        abs_mono = np.abs(block).mean(axis=1)
+        n_full = len(abs_mono) // hop_frames
+        full_hops = abs_mono[: n_full * hop_frames].reshape(n_full, hop_frames)
+        hop_means.append(full_hops.mean(axis=1))
+        if len(abs_mono) > n_full * hop_frames:  # partial final hop
+            hop_means.append(abs_mono[n_full * hop_frames :].mean(keepdims=True))
+    if not hop_means:
+        return np.zeros(0, dtype=np.float32), sr
+    return np.concatenate(hop_means).astype(np.float32), sr
+
+
+class EnergyEnvelope:
+    """
+    Energy envelope of an episode: the mean absolute amplitude of each hop (by
+    default 10 ms, so about 2 orders of magnitude smaller than the audio itself),
+    queried by time interval in place of reading the audio for that interval.
+    """
+    def __init__(self, values, hop_frames, sr):
+        self.values = values
+        self.hop_frames = hop_frames
+        self.sr = sr
+
+    @property
+    def rate(self):
+        "Number of envelope values per second"
+        return self.sr / self.hop_frames
+
+    @classmethod
+    def load_or_compute(cls, input_wav, hop_s=0.01, audio=None, sr=16000):
+        """
+        Memory-map the envelope stored beside `input_wav`, computing and storing
+        it first if it does not exist yet (so worker processes always share the
+        one mapped file, rather than each receiving a copy of the values). If the
+        mono `audio` (at sample rate `sr`) is passed, it is read in place of
+        `input_wav`, which then need not exist.
+
+        The `envelope_source` it was computed from is stored beside it (as JSON,
+        written after the values), and it is computed again if that does not match
+        (e.g. the WAV was decoded again), so a stale envelope is never reused.
+        """
+        path = envelope_path(input_wav, hop_s=hop_s)
+        source_path = path.with_suffix(".json")
+        source = envelope_source(input_wav, audio=audio, sr=sr)
+        if not (path.exists() and source_path.exists()) or (
+            json.loads(source_path.read_text()) != source
+        ):
+            source_path.unlink(missing_ok=True)
+            values, _ = compute_energy_envelope(input_wav, hop_s=hop_s, audio=audio, sr=sr)
+            np.save(path, values)
+            source_path.write_text(json.dumps(source))
+        values = np.load(path, mmap_mode="r")
+        return cls(values, hop_frames=int(hop_s * source["sr"]), sr=source["sr"])
+
+    def section(self, start_time, stop_time):
+        """
+        The envelope values from `start_time` to `stop_time` (in seconds), indexed
+        the same way `read_audio_section` indexes frames.
+        """
+        start = int(self.rate * start_time)
+        n_values = int(self.rate * (stop_time - start_time))
+        return self.values[start : start + n_values]
+
+    def peak(self, start_time, stop_time):
+        "Highest value between the two times (0 if there are no values between them)"
+        section = self.section(start_time, stop_time)
+        return float(section.max()) if len(section) else 0.0
+
+    def peaks(self, ranges):
+        return [self.peak(start, stop) for start, stop in ranges]
+
+    def minimum(self, start_time, stop_time):
+        """
+        Time (in seconds) and value of the quietest hop between the two times.
+        """
+        section = self.section(start_time, stop_time)
+        i = section.argmin()
+        return int(self.rate * start_time + i) / self.rate, float(section[i])
+
+    def __getstate__(self):
+        # Pickle (e.g. to pass to worker processes) a memory map by its path, so each
+        # process maps the same file rather than receiving a copy of the values
+        if isinstance(self.values, np.memmap) and self.values.filename:
+            return {**self.__dict__, "values": Path(self.values.filename)}
+        return {**self.__dict__, "values": np.asarray(self.values)}
+
+    def __setstate__(self, state):
+        if isinstance(state["values"], Path):
+            state["values"] = np.load(state["values"], mmap_mode="r")
+        self.__dict__.update(state)
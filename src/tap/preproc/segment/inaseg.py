@@ -1,16 +1,17 @@
-import warnings
-from matplotlib import MatplotlibDeprecationWarning
 from pathlib import Path
 import pandas as pd
 import numpy as np
 from glob import glob
-from itertools import count
 from functools import partial
-from .segment_extract import read_audio_section, extract_as_clip
-from .naiveseg import pause_estimator#, estimate_pauses
+from collections import deque
+from .segment_extract import read_audio_section, write_clips_sequentially
+from .naiveseg import estimate_pauses_single_pass
+from .envelope import EnergyEnvelope
+from .inaseg_service import inaseg_service
+from .engines import InaSegEngine, get_segmentation_engine
 from ...share.audio import get_track_length
 from ...share.pandas import insert_replacement_rows
-from ...share.multiproc import batch_multiprocess, batch_multiprocess_with_dict_updates
+from ...share.multiproc import iter_multiprocess_results
 
 __all__ = [
     "run_inaseg",
@@ -19,34 +20,42 @@ __all__ = [
     "read_csv_out",
     "get_segment_times",
     "update_wav_counter",
+    "clip_intervals_from_pause_stops",
     "segment_intervals_from_ranges",
+    "export_segment_clips",
     "segment_pauses_and_spread",
 ]
 
 
-def run_inaseg(input_wav, csv_out_dir):
-    # load neural network into memory, may last few seconds
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", category=MatplotlibDeprecationWarning)
-        from inaSpeechSegmenter import Segmenter
-    seg = Segmenter(vad_engine="smn", detect_gender=True)
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        stem = input_wav.stem
-        input_files = [str(input_wav)]
-        output_files = [str(csv_out_dir / f"{stem}.csv")]
-        seg.batch_process(input_files, output_files, verbose=True)
+def run_inaseg(input_wav, csv_out_dir, service=inaseg_service, n_workers=None):
+    """
+    Segment `input_wav` into a CSV in `csv_out_dir` with the long-lived `service`
+    (default: the shared `inaseg_service`, so the network is loaded only once per
+    process rather than once per episode), returning the CSV path.
+
+    If `n_workers` is given, instead segment the file in overlapping chunks across
+    that many processes (see `segment_in_chunks`).
+    """
+    csv_path = get_csv_path(input_wav, csv_out_dir)
+    InaSegEngine(service=service, n_workers=n_workers).segment(input_wav, csv_path)
     #subprocess.run(["ina_speech_segmenter.py", "-i", input_wav, "-o", csv_out_dir])
-    return get_csv_path(input_wav, csv_out_dir)
+    return csv_path
 
 
-def get_csv_path(input_wav, csv_out_dir):
-    csv_name = input_wav.stem + ".csv"
+def get_csv_path(input_wav, csv_out_dir, csv_suffix=""):
+    csv_name = input_wav.stem + csv_suffix + ".csv"
     csv_path = Path(csv_out_dir) / csv_name
     return csv_path
 
 
-def calculate_peaks(segment_ranges, input_wav):
+def calculate_peaks(segment_ranges, input_wav, envelope=None):
+    """
+    Calculate the peak amplitude of each `(start, stop)` range in `segment_ranges`,
+    or if an `EnergyEnvelope` is passed as `envelope`, the peak of its (mean
+    absolute amplitude) hops within each range, without reading the audio.
+    """
+    if envelope is not None:
+        return envelope.peaks(segment_ranges)
     peak_amps = []
     for start, stop in segment_ranges:
         audio_section, sr = read_audio_section(input_wav, start, stop)
@@ -54,20 +63,23 @@ def calculate_peaks(segment_ranges, input_wav):
     return peak_amps
 
 
-def read_csv_out(input_wav, csv_out_dir, sep="\t", calculate_peaks=False):
+def read_csv_out(
+    input_wav, csv_out_dir, sep="\t", calculate_peaks=False, csv_suffix="",
+):
     """
-    Read an InaSeg output CSV file, optionally calculating the peak amplitudes
-    for each segment (default: do not calculate), return a pandas DataFrame
-    containing the segmentation time ranges.
+    Read an InaSeg output CSV file (or that of another segmentation engine, named
+    with its `csv_suffix`), optionally calculating the peak amplitudes for each
+    segment from the episode's energy envelope (default: do not calculate), return
+    a pandas DataFrame containing the segmentation time ranges.
     """
-    output_csv = get_csv_path(input_wav, csv_out_dir)
+    output_csv = get_csv_path(input_wav, csv_out_dir, csv_suffix=csv_suffix)
     csv = pd.read_csv(output_csv, sep=sep)
     csv["time_start"] = pd.to_datetime(csv.start, unit="s").dt.time
     csv["time_stop"] = pd.to_datetime(csv.stop, unit="s").dt.time
     csv["duration"] = csv.stop - csv.start
     if calculate_peaks:
         ranges = zip(csv.start, csv.stop)
-        csv["peak"] = calculate_peak_amplitudes(ranges, input_wav)
+        csv["peak"] = EnergyEnvelope.load_or_compute(input_wav).peaks(ranges)
     return csv
 
 
@@ -116,133 +128,235 @@ def update_wav_counter(clip_counter, zfill_len, out_dir, wav_stem, wav_suff):
     return output_wav
 
 
+def clip_intervals_from_pause_stops(pause_stops, min_s, total_frames, sr):
+    """
+    Calculate the clip intervals (as arrays of start and stop times in seconds) from
+    the stop times of the pauses: each clip runs from the end of the previous clip
+    to the end of the first pause that stops more than `min_s` after it, and the
+    final clip runs to the end of the track (`total_frames` at sample rate `sr`),
+    or if that would leave less than `min_s`, the final clip is extended to it.
+
+    Rather than stepping through every pause, the next clip's pause is found by
+    binary search over the running maximum of the stop times, so the cost scales
+    with the number of clips (times the log of the number of pauses).
+    """
+    pause_stops = np.asarray(pause_stops, dtype=float)
+    # Sorted even if the stops are not, and every pause skipped before the clip's
+    # pause stops earlier than the previous clip end (so is never a false match)
+    running_max = np.maximum.accumulate(pause_stops)
+    n_pauses = len(pause_stops)
+    clip_stops = []
+    prev_end_pt = 0.0
+    i = 0
+    while i < n_pauses:
+        # Search a little early, then step to the first pause satisfying the exact
+        # comparison (so float rounding in the search cannot skip a valid pause)
+        threshold = prev_end_pt + min_s - 1e-9
+        i += int(np.searchsorted(running_max[i:], threshold, side="left"))
+        while i < n_pauses and not pause_stops[i] - prev_end_pt > min_s:
+            i += 1
+        if i < n_pauses:
+            prev_end_pt = pause_stops[i]
+            clip_stops.append(prev_end_pt)
+            i += 1
+    clip_starts = [0.0, *clip_stops[:-1]]
+    if not clip_stops:
+        return np.array([0.0]), np.array([total_frames / sr])
+    if (total_frames / sr) - clip_stops[-1] > min_s:
+        # If remaining time span is greater than `min_s`, make it a new clip
+        clip_starts.append(int(clip_stops[-1] * sr) / sr)
+        clip_stops.append(total_frames / sr)
+    else:
+        # Modify the final clip so it extends to the final frame
+        clip_starts[-1] = int(clip_starts[-1] * sr) / sr
+        clip_stops[-1] = total_frames / sr
+    return np.array(clip_starts), np.array(clip_stops)
+
+
 def segment_intervals_from_ranges(
     input_wav, segment_range_df, segmented_out_dir, min_s, max_s, dry_run=False,
+    envelope=None, on_segment=None, audio=None,
 ):
     """
-    Segmentation of files from input file. The algorithm proceeds row by row through the
-    DataFrame `segment_range_df` and creates clips from the row start to the row end,
-    except when the duration indicated on the row is below `min_s`, in which case the
-    row's duration is instead accumulated as the `clip_duration`.
+    Segmentation of files from input file. Clips are created from the end of one
+    pause row of the DataFrame `segment_range_df` to the end of another, skipping
+    any pause that ends within `min_s` of the previous clip end, whose duration
+    is instead accumulated into the clip (see `clip_intervals_from_pause_stops`).
+
+    Clips longer than `max_s` are split further at estimated pauses, searched for in
+    the `EnergyEnvelope` passed as `envelope` if given (else in the audio itself).
+    A reloaded envelope is memory-mapped, and passed to the worker processes by
+    its path, so they all read the one copy of it in the page cache.
+
+    If given, `on_segment` is called with each final segment's row (of output, start,
+    stop and unit) in time order, as soon as it is final (and its clip written,
+    unless `dry_run`), so the segments can be used while later ones are computed.
+
+    If the episode's decoded mono `audio` (at 16 kHz) is passed, the clips are cut
+    from it in place of `input_wav`, which then only names them (and need not exist).
     """
-    prev_end_pt = 0.0
-    since_prev_end_pt = 0.0
-    clip_counter = count()  # uninitialised: becomes 0 on first `next` call
-    zfill_len = len(str(len(segment_range_df)))  # number of digits of row count
-    get_next_wav_name = partial(
-        update_wav_counter,
-        zfill_len=zfill_len,
-        out_dir=segmented_out_dir,
-        wav_stem=input_wav.stem,
-        wav_suff=input_wav.suffix,
-    )
-    extraction_params = []  # presumed parameter: `input_wav`
-    clip_unit = "s"
-    for row_idx, row in segment_range_df.iterrows():
-        since_prev_end_pt = row.stop - prev_end_pt
-        if since_prev_end_pt > min_s:
-            output_wav = get_next_wav_name(clip_counter)
-            clip_params = (input_wav, output_wav, prev_end_pt, row.stop, clip_unit)
-            extraction_params.append(clip_params)  # Postpone extraction (multiprocess)
-            prev_end_pt = row.stop
-    total_frames, sr = get_track_length(input_wav, unit="frames")
-    final_params = extraction_params[-1]
-    fin_in, fin_out, fin_start, fin_end, fin_unit = final_params
-    fin_unit = "frames"  # rather than "s"
-    if (total_frames / sr) - fin_end > min_s:
-        # If remaining time span is greater than `min_s`, make it a new clip
-        prev_end_pt = int(fin_end * sr)
-        output_wav = get_next_wav_name(clip_counter)
-        new_final_params = (fin_in, output_wav, prev_end_pt, total_frames, fin_unit)
-        extraction_params.append(new_final_params)
+    if audio is None:
+        total_frames, sr = get_track_length(input_wav, unit="frames")
     else:
-        # Modify final extraction_params entry so final clip extends to the final frame
-        new_fin_start = int(
-            fin_start * sr
-        )  # scale start of last clip from seconds to frames
-        final_params = (fin_in, fin_out, new_fin_start, total_frames, fin_unit)
-        extraction_params[-1] = final_params  # reassign the final entry
-    # Just revert the final row's unit to seconds rather than handling in pandas
-    final_params = extraction_params[-1]
-    if final_params[-1] == "frames":
-        s_fin_params = (*final_params[:2], final_params[2]/sr, final_params[3]/sr, "s")
-        extraction_params[-1] = s_fin_params
-    # Now switch to pandas and handle the naive segmentation pass to reduce to `max_s`
+        total_frames, sr = len(audio), 16000
+    clip_starts, clip_stops = clip_intervals_from_pause_stops(
+        segment_range_df.stop.to_numpy(), min_s, total_frames, sr
+    )
+    zfill_len = len(str(len(segment_range_df)))  # number of digits of row count
+    output_wavs = [
+        segmented_out_dir / f"{input_wav.stem}_{str(i).zfill(zfill_len)}{input_wav.suffix}"
+        for i in range(len(clip_starts))
+    ]
     segment_time_df = pd.DataFrame(
-        dict(zip("input output start stop unit".split(), zip(*extraction_params)))
+        {
+            "input": [input_wav] * len(clip_starts),
+            "output": output_wavs,
+            "start": clip_starts,
+            "stop": clip_stops,
+            "unit": "s",
+        }
+    )
+    # Now handle the naive segmentation pass to reduce to `max_s`
+    surplus_idx = np.flatnonzero((clip_stops - clip_starts) > max_s)
+    # Number of digits of the most rows a pause estimate can replace a clip with
+    # (splits are at least `min_s` apart, plus the initial and final intervals)
+    max_replacements = max(
+        (int((clip_stops[i] - clip_starts[i]) / min_s) + 3 for i in surplus_idx),
+        default=0,
     )
-    surplus_duration = (segment_time_df.stop - segment_time_df.start).gt(max_s)
-    if surplus_duration.any():
-        # Estimate a finer segmentation by estimating pauses based on amplitude minima
-        surplus_duration_intervals = segment_time_df[surplus_duration]
-        sdi = surplus_duration.copy()
-        pause_estimator_funcs = []
-        # Wrap returned value as a dict to update `segment_interval_replacements` with
-        #pause_estimator = lambda i, *args: {i: estimate_pauses(*args)}
-        for row_idx, row in surplus_duration_intervals.iterrows():
-            assert row.unit == "s" # All frame units must be replaced by now
-            estim_params = row.input, row.output, row.start, row.stop, min_s, max_s
-            f = partial(pause_estimator, row_idx, *estim_params)
-            pause_estimator_funcs.append(f)
-        # Multiprocess on all cores, updating `segment_interval_replacements` dict with
-        # each returned dict entry of `{row_idx: estimate_pauses(...)}`
-        segment_interval_replacements = batch_multiprocess_with_dict_updates(
-            function_list=pause_estimator_funcs,
-            tqdm_desc=f"Segmenting audio into clips between {min_s}s and {max_s}s",
+    replacement_zfill_len = len(str(max_replacements))
+    # Estimate a finer segmentation by estimating pauses based on amplitude minima
+    keyed_pause_estimators = (
+        (
+            row_idx,
+            partial(
+                estimate_pauses_single_pass,
+                input_wav,
+                output_wavs[row_idx],
+                clip_starts[row_idx],
+                clip_stops[row_idx],
+                min_s,
+                max_s,
+                envelope=envelope,
+            ),
         )
-        # Reorder by time, rename output wav with zfilled count, convert to intervals
-        reorder_rename_segment_replacements_as_intervals(segment_interval_replacements)
-        # Calculate interval ranges that correspond to the new segmentation ranges
+        for row_idx in surplus_idx
+    )
+    # Multiprocess on all cores, receiving each `(row_idx, estimated pauses)` in row
+    # order as soon as it (and every row before it) is done
+    pause_estimates = iter_multiprocess_results(
+        keyed_pause_estimators,
+        ordered=True,
+        total=len(surplus_idx),
+        tqdm_desc=f"Segmenting audio into clips between {min_s}s and {max_s}s",
+    )
+    segment_interval_replacements = {}
+
+    def iter_final_clips():
+        """
+        Yield the final clips in time order (as rows of output, start, stop and unit)
+        as soon as the pause estimates they depend on are done, collecting the
+        replacements in `segment_interval_replacements` as they arrive.
+        """
+        next_row = 0
+        for row_idx, pauses in pause_estimates:
+            # Reorder by time, rename output wav with zfilled count, make intervals
+            replacement_rows = reorder_rename_replacement_rows(
+                pauses, replacement_zfill_len
+            )
+            if replacement_rows:
+                segment_interval_replacements[row_idx] = replacement_rows
+            for i in range(next_row, row_idx):
+                yield output_wavs[i], clip_starts[i], clip_stops[i], "s"
+            if replacement_rows:
+                yield from (row[1:5] for row in replacement_rows)
+            else:
+                yield output_wavs[row_idx], clip_starts[row_idx], clip_stops[row_idx], "s"
+            next_row = row_idx + 1
+        for i in range(next_row, len(output_wavs)):
+            yield output_wavs[i], clip_starts[i], clip_stops[i], "s"
+
+    if dry_run:
+        if on_segment is None:
+            deque(iter_final_clips(), maxlen=0)  # Only the replacements are needed
+        else:
+            for clip in iter_final_clips():
+                on_segment(clip)
+    else:
+        # Write the clips in one pass, reaching each clip's section of the audio
+        # as soon as its pause estimate is done, while later ones are computed
+        write_clips_sequentially(
+            input_wav, iter_final_clips(), presorted=True, on_clip=on_segment, audio=audio
+        )
+    # Calculate interval ranges that correspond to the new segmentation ranges
+    if segment_interval_replacements:
         segment_time_df = insert_replacement_rows(
             segment_time_df, segment_interval_replacements
         )
-    # Re-assign extraction params with modifications indicating further segmentations
-    extraction_params = [*map(tuple, segment_time_df.itertuples(index=False))]
-    func_list = [
-        partial(extract_as_clip, *arg_tuple) for arg_tuple in extraction_params
-    ]
-    if not dry_run:
-        batch_multiprocess(func_list, tqdm_desc="Saving segment interval WAVs")
     return segment_time_df
 
 
-def reorder_rename_segment_replacements_as_intervals(replacements_dict):
+def export_segment_clips(segment_time_df, block_s=60, audio=None):
+    """
+    Write a WAV clip for each row of `segment_time_df` (as returned by
+    `segment_intervals_from_ranges`) to the path in its `output` column, reading
+    each input WAV once, sequentially, in blocks of `block_s` seconds (or cutting
+    them from the decoded mono `audio` of a single episode, if passed).
+    """
+    for input_wav, clip_df in segment_time_df.groupby("input", sort=False):
+        clip_rows = clip_df[["output", "start", "stop", "unit"]].itertuples(index=False)
+        write_clips_sequentially(input_wav, clip_rows, block_s=block_s, audio=audio)
+
+
+def reorder_rename_segment_replacements_as_intervals(replacements_dict, zfill_len=None):
     """
     Update the input dictionary in-place: reorder the replacement
-    values by the start time (the third entry) and 
+    values by the start time (the third entry) and convert them to intervals,
+    renaming them by their new order (see `reorder_rename_replacement_rows`).
     """
-    zf = len(str(max(map(len, replacements_dict.values()))))
-    unnecessary_replacements_idx = []
+    if zfill_len is None:
+        zfill_len = len(str(max(map(len, replacements_dict.values()))))
     for row_idx, replacement_rows in replacements_dict.items():
-        # A single replacement row doesn't need reordering, since initial and
-        # final intervals (NB: not segment ranges) already added, a single
-        # replacement row will have length 3
-        if len(replacement_rows) > 3: # initial and final intervals already added
-            # Sort replacement rows in chronological order
-            replacement_rows = sorted(replacement_rows, key=get_start_time)
+        reordered_rows = reorder_rename_replacement_rows(replacement_rows, zfill_len)
+        if reordered_rows:
+            replacements_dict[row_idx] = reordered_rows
+
+
+def reorder_rename_replacement_rows(replacement_rows, zfill_len):
+    """
+    Reorder the replacement rows of a single row (as estimated by `estimate_pauses`)
+    by the start time (the third entry), convert them from pause ranges to
+    intervals, and rename the output filenames by their new order, zfilled to
+    `zfill_len`. Return None if there are too few rows to need replacing.
+    """
+    # A single replacement row doesn't need reordering, since initial and
+    # final intervals (NB: not segment ranges) already added, a single
+    # replacement row will have length 3
+    if len(replacement_rows) > 3: # initial and final intervals already added
+        # Sort replacement rows in chronological order
+        replacement_rows = sorted(replacement_rows, key=get_start_time)
+    else:
+        return None
+    # The `replacement_rows` are capped by init/final intervals, which must
+    # be merged with the (2nd and penultimate) contiguous segment ranges
+    # All replacement rows between first and last are made into intervals
+    n_replacement_rows = len(replacement_rows)
+    for row_j, row in enumerate(replacement_rows):
+        replacement_rows = list(map(list, replacement_rows))
+        if row_j == 0:
+            # Pop the first interval and only keep its start time
+            # thus merging its interval range with the first segment
+            replacement_rows[0][2] = replacement_rows.pop(0)[2]
+        elif row_j == n_replacement_rows - 2:
+            # Pop the final interval and only keep its stop time
+            # thus merging its interval range with the last segment
+            replacement_rows[-1][3] = replacement_rows.pop()[3]
+            break # Avoid IndexError from pre-indexed iterator
         else:
-            unnecessary_replacements_idx.append(row_idx)
-            continue
-        # The `replacement_rows` are capped by init/final intervals, which must
-        # be merged with the (2nd and penultimate) contiguous segment ranges
-        # All replacement rows between first and last are made into intervals
-        n_replacement_rows = len(replacement_rows)
-        for row_j, row in enumerate(replacement_rows):
-            replacement_rows = list(map(list, replacement_rows))
-            if row_j == 0:
-                # Pop the first interval and only keep its start time
-                # thus merging its interval range with the first segment
-                replacement_rows[0][2] = replacement_rows.pop(0)[2]
-            elif row_j == n_replacement_rows - 2:
-                # Pop the final interval and only keep its stop time
-                # thus merging its interval range with the last segment
-                replacement_rows[-1][3] = replacement_rows.pop()[3]
-                break # Avoid IndexError from pre-indexed iterator
-            else:
-                # The current segment interval starts where the previous stopped
-                replacement_rows[row_j][2] = replacement_rows[row_j-1][3]
-        # Lastly, rename the output filenames to reflect the sorted order
-        replacements_dict[row_idx] = rename_by_order(replacement_rows, zf)
+            # The current segment interval starts where the previous stopped
+            replacement_rows[row_j][2] = replacement_rows[row_j-1][3]
+    # Lastly, rename the output filenames to reflect the sorted order
+    return rename_by_order(replacement_rows, zfill_len)
 
 ##### Helper functions for reorder_rename_segment_replacements_as_intervals #####
 
@@ -275,13 +389,21 @@ def renumber_filename(filename, i, zfill_len):
 ####################################################################################
 
 def segment_pauses_and_spread(
-    input_wav, csv_out_dir=None, segmented_out_dir=None, min_s=5., max_s=50.
+    input_wav, csv_out_dir=None, segmented_out_dir=None, min_s=5., max_s=50.,
+    write_clips=True, inaseg_workers=None, engine="inaseg", on_segment=None,
+    audio=None,
 ):
     """
     Calculate the audio segmentation of the `input_wav` file by calling
     `inaSpeechSegementer` (unfortunately this uses threads for batch processing
     and so does not use all cores at maximal efficiency), producing a TSV in
     `csv_out_dir` (by default this will be the parent directory of `input_wav`).
+    To use all cores, pass `inaseg_workers` to segment the file in overlapping
+    chunks across that many processes instead.
+
+    The `engine` is the name of a member of `SegmentationEngineEnum` or an instance
+    of a `SegmentationEngine`: pass `engine="energy"` to detect the pauses from the
+    audio energy alone, without TensorFlow or the inaSpeechSegmenter network.
 
     Once the segmentation is computed, go on to calculate the intervals inclusive of
     the gaps between these segments (from the start of the audio to the end of the
@@ -292,6 +414,19 @@ def segment_pauses_and_spread(
     (delete the directory or the wav files in it if this is not the case, e.g.
     if the computation was interrupted).
 
+    If `write_clips` is False, only the interval table is computed ("virtual
+    segments"): no clip WAVs are written, and transcription slices the episode's
+    audio by the interval times instead (clips can be written afterwards with
+    `export_segment_clips`).
+
+    Pass `on_segment` to receive each segment as soon as it is final (see
+    `segment_intervals_from_ranges`), e.g. to start transcribing the first segments
+    while the rest are still being segmented.
+
+    If the episode's decoded mono `audio` (at 16 kHz, e.g. a memory map of it from
+    `decode_mono_audio`) is passed, it is read in place of `input_wav`, which then
+    only names the outputs (and need not exist unless the engine `reads_audio_file`).
+
     Return the segment intervals (note: these are the start- and end-inclusive
     intervals as opposed to the segmentation ranges provided by `inaSpeechSegmenter`
     which only cover the 'pauses', the segment intervals cover the entire audio).
@@ -300,15 +435,27 @@ def segment_pauses_and_spread(
         csv_out_dir = input_wav.parent
     if segmented_out_dir is None:
         segmented_out_dir = csv_out_dir / "segmented"
-    dry_run = segmented_out_dir.exists() and glob(str(segmented_out_dir / "*.wav"))
+    dry_run = not write_clips or (
+        segmented_out_dir.exists() and glob(str(segmented_out_dir / "*.wav"))
+    )
     segmented_out_dir.mkdir(exist_ok=True)
-    if not get_csv_path(input_wav, csv_out_dir).exists():
-        csv_out = run_inaseg(input_wav, csv_out_dir)  # verbose/slow step
-    csv_df = read_csv_out(input_wav, csv_out_dir)
+    if engine == "inaseg":
+        engine = InaSegEngine(n_workers=inaseg_workers)
+    engine = get_segmentation_engine(engine)
+    if engine.reads_audio_file and not input_wav.exists():
+        raise ValueError(f"{type(engine).__name__} reads {input_wav}, which does not exist")
+    csv_path = get_csv_path(input_wav, csv_out_dir, csv_suffix=engine.csv_suffix)
+    if not csv_path.exists():
+        # slow step (for inaSpeechSegmenter)
+        engine.segment(input_wav, csv_path, audio=None if engine.reads_audio_file else audio)
+    csv_df = read_csv_out(input_wav, csv_out_dir, csv_suffix=engine.csv_suffix)
     pause_segments = get_segment_times(csv_df, breaks=True, no_energy=True)
+    # Computed in one pass (or reloaded) and shared by all further segmentation
+    envelope = EnergyEnvelope.load_or_compute(input_wav, audio=audio)
     # Create segmented output WAV files using all cores
     segment_intervals = segment_intervals_from_ranges(
         input_wav, pause_segments, segmented_out_dir, min_s=min_s, max_s=max_s, dry_run=dry_run,
+        envelope=envelope, on_segment=on_segment, audio=audio,
     )
     return segment_intervals, segmented_out_dir
 
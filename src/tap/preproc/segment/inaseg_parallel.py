@@ -0,0 +1,148 @@
+import multiprocessing as mp
+from pathlib import Path
+import pandas as pd
+from tqdm import tqdm
+from .inaseg_service import InaSegService
+from ...share.audio import get_track_length
+
+__all__ = [
+    "chunk_ranges",
+    "seam_time",
+    "merge_chunk_segments",
+    "segment_in_chunks",
+]
+
+_worker_service = {}  # The segmenter resident in this worker process
+
+# Segment boundaries are given in 20 ms frames: boundaries this close agree
+BOUNDARY_TOLERANCE_S = 0.04
+
+
+def chunk_ranges(duration, chunk_s=600.0, overlap_s=20.0):
+    """
+    Split `duration` seconds into `(start, stop)` chunks of `chunk_s` seconds, each
+    overlapping the next by `overlap_s` seconds (the final chunk may be shorter).
+    """
+    if not chunk_s > overlap_s >= 0:
+        raise ValueError(f"{chunk_s=} must be greater than {overlap_s=} (and >= 0)")
+    ranges = []
+    start = 0.0
+    while True:
+        stop = min(start + chunk_s, duration)
+        ranges.append((start, stop))
+        if stop >= duration:
+            return ranges
+        start = stop - overlap_s
+
+
+def seam_time(prev_segments, next_segments, overlap_start, overlap_stop):
+    """
+    Choose where to cut between two chunks' segments, within the overlap between
+    them: at the boundary both chunks agree on nearest the middle of the overlap if
+    there is one, else at the middle (the point furthest from either chunk's edge,
+    where each chunk has the least context).
+    """
+    middle = (overlap_start + overlap_stop) / 2
+    prev_bounds = [s for _, _, s in prev_segments if overlap_start < s < overlap_stop]
+    next_bounds = [s for _, s, _ in next_segments if overlap_start < s < overlap_stop]
+    agreed = [
+        b for b in prev_bounds
+        if any(abs(b - nb) <= BOUNDARY_TOLERANCE_S for nb in next_bounds)
+    ]
+    return min(agreed, key=lambda b: abs(b - middle), default=middle)
+
+
+def merge_chunk_segments(chunk_segments, ranges):
+    """
+    Merge the `(label, start, stop)` segment lists of each chunk in `ranges` into
+    one list covering the whole file: each chunk's segments are cut at the seams
+    (see `seam_time`) with its neighbours, and any segments either side of a seam
+    with the same label are joined into one.
+    """
+    cuts = [ranges[0][0]]
+    for i in range(len(ranges) - 1):
+        overlap = (ranges[i + 1][0], ranges[i][1])
+        cuts.append(seam_time(chunk_segments[i], chunk_segments[i + 1], *overlap))
+    cuts.append(ranges[-1][1])
+    merged = []
+    for segments, lo, hi in zip(chunk_segments, cuts[:-1], cuts[1:]):
+        for label, seg_start, seg_stop in segments:
+            start, stop = max(seg_start, lo), min(seg_stop, hi)
+            if merged:
+                start = max(start, merged[-1][2])
+            clipped = (start, stop) != (seg_start, seg_stop)
+            if stop - start <= (BOUNDARY_TOLERANCE_S if clipped else 0):
+                continue  # drop slivers left by cutting near a segment boundary
+            if (
+                merged
+                and merged[-1][0] == label
+                and abs(merged[-1][2] - start) <= BOUNDARY_TOLERANCE_S
+            ):
+                merged[-1] = (label, merged[-1][1], stop)
+            else:
+                merged.append((label, start, stop))
+    return merged
+
+
+def _init_worker(vad_engine, detect_gender, n_threads):
+    """
+    Pool initialiser: limit this worker's TensorFlow threads and load the network
+    into this process once.
+    """
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(n_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(n_threads)
+    service = InaSegService(vad_engine=vad_engine, detect_gender=detect_gender)
+    _worker_service["service"] = service.prewarm()
+
+
+def _segment_chunk(input_wav_and_range):
+    input_wav, (start, stop) = input_wav_and_range
+    return _worker_service["service"].segment_section(input_wav, start, stop)
+
+
+def segment_in_chunks(
+    input_wav,
+    output_csv,
+    n_workers=None,
+    chunk_s=600.0,
+    overlap_s=20.0,
+    threads_per_worker=2,
+    vad_engine="smn",
+    detect_gender=True,
+):
+    """
+    Segment `input_wav` in overlapping chunks of `chunk_s` seconds (see
+    `chunk_ranges`) across `n_workers` processes (default: the CPU cores divided by
+    `threads_per_worker`), each with its own copy of the network, then merge the
+    chunks' labels (see `merge_chunk_segments`) and write them to `output_csv` in the
+    same format as `batch_process` (which `read_csv_out` expects).
+
+    inaSpeechSegmenter alone only uses threads, and does not use all cores; this
+    way the wall time scales down with the number of cores (for files at least
+    `n_workers` chunks long). Return the CSV path.
+    """
+    duration, _ = get_track_length(input_wav, unit="s")
+    ranges = chunk_ranges(duration, chunk_s=chunk_s, overlap_s=overlap_s)
+    if n_workers is None:
+        n_workers = max(mp.cpu_count() // threads_per_worker, 1)
+    n_workers = min(n_workers, len(ranges))
+    # Spawn rather than fork: forking a process with TensorFlow threads is unsafe
+    with mp.get_context("spawn").Pool(
+        processes=n_workers,
+        initializer=_init_worker,
+        initargs=(vad_engine, detect_gender, threads_per_worker),
+    ) as pool:
+        tasks = [(str(input_wav), r) for r in ranges]
+        chunk_segments = list(
+            tqdm(
+                pool.imap(_segment_chunk, tasks),
+                total=len(tasks),
+                desc=f"Segmenting {len(tasks)} chunks on {n_workers} processes",
+            )
+        )
+    segments = merge_chunk_segments(chunk_segments, ranges)
+    csv_df = pd.DataFrame.from_records(segments, columns=["labels", "start", "stop"])
+    csv_df.to_csv(output_csv, sep="\t", index=False)
+    return Path(output_csv)
@@ -0,0 +1,153 @@
+import warnings
+from concurrent.futures import Future
+from pathlib import Path
+from queue import Queue, Empty
+from threading import Thread, Lock, RLock
+from matplotlib import MatplotlibDeprecationWarning
+
+__all__ = ["InaSegService", "inaseg_service"]
+
+
+class InaSegService:
+    """
+    Long-lived inaSpeechSegmenter: the network is loaded (along with the TensorFlow
+    import) on first use, then reused for every further WAV rather than reloaded
+    per episode.
+
+    WAVs can be segmented directly with `segment`, or submitted to a queue with
+    `submit` (which returns a `Future` of the output CSV path). A background thread
+    drains the queue, passing up to `batch_size` WAVs at a time to the segmenter's
+    `batch_process`, so a backfill of many episodes can be queued up front while
+    the episodes are still being downloaded.
+    """
+    def __init__(self, vad_engine="smn", detect_gender=True, batch_size=8):
+        if batch_size < 1:
+            raise ValueError(f"{batch_size=} must be at least 1")
+        self.vad_engine = vad_engine
+        self.detect_gender = detect_gender
+        self.batch_size = batch_size
+        self._segmenter = None
+        self._lock = RLock()  # only one batch runs through the network at once
+        self._queue = Queue()
+        self._worker = None
+        self._worker_lock = Lock()
+
+    @property
+    def segmenter(self):
+        with self._lock:
+            if self._segmenter is None:
+                # load neural network into memory, may last few seconds
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", category=MatplotlibDeprecationWarning)
+                    from inaSpeechSegmenter import Segmenter
+                self._segmenter = Segmenter(
+                    vad_engine=self.vad_engine, detect_gender=self.detect_gender
+                )
+            return self._segmenter
+
+    def prewarm(self):
+        "Load the network now rather than on first use"
+        self.segmenter
+        return self
+
+    def segment(self, input_wavs, output_csvs, verbose=True):
+        """
+        Segment each of `input_wavs` into the CSV at the corresponding path in
+        `output_csvs` (the format `read_csv_out` expects), in a single call to
+        `batch_process`. Raise a `ValueError` naming any WAVs whose CSV was not
+        written, else return the CSV paths.
+        """
+        input_wavs, output_csvs = list(map(Path, input_wavs)), list(map(Path, output_csvs))
+        if len(input_wavs) != len(output_csvs):
+            raise ValueError(f"{len(input_wavs)=} does not match {len(output_csvs)=}")
+        with self._lock:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                self.segmenter.batch_process(
+                    list(map(str, input_wavs)), list(map(str, output_csvs)), verbose=verbose
+                )
+        failed = [wav for wav, csv in zip(input_wavs, output_csvs) if not csv.exists()]
+        if failed:
+            raise ValueError(f"Segmentation failed for {failed}")
+        return output_csvs
+
+    def segment_section(self, input_wav, start_sec=None, stop_sec=None):
+        """
+        Segment the part of `input_wav` from `start_sec` to `stop_sec` (default: the
+        whole file), returning a list of `(label, start, stop)` tuples whose times
+        are relative to the start of the file (not the section).
+        """
+        with self._lock:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return self.segmenter(str(input_wav), start_sec=start_sec, stop_sec=stop_sec)
+
+    def submit(self, input_wav, output_csv):
+        """
+        Queue `input_wav` to be segmented into `output_csv`, starting the background
+        worker if it is not running, and return a `Future` of the CSV path.
+        """
+        future = Future()
+        self._queue.put((Path(input_wav), Path(output_csv), future))
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = Thread(target=self._drain_queue, daemon=True)
+                self._worker.start()
+        return future
+
+    def _drain_queue(self):
+        while True:
+            batch = [self._queue.get()]
+            if batch[0] is None:
+                return
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # stop after this batch
+                    break
+                batch.append(item)
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if batch:
+                self._process_batch(batch)
+
+    def _process_batch(self, batch):
+        input_wavs, output_csvs, _ = zip(*batch)
+        try:
+            self.segment(input_wavs, output_csvs, verbose=False)
+        except Exception as exc:
+            error = exc
+        else:
+            error = None
+        for input_wav, output_csv, future in batch:
+            # WAVs segmented before a failure in the batch still get their result
+            if output_csv.exists():
+                future.set_result(output_csv)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        "Stop the background worker once the WAVs already queued are segmented"
+        with self._worker_lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._queue.put(None)
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        loaded = "loaded" if self._segmenter is not None else "not loaded"
+        return (
+            f"{type(self).__name__}(vad_engine={self.vad_engine!r}, "
+            f"detect_gender={self.detect_gender}) [{loaded}]"
+        )
+
+
+inaseg_service = InaSegService()
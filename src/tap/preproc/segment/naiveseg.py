@@ -1,10 +1,17 @@
 import soundfile as sf
 import numpy as np
+from bisect import bisect_left, insort
 from .segment_extract import read_audio_section
 from tqdm import tqdm
 from sys import stderr
 
-__all__ = ["moving_average", "pause_estimator", "estimate_pauses"]
+__all__ = [
+    "moving_average",
+    "pause_estimator",
+    "estimate_pauses",
+    "BlockArgmin",
+    "estimate_pauses_single_pass",
+]
 
 
 def moving_average(values, window_size):
@@ -20,8 +27,8 @@ def moving_average(values, window_size):
     return ret[window_size - 1 :] / window_size
 
 
-def pause_estimator(row_idx, *args):
-    pauses = estimate_pauses(*args)
+def pause_estimator(row_idx, *args, **kwargs):
+    pauses = estimate_pauses_single_pass(*args, **kwargs)
     return {row_idx: pauses} if pauses else {}
 
 
@@ -193,3 +200,200 @@ def estimate_pauses(
         segment_frames.insert(0, init_segment)
         segment_frames.append(final_segment)
     return segment_frames
+
+
+class BlockArgmin:
+    """
+    Running argmin over a fixed array of `values` supporting in-place updates of
+    contiguous ranges, for repeatedly finding the (first) minimum as values change.
+
+    This is a sqrt-block decomposition (not a heap): the array is split into blocks
+    of `block_size` (default √n) with the minimum of each block cached. Finding the
+    minimum scans the block minima and then one block, O(n/b + b) = O(√n), and an
+    update of k values recomputes the minima of the blocks it touches, O(k + b).
+    """
+    def __init__(self, values, block_size=None):
+        self.values = values
+        n = len(values)
+        self.block_size = block_size or max(int(np.sqrt(n)), 1)
+        self.n_blocks = -(-n // self.block_size)
+        self.block_min = np.empty(self.n_blocks, dtype=values.dtype)
+        self.block_argmin = np.empty(self.n_blocks, dtype=np.int64)
+        self.refresh_blocks(0, self.n_blocks)
+
+    def refresh_blocks(self, first_block, stop_block):
+        bs = self.block_size
+        for b in range(first_block, stop_block):
+            block = self.values[b * bs : (b + 1) * bs]
+            i = block.argmin()
+            self.block_min[b] = block[i]
+            self.block_argmin[b] = b * bs + i
+
+    def update(self, start, new_values):
+        self.values[start : start + len(new_values)] = new_values
+        stop_block = -(-(start + len(new_values)) // self.block_size)
+        self.refresh_blocks(start // self.block_size, stop_block)
+
+    def argmin(self):
+        """
+        Index of the first occurrence of the minimum value (as `np.argmin`).
+        """
+        return int(self.block_argmin[self.block_min.argmin()])
+
+
+def estimate_pauses_single_pass(
+    audio_file,
+    output_wav,
+    start_time,
+    stop_time,
+    min_s=5.0,
+    max_s=60.0,
+    window_s=0.4,
+    verbose=False,
+    show_progress=False,
+    envelope=None,
+):
+    """
+    Equivalent to `estimate_pauses` (same arguments, same splits, same output),
+    without repeating work over the whole section on every iteration.
+
+    If an `EnergyEnvelope` of the audio is passed as `envelope`, its hops are used
+    in place of the audio frames (so the audio is not read at all, and the splits
+    are placed to the nearest hop rather than the nearest frame).
+
+    The amplitude bins are assigned once and summed over each `window_s` window
+    once. The window sums are kept in a `BlockArgmin` (sqrt-block decomposition),
+    from which the quietest window is taken. When the interval around a candidate
+    split is excluded (marked as max. amplitude), only the sums of the windows
+    overlapping it are recomputed. The accepted splits are kept sorted, so a
+    candidate is checked against its neighbours by bisection rather than against
+    every split. For n frames, m candidates tried, and k frames excluded around
+    each candidate (about `min_s` plus `window_s` of audio), the total cost is
+    O(n log n) once for the bin assignment plus O(√n + k) per candidate, i.e.
+    O(n log n + m(√n + k)), where `estimate_pauses` re-bins and re-sums the whole
+    section on every candidate, O(m n log n).
+    """
+    if min_s < 2 * window_s:
+        raise ValueError(
+            f"{window_s=} must not be greater than or equal to {0.5 * min_s=}"
+        )
+    if envelope is None:
+        audio_input, sr = read_audio_section(audio_file, start_time, stop_time)
+        abs_mono_audio = np.abs(audio_input).mean(axis=1)
+        del audio_input
+    else:
+        # Treat each hop as a frame: `sr` is then the number of hops per second
+        section = envelope.section(start_time, stop_time)
+        abs_mono_audio, sr = np.array(section, dtype=float), envelope.rate
+    min_sf = min_s * sr  # Convert unit of `min_s` from seconds to frames
+    half_min_sf = min_sf // 2
+    total_frames = len(abs_mono_audio)
+    bin_frame_width = int(window_s * sr)
+    n_bins = total_frames - bin_frame_width
+    max_amp = abs_mono_audio.max()
+    bins = np.linspace(0, max_amp, n_bins)
+    # Exclude `window_s` at either end, by pretending they have uniform max. amplitude
+    abs_mono_audio[:bin_frame_width] = abs_mono_audio[-bin_frame_width:] = max_amp
+    digitised = np.digitize(abs_mono_audio, bins)
+    del abs_mono_audio
+    max_digit = np.digitize([max_amp], bins)[0]
+    window_sums = window_sums_of(digitised, bin_frame_width)
+    n_windows = len(window_sums)
+    # A window entirely within excluded intervals has the highest possible sum
+    fully_excluded_sum = max_digit * bin_frame_width
+    queue = BlockArgmin(window_sums)
+    segment_frames = []
+    segment_stops = []  # kept sorted
+    n_new_segments = 0
+    max_segment_len = total_frames
+    if show_progress:
+        pbar = tqdm(
+            desc=f"Estimating naive segmentation for {output_wav.name}",
+            total=total_frames - min_sf,
+        )
+    while max_segment_len > (max_s * sr):
+        min_idx = queue.argmin()
+        if window_sums[min_idx] == fully_excluded_sum:
+            break  # No quiet window is left to split at
+        new_seg_start = min_idx / sr
+        new_seg_stop = new_seg_start + window_s
+        new_seg_stop_frame = int(new_seg_stop * sr)
+        # Ensure no existing segment plus/minus `min_sf` gets segmented
+        nearest = bisect_left(segment_stops, new_seg_stop_frame)
+        neighbours = segment_stops[max(nearest - 1, 0) : nearest + 1]
+        add_new_seg = all(abs(s - new_seg_stop_frame) >= min_sf for s in neighbours)
+        if verbose:
+            print(f"Trying new seg {min_idx} ({add_new_seg=})", file=stderr)
+        if add_new_seg:
+            new_output_filename = (
+                f"{output_wav.stem}_{n_new_segments+1}{output_wav.suffix}"
+            )
+            new_segment = [
+                audio_file,
+                output_wav.parent / new_output_filename,
+                new_seg_start,
+                new_seg_stop,
+                "s",
+                window_s,
+            ]
+            segment_frames.append(new_segment)
+            n_new_segments += 1
+            insort(segment_stops, new_seg_stop * sr)
+            segment_lengths = np.diff([0, *segment_stops, total_frames])
+            if show_progress:
+                pbar.update(max(max_segment_len - segment_lengths.max(), 0))
+            max_segment_len = segment_lengths.max()
+        # Exclude the interval around the candidate split from future candidates,
+        # and recompute the sums of only the windows that overlap it
+        exclude_on = int(max(new_seg_stop_frame - half_min_sf, 0))
+        exclude_off = int(new_seg_stop_frame + half_min_sf) + 1
+        digitised[exclude_on:exclude_off] = max_digit
+        first_window = max(exclude_on - bin_frame_width + 1, 0)
+        stop_window = min(exclude_off, n_windows)
+        queue.update(
+            first_window,
+            window_sums_of(
+                digitised[first_window : stop_window + bin_frame_width - 1],
+                bin_frame_width,
+            ),
+        )
+    if show_progress:
+        pbar.update(pbar.total - pbar.n)  # Finish
+    if verbose:
+        print(
+            f"Successfully estimated a segmentation of {len(segment_frames)} splits,"
+            f" max. segment length {max_segment_len / sr:.2f} seconds",
+            file=stderr,
+        )
+    for seg_i, segment in enumerate(segment_frames):
+        # Offset each time by start_time to go from relative to absolute count
+        segment[2] += start_time
+        segment[3] += start_time
+        segment_frames[seg_i] = tuple(segment)
+    if len(segment_frames) < 2:
+        # Do not permit single segment result (it's equivalent to what it would replace)
+        return []
+    # Lastly, add the start and end (no need to zfill: rewritten afterwards)
+    init_output, final_output = (
+        output_wav.parent / f"{output_wav.stem}_{n}{output_wav.suffix}"
+        for n in (0, n_new_segments + 1)
+    )
+    min_new_start = min(x[2] for x in segment_frames)
+    max_new_stop = max(x[3] for x in segment_frames)
+    segment_frames.insert(
+        0, [audio_file, init_output, start_time, min_new_start, "s", window_s]
+    )
+    segment_frames.append(
+        [audio_file, final_output, max_new_stop, stop_time, "s", window_s]
+    )
+    return segment_frames
+
+
+def window_sums_of(values, window_size):
+    """
+    Sum over each `window_size` run of `values` (the integer counterpart to
+    `moving_average`, with one sum per window start).
+    """
+    sums = np.cumsum(values, dtype=np.int64)
+    sums[window_size:] = sums[window_size:] - sums[:-window_size]
+    return sums[window_size - 1 :]
@@ -1,20 +1,37 @@
 import soundfile as sf
+from tqdm import tqdm
+from ...share.audio import open_mapped_wav
 
-__all__ = ["read_audio_section", "extract_as_clip"]
+__all__ = [
+    "read_audio_section",
+    "extract_as_clip",
+    "clip_frame_range",
+    "write_clips_sequentially",
+]
 
 def read_audio_section(filename, start_time, stop_time, unit="s"):
-    track = sf.SoundFile(filename)
-    if not track.seekable:
-        raise ValueError("Not compatible with seeking")
-    sr = track.samplerate
-    if unit == "s":
-        start_frame = int(sr * start_time)
-        frames_to_read = int(sr * (stop_time - start_time))
-    elif unit == "frames":
-        start_frame = start_time
-        frames_to_read = int(stop_time - start_time)
-    track.seek(start_frame) 
-    audio_section = track.read(frames_to_read)
+    """
+    Read the section of the audio file from `start_time` to `stop_time` (in seconds
+    or frames, per `unit`) as float64 samples, returning it with the sample rate.
+
+    PCM and float WAVs are served from a memory map of the file (its header parsed
+    once, see `open_mapped_wav`), so only the section is read from disk.
+    """
+    mapped = open_mapped_wav(filename)
+    if mapped is not None:
+        return mapped.read_section(start_time, stop_time, unit), mapped.sr
+    with sf.SoundFile(filename) as track:
+        if not track.seekable:
+            raise ValueError("Not compatible with seeking")
+        sr = track.samplerate
+        if unit == "s":
+            start_frame = int(sr * start_time)
+            frames_to_read = int(sr * (stop_time - start_time))
+        elif unit == "frames":
+            start_frame = start_time
+            frames_to_read = int(stop_time - start_time)
+        track.seek(start_frame) 
+        audio_section = track.read(frames_to_read)
     return audio_section, sr
 
 def extract_as_clip(input_filename, output_filename, start_time, stop_time, unit="s"):
@@ -23,3 +40,125 @@ def extract_as_clip(input_filename, output_filename, start_time, stop_time, unit
     audio_extract, sr = read_audio_section(input_filename, start_time, stop_time, unit)
     sf.write(output_filename, audio_extract, sr)
     return
+
+def clip_frame_range(start_time, stop_time, sr, unit="s"):
+    """
+    The start and stop frame of a clip, computed the same way as `read_audio_section`
+    """
+    if unit == "s":
+        start_frame = int(sr * start_time)
+        frames_to_read = int(sr * (stop_time - start_time))
+    elif unit == "frames":
+        start_frame = int(start_time)
+        frames_to_read = int(stop_time - start_time)
+    else:
+        raise ValueError(f"{unit=} is not one of 's' or 'frames'")
+    return start_frame, start_frame + frames_to_read
+
+class _ArrayTrack:
+    "Sequential reads of in-memory audio, as from a `SoundFile` opened to read it"
+    def __init__(self, audio):
+        self.audio = audio
+        self.position = 0
+
+    def tell(self):
+        return self.position
+
+    def seek(self, frame):
+        self.position = min(frame, len(self.audio))
+        return self.position
+
+    def read(self, frames):
+        block = self.audio[self.position : self.position + frames]
+        self.position += len(block)
+        return block
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+def write_clips_sequentially(
+    input_filename, clips, block_s=60, presorted=False,
+    tqdm_desc="Saving segment interval WAVs", on_clip=None, audio=None, sr=16000,
+):
+    """
+    Write the `clips` of `input_filename` (an iterable of rows of output filename,
+    start, stop, and optionally unit, as for `extract_as_clip`), reading the input
+    in a single sequential pass of `block_s` second blocks: each block is written
+    to the clips it overlaps, whose output files are opened when the pass reaches
+    their start and closed at their stop (so only the clips spanning the current
+    block are open at once). Show a progress bar unless `tqdm_desc` is None.
+
+    If `presorted` (i.e. the clips are already in order of start time), `clips` is
+    consumed lazily, only as the pass reaches each clip, so it may be a generator
+    of clips still being computed.
+
+    If given, `on_clip` is called with each clip's row as soon as its file has been
+    written (so in order of stop time).
+
+    If the mono `audio` (at sample rate `sr`) is passed, it is read in place of
+    `input_filename` (e.g. a memory map of the decoded episode).
+    """
+    if audio is None:
+        info = sf.info(str(input_filename))
+        sr, n_frames, channels = info.samplerate, info.frames, info.channels
+    else:
+        n_frames, channels = len(audio), 1
+
+    def iter_clip_ranges():
+        for clip in clips:
+            output_filename, start_time, stop_time, *unit = clip
+            if not stop_time > start_time:
+                raise ValueError(f"{stop_time=} does not indicate a time after {start_time=}")
+            start_frame, stop_frame = clip_frame_range(start_time, stop_time, sr, *unit)
+            stop_frame = min(stop_frame, n_frames)
+            yield start_frame, stop_frame, output_filename, clip
+
+    clip_ranges = iter_clip_ranges()
+    if not presorted:
+        clip_ranges = iter(sorted(clip_ranges, key=lambda clip: clip[:2]))
+    next_clip = next(clip_ranges, None)
+    open_clips = []  # (start frame, stop frame, SoundFile, row) of clips being written
+    block_frames = int(block_s * sr)
+    pbar = None if tqdm_desc is None else tqdm(desc=tqdm_desc)
+    try:
+        track = sf.SoundFile(str(input_filename)) if audio is None else _ArrayTrack(audio)
+        with track:
+            while next_clip is not None or open_clips:
+                block_start = track.tell()
+                if not open_clips:
+                    # Skip the audio before the next clip rather than reading it
+                    block_start = track.seek(next_clip[0])
+                block = track.read(block_frames)
+                block_stop = block_start + len(block)
+                while next_clip is not None and (
+                    next_clip[0] < block_stop or len(block) == 0
+                ):
+                    start_frame, stop_frame, output_filename, clip = next_clip
+                    writer = sf.SoundFile(
+                        str(output_filename), "w", samplerate=sr, channels=channels
+                    )
+                    open_clips.append((start_frame, stop_frame, writer, clip))
+                    next_clip = next(clip_ranges, None)
+                still_open = []
+                for start_frame, stop_frame, writer, clip in open_clips:
+                    lo = max(start_frame, block_start) - block_start
+                    hi = min(stop_frame, block_stop) - block_start
+                    if hi > lo:
+                        writer.write(block[lo:hi])
+                    if stop_frame <= block_stop or len(block) == 0:
+                        writer.close()
+                        if pbar is not None:
+                            pbar.update()
+                        if on_clip is not None:
+                            on_clip(clip)
+                    else:
+                        still_open.append((start_frame, stop_frame, writer, clip))
+                open_clips = still_open
+    finally:
+        for _, _, writer, _ in open_clips:
+            writer.close()
+        if pbar is not None:
+            pbar.close()
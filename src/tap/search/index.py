@@ -0,0 +1,401 @@
+from ..data.store.broadcasters import _dir_path as bc_store_dir
+from ..stream.transcript_store import TranscriptStore
+from beeb.nav.cat.catalogue import ProgrammeCatalogue
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date as cal_date
+from functools import lru_cache
+from pathlib import Path
+from sys import stderr
+import re
+import sqlite3
+import numpy as np
+import pandas as pd
+
+__all__ = [
+    "tokenise", "programme_title", "episode_metadata", "SearchIndex", "search_index",
+]
+
+SCHEMA_VERSION = 2  # An index made with an earlier schema is dropped and rebuilt
+METADATA_FIELDS = ["broadcaster", "station", "programme", "programme_pid", "date"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS episodes (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    broadcaster TEXT,
+    station TEXT,
+    programme TEXT,
+    programme_pid TEXT,
+    date TEXT,
+    audio TEXT,
+    signature TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    episode_id INTEGER NOT NULL REFERENCES episodes(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    start REAL,
+    stop REAL,
+    n_terms INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_by_episode ON segments(episode_id);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL REFERENCES terms(id),
+    segment_id INTEGER NOT NULL REFERENCES segments(id) ON DELETE CASCADE,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term_id, segment_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_segment ON postings(segment_id);
+"""
+
+
+def tokenise(text):
+    "The lower case words of `text` (keeping apostrophes within words)"
+    return re.findall(r"\w+(?:'\w+)*", text.lower())
+
+
+@lru_cache
+def _station_catalogue(station):
+    return ProgrammeCatalogue.regenerate_from_db(station, with_genre=False)
+
+
+def programme_title(station, programme_pid):
+    """
+    The title of the programme with the PID `programme_pid` on `station` (as it
+    would be passed to `Stream`), from beeb's stored programme catalogue, or None if
+    it is not in the catalogue.
+    """
+    try:
+        return _station_catalogue(station).get(programme_pid)
+    except Exception:
+        return None  # No catalogue stored for the station
+
+
+def episode_metadata(episode_dir, root_dir=bc_store_dir):
+    """
+    The broadcaster, station, programme title and PID, and date of the episode
+    stored in `episode_dir`, parsed from its path under `root_dir` (laid out as
+    `broadcaster/station/programme_pid/year/month/day`), as a dict (with None for
+    any part that cannot be parsed). The title is looked up by `programme_title`,
+    falling back to the PID.
+    """
+    try:
+        parts = Path(episode_dir).relative_to(root_dir).parts
+    except ValueError:
+        parts = Path(episode_dir).parts[-6:]
+    metadata = dict.fromkeys(METADATA_FIELDS)
+    if len(parts) >= 6:
+        broadcaster, station, pid = parts[0], parts[1], "/".join(parts[2:-3])
+        metadata.update(
+            broadcaster=broadcaster,
+            station=station,
+            programme=programme_title(station, pid) or pid,
+            programme_pid=pid,
+        )
+        try:
+            y, m, d = (int(re.match(r"\d+", p).group()) for p in parts[-3:])
+            metadata["date"] = cal_date(y, m, d).isoformat()
+        except (AttributeError, ValueError):
+            pass  # not a date path
+    return metadata
+
+
+class SearchIndex:
+    """
+    An on-disk inverted index (a SQLite database at `db_path`) of the transcripts
+    of the episodes stored under `root_dir`, mapping each term to its postings: the
+    segments it occurs in (with their episode's programme and date, and their start
+    and stop times in the episode audio) and how often.
+
+    Episodes are indexed from their `TranscriptStore`, and only re-indexed when the
+    store has changed since (by its index file's modification time and size), so
+    `update` only touches newly transcribed episodes. Each call uses its own
+    connection, so the index can be updated from several threads or processes.
+
+    `search` ranks the segments matching a query by BM25 (with parameters `k1`
+    and `b`), returning the hits with the audio file and time offsets to play them.
+    """
+    def __init__(self, db_path, root_dir=bc_store_dir, k1=1.2, b=0.75):
+        self.db_path = Path(db_path)
+        self.root_dir = Path(root_dir)
+        self.k1 = k1
+        self.b = b
+
+    @contextmanager
+    def connect(self):
+        "A connection to the index (creating it if needed), committed on exit"
+        connection = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            connection.execute("PRAGMA foreign_keys = ON")
+            connection.execute("PRAGMA journal_mode = WAL")  # readers don't block writers
+            [(version,)] = connection.execute("PRAGMA user_version")
+            if version < SCHEMA_VERSION:
+                # The index is derived from the stores, so `update` rebuilds it
+                connection.executescript(
+                    "DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS terms; "
+                    "DROP TABLE IF EXISTS segments; DROP TABLE IF EXISTS episodes; "
+                    f"PRAGMA user_version = {SCHEMA_VERSION};"
+                )
+            connection.executescript(SCHEMA)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def signature(store):
+        "Identifies the state of a transcript store (changed by any append)"
+        stat = store.index_path.stat()
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def add_episode(self, episode_dir, metadata=None, force=False):
+        """
+        Index the transcripts of the episode stored in `episode_dir`, replacing any
+        earlier postings for it, unless its store is unchanged since it was last
+        indexed (and not `force`). Return True if it was (re-)indexed.
+
+        The episode's broadcaster, station, programme (title and PID) and date are
+        parsed from its path (see `episode_metadata`) unless given in the `metadata`
+        dict.
+        """
+        episode_dir = Path(episode_dir).absolute()
+        store = TranscriptStore(episode_dir)
+        if not store.exists:
+            raise ValueError(f"No transcript store in {episode_dir}")
+        signature = self.signature(store)
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT id, signature FROM episodes WHERE path = ?", (str(episode_dir),)
+            ).fetchone()
+            if row is not None and row[1] == signature and not force:
+                return False
+            if row is not None:
+                connection.execute("DELETE FROM episodes WHERE id = ?", (row[0],))
+            self._insert_episode(connection, episode_dir, store, signature, metadata)
+        return True
+
+    def _insert_episode(self, connection, episode_dir, store, signature, metadata=None):
+        transcripts = store.read()
+        timings = self._segment_times(episode_dir)
+        audio = None
+        if timings is not None:
+            audio = str(timings.input.iloc[0]) if len(timings) else None
+            # Fill in any times the store lacks (e.g. migrated without them)
+            missing = transcripts.start.isna()
+            if missing.any():
+                times = timings.set_index("segment").reindex(transcripts.index[missing])
+                transcripts.loc[missing, "start"] = times.start.to_numpy()
+                transcripts.loc[missing, "stop"] = times.stop.to_numpy()
+        metadata = {**episode_metadata(episode_dir, self.root_dir), **(metadata or {})}
+        cursor = connection.execute(
+            "INSERT INTO episodes (path, broadcaster, station, programme, programme_pid, "
+            "date, audio, signature) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                str(episode_dir),
+                *(metadata[k] for k in METADATA_FIELDS),
+                audio,
+                signature,
+            ),
+        )
+        episode_id = cursor.lastrowid
+        term_counts = [Counter(tokenise(t)) for t in transcripts.transcript]
+        connection.executemany(
+            "INSERT INTO segments (episode_id, name, start, stop, n_terms) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (episode_id, name, *(None if np.isnan(t) else float(t) for t in times), n)
+                for name, *times, n in zip(
+                    transcripts.index,
+                    transcripts.start.astype(float),
+                    transcripts.stop.astype(float),
+                    [sum(c.values()) for c in term_counts],
+                )
+            ),
+        )
+        segment_ids = [
+            segment_id
+            for (segment_id,) in connection.execute(
+                "SELECT id FROM segments WHERE episode_id = ? ORDER BY id", (episode_id,)
+            )
+        ]
+        term_ids = self._term_ids(connection, set().union(*term_counts))
+        connection.executemany(
+            "INSERT INTO postings (term_id, segment_id, tf) VALUES (?, ?, ?)",
+            (
+                (term_ids[term], segment_id, tf)
+                for segment_id, counts in zip(segment_ids, term_counts)
+                for term, tf in counts.items()
+            ),
+        )
+
+    @staticmethod
+    def _term_ids(connection, terms, chunk_size=500):
+        "The ID of each of `terms`, adding any not yet in the index"
+        terms = list(terms)
+        connection.executemany(
+            "INSERT OR IGNORE INTO terms (term) VALUES (?)", ((t,) for t in terms)
+        )
+        term_ids = {}
+        for i in range(0, len(terms), chunk_size):
+            chunk = terms[i : i + chunk_size]
+            term_ids.update(
+                connection.execute(
+                    f"SELECT term, id FROM terms WHERE term IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+            )
+        return term_ids
+
+    @staticmethod
+    def _segment_times(episode_dir):
+        "The episode's segment input, name, start and stop, if it has a TSV of them"
+        txn_tsv = episode_dir / "segment_times.tsv"
+        if not txn_tsv.exists():
+            return None
+        timings = pd.read_csv(txn_tsv, sep="\t", quoting=2)
+        timings["segment"] = [Path(output).stem for output in timings.output]
+        return timings[["input", "segment", "start", "stop"]]
+
+    def update(self, force=False):
+        """
+        Index every episode with a transcript store under `root_dir` that is new or
+        has changed since it was last indexed, and drop episodes whose stores have
+        been deleted. Return the number of episodes (re-)indexed.
+        """
+        episode_dirs = {
+            str(store_index.parent.absolute())
+            for store_index in self.root_dir.rglob(TranscriptStore(".").index_path.name)
+        }
+        with self.connect() as connection:
+            indexed = dict(connection.execute("SELECT path, id FROM episodes"))
+            for path in indexed.keys() - episode_dirs:
+                connection.execute("DELETE FROM episodes WHERE id = ?", (indexed[path],))
+        n_indexed = 0
+        for episode_dir in sorted(episode_dirs):
+            try:
+                n_indexed += self.add_episode(episode_dir, force=force)
+            except Exception as e:
+                print(f"Failed to index {episode_dir}: {e!r}", file=stderr)
+        return n_indexed
+
+    def search(
+        self,
+        query,
+        limit=20,
+        require_all=False,
+        programme=None,
+        station=None,
+        date_from=None,
+        date_to=None,
+        with_text=True,
+    ):
+        """
+        Return the `limit` best matching segments for the terms of `query` (any of
+        them, or all if `require_all`), optionally only of a `programme` (its title,
+        in any case, e.g. "Today", or its PID) or `station` or between dates
+        (`datetime.date` objects or ISO strings, inclusive), as a DataFrame of the
+        score, episode, segment name, `audio` file, and the segment's `start` and
+        `stop` offsets in it (in seconds), best first. If `with_text`, the segment's
+        transcript is included (read on demand from its store).
+        """
+        terms = sorted(set(tokenise(query)))
+        columns = [
+            "score", "broadcaster", "station", "programme", "programme_pid", "date",
+            "segment", "start", "stop", "audio", "episode_dir",
+        ]
+        empty = pd.DataFrame(columns=[*columns, "transcript"] if with_text else columns)
+        if not terms:
+            return empty
+        filters, params = [], []
+        if programme is not None:
+            filters.append("(e.programme = ? COLLATE NOCASE OR e.programme_pid = ?)")
+            params.extend([programme, programme])
+        if station is not None:
+            filters.append("e.station = ?")
+            params.append(station)
+        if date_from is not None:
+            filters.append("e.date >= ?")
+            params.append(str(date_from))
+        if date_to is not None:
+            filters.append("e.date <= ?")
+            params.append(str(date_to))
+        where = "".join(f" AND {f}" for f in filters)
+        placeholders = ", ".join("?" * len(terms))
+        with self.connect() as connection:
+            n_segments, mean_terms = connection.execute(
+                "SELECT COUNT(*), AVG(n_terms) FROM segments"
+            ).fetchone()
+            doc_freqs = dict(
+                connection.execute(
+                    "SELECT t.term, COUNT(*) FROM terms t "
+                    "JOIN postings p ON p.term_id = t.id "
+                    f"WHERE t.term IN ({placeholders}) GROUP BY t.term",
+                    terms,
+                )
+            )
+            postings = pd.read_sql_query(
+                "SELECT t.term, p.tf, s.id AS segment_id, s.n_terms FROM terms t "
+                "JOIN postings p ON p.term_id = t.id "
+                "JOIN segments s ON s.id = p.segment_id "
+                "JOIN episodes e ON e.id = s.episode_id "
+                f"WHERE t.term IN ({placeholders}){where}",
+                connection,
+                params=[*terms, *params],
+            )
+            if postings.empty:
+                return empty
+            idf = {
+                term: np.log(1 + (n_segments - df + 0.5) / (df + 0.5))
+                for term, df in doc_freqs.items()
+            }
+            norm = self.k1 * (1 - self.b + self.b * postings.n_terms / (mean_terms or 1))
+            postings["score"] = (
+                postings.term.map(idf) * postings.tf * (self.k1 + 1) / (postings.tf + norm)
+            )
+            scores = postings.groupby("segment_id").agg(
+                score=("score", "sum"), n_matched=("term", "nunique")
+            )
+            if require_all:
+                scores = scores[scores.n_matched == len(terms)]
+                if scores.empty:
+                    return empty
+            top = scores.nlargest(limit, "score")
+            segment_ids = [int(i) for i in top.index]
+            hits = pd.read_sql_query(
+                "SELECT s.id AS segment_id, e.broadcaster, e.station, e.programme, "
+                "e.programme_pid, e.date, "
+                "s.name AS segment, s.start, s.stop, e.audio, e.path AS episode_dir "
+                "FROM segments s JOIN episodes e ON e.id = s.episode_id "
+                f"WHERE s.id IN ({', '.join('?' * len(segment_ids))})",
+                connection,
+                params=segment_ids,
+            )
+        hits = hits.set_index("segment_id").loc[segment_ids]
+        hits.insert(0, "score", top.score.to_numpy())
+        hits = hits.reset_index(drop=True)[columns]
+        if with_text:
+            hits["transcript"] = self._hit_transcripts(hits)
+        return hits
+
+    @staticmethod
+    def _hit_transcripts(hits):
+        "The transcript of each hit, read from its episode's store"
+        transcripts = pd.Series(index=hits.index, dtype=object)
+        for episode_dir, episode_hits in hits.groupby("episode_dir", sort=False):
+            store = TranscriptStore(episode_dir)
+            try:
+                transcripts[episode_hits.index] = store.transcripts_for(episode_hits.segment)
+            except (ValueError, FileNotFoundError):
+                pass  # the store has since been removed or rewritten
+        return transcripts
+
+    def __repr__(self):
+        return f"{type(self).__name__}({str(self.db_path)!r})"
+
+
+search_index = SearchIndex(bc_store_dir / "search_index.sqlite")
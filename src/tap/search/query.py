@@ -0,0 +1,50 @@
+"""
+Search the transcripts of stored episodes, printing the best matching segments with
+the audio file and time offsets to play them from. Episodes are indexed as they are
+transcribed, so the broadcaster store directory is only scanned for any others (e.g.
+transcribed before the index existed) with --update, or if there is no index yet.
+"""
+from .index import search_index
+from argparse import ArgumentParser
+import pandas as pd
+
+__all__ = ["main"]
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.strip())
+    parser.add_argument("query", help="words to search for")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument(
+        "--all", action="store_true", help="only match segments with every word"
+    )
+    parser.add_argument(
+        "--programme", help="programme title (in any case, e.g. Today) or PID"
+    )
+    parser.add_argument("--station")
+    parser.add_argument("--from", dest="date_from", help="earliest date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="latest date (YYYY-MM-DD)")
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="first index any stored episodes that are new or changed since indexed",
+    )
+    args = parser.parse_args(argv)
+    if args.update or not search_index.db_path.exists():
+        search_index.update()
+    hits = search_index.search(
+        args.query,
+        limit=args.limit,
+        require_all=args.all,
+        programme=args.programme,
+        station=args.station,
+        date_from=args.date_from,
+        date_to=args.date_to,
+    )
+    with pd.option_context("display.max_colwidth", 80, "display.width", None):
+        print(hits.drop(columns=["broadcaster", "episode_dir"]).to_string(index=False))
+    return hits
+
+
+if __name__ == "__main__":
+    main()
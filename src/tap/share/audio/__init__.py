@@ -1 +1,2 @@
 from .audio_utils import *
+from .wav_mmap import *
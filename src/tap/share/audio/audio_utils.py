@@ -1,18 +1,67 @@
 import soundfile as sf
+from .wav_mmap import open_mapped_wav
 
-__all__ = ["get_track_length"]
+__all__ = [
+    "get_track_length",
+    "load_mono_audio",
+    "map_mono_audio",
+    "slice_audio_sections",
+]
 
 def get_track_length(wav_file, unit="frames"):
     """
     Return the track length either in seconds (unit: "s") or frames (unit: "frames").
     Always returns both the track length and the sample rate (AKA frame rate).
+
+    The header of a WAV is parsed once and reused until the file changes (see
+    `open_mapped_wav`), so repeated calls on the same file do not re-open it.
     """
-    track = sf.SoundFile(wav_file)
-    sr = track.samplerate
+    mapped = open_mapped_wav(wav_file)
+    if mapped is None:
+        info = sf.info(str(wav_file))
+        frames, sr = info.frames, info.samplerate
+    else:
+        frames, sr = mapped.frames, mapped.sr
     if unit == "frames":
-        track_length = track.frames
+        track_length = frames
     elif unit == "s":
-        track_length = track.frames / sr
+        track_length = frames / sr
     else:
         raise ValueError(f"Unrecognised unit {unit} (expected 's' or 'frames')")
     return track_length, sr
+
+def load_mono_audio(wav_file, sr=16000):
+    """
+    Load the entire track as a mono float32 array, downmixing by the mean of the
+    channels, and resampling only if the file's sample rate is not `sr`.
+    """
+    audio, file_sr = sf.read(wav_file, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+    if file_sr != sr:
+        import librosa
+        audio = librosa.resample(audio, orig_sr=file_sr, target_sr=sr)
+    return audio
+
+def map_mono_audio(wav_file, sr=16000):
+    """
+    The samples of `wav_file` as a read-only memory map (see `open_mapped_wav`), if
+    it is a mono WAV at `sr` whose samples can be mapped, else None (so read it with
+    `load_mono_audio` instead). 16-bit PCM is mapped as int16 samples: convert any
+    section of them to floats with `pcm_to_float`.
+    """
+    mapped = open_mapped_wav(wav_file)
+    if mapped is None or mapped.channels != 1 or mapped.sr != sr:
+        return None
+    return mapped.data[:, 0]
+
+def slice_audio_sections(audio, starts, stops, sr=16000):
+    """
+    Return a list of views on `audio` (no copying) for each pair of start and stop
+    times in seconds, using the same frame offsets as `read_audio_section`.
+    """
+    sections = []
+    for start, stop in zip(starts, stops):
+        start_frame = int(sr * start)
+        frames_to_read = int(sr * (stop - start))
+        sections.append(audio[start_frame : start_frame + frames_to_read])
+    return sections
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+import os
+import struct
+import numpy as np
+
+__all__ = ["parse_wav_header", "pcm_to_float", "MappedWav", "open_mapped_wav"]
+
+# WAVE format tags (and the same as the first 2 bytes of an extensible sub-format)
+PCM_FORMAT, FLOAT_FORMAT, EXTENSIBLE_FORMAT = 1, 3, 0xFFFE
+# Sample dtypes that can be mapped directly (24-bit and 8-bit PCM are not mapped)
+MAPPABLE_DTYPES = {
+    (PCM_FORMAT, 16): "<i2",
+    (PCM_FORMAT, 32): "<i4",
+    (FLOAT_FORMAT, 32): "<f4",
+    (FLOAT_FORMAT, 64): "<f8",
+}
+
+
+def parse_wav_header(wav_file):
+    """
+    Parse the RIFF header of `wav_file`, returning a dict of its sample rate (`sr`),
+    `channels`, `frames`, sample `dtype`, and the byte `offset` of the data chunk, or
+    None if it is not a WAV whose samples can be memory-mapped (i.e. not 16 or 32-bit
+    PCM, or 32 or 64-bit float).
+    """
+    with open(wav_file, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                return None  # no data chunk
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            if chunk_id == b"fmt ":
+                fmt_bytes = f.read(chunk_size)
+                format_tag, channels, sr = struct.unpack("<HHI", fmt_bytes[:8])
+                bits = struct.unpack("<H", fmt_bytes[14:16])[0]
+                if format_tag == EXTENSIBLE_FORMAT:
+                    format_tag = struct.unpack("<H", fmt_bytes[24:26])[0]
+                fmt = (format_tag, channels, sr, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                format_tag, channels, sr, bits = fmt
+                dtype = MAPPABLE_DTYPES.get((format_tag, bits))
+                if dtype is None:
+                    return None
+                # Truncated files declare more data than they have: use what is there
+                data_size = min(chunk_size, Path(wav_file).stat().st_size - f.tell())
+                frame_size = channels * bits // 8
+                return {
+                    "sr": sr,
+                    "channels": channels,
+                    "frames": data_size // frame_size,
+                    "dtype": dtype,
+                    "offset": f.tell(),
+                }
+            else:
+                f.seek(chunk_size + chunk_size % 2, 1)  # chunks are padded to even size
+
+
+def pcm_to_float(samples, dtype="float32"):
+    """
+    The `samples` as `dtype` floats: integer PCM is scaled the same way `soundfile`
+    reads it (by the magnitude of the most negative value), floats are only cast.
+    """
+    if np.issubdtype(samples.dtype, np.integer):
+        scale = -np.iinfo(samples.dtype).min
+        return np.multiply(samples, 1 / scale, dtype=dtype)
+    return samples.astype(dtype, copy=False)
+
+
+class MappedWav:
+    """
+    A WAV file whose header is parsed once, and whose samples are memory-mapped
+    (read from disk only as they are accessed), as an array of frames by channels.
+    Sections are served as views on the map (`section`) or converted to floats on
+    demand (`read_section`, scaled the same way as `soundfile` reads them).
+    """
+    def __init__(self, wav_file):
+        header = parse_wav_header(wav_file)
+        if header is None:
+            raise ValueError(f"{wav_file} is not a WAV whose samples can be mapped")
+        self.path = Path(wav_file)
+        self.sr = header["sr"]
+        self.channels = header["channels"]
+        self.frames = header["frames"]
+        self.data = np.memmap(
+            self.path,
+            dtype=header["dtype"],
+            mode="r",
+            offset=header["offset"],
+            shape=(self.frames, self.channels),
+        )
+
+    @property
+    def duration(self):
+        return self.frames / self.sr
+
+    def frame_range(self, start_time, stop_time, unit="s"):
+        "Start and stop frame, computed the same way as `read_audio_section`"
+        if unit == "s":
+            start_frame = int(self.sr * start_time)
+            frames_to_read = int(self.sr * (stop_time - start_time))
+        elif unit == "frames":
+            start_frame = int(start_time)
+            frames_to_read = int(stop_time - start_time)
+        else:
+            raise ValueError(f"{unit=} is not one of 's' or 'frames'")
+        return start_frame, start_frame + frames_to_read
+
+    def section(self, start_time, stop_time, unit="s"):
+        "The stored samples of the section, as a view on the map (no copy)"
+        start_frame, stop_frame = self.frame_range(start_time, stop_time, unit)
+        return self.data[start_frame:stop_frame]
+
+    def read_section(
+        self, start_time, stop_time, unit="s", dtype="float64", always_2d=False,
+    ):
+        """
+        The section converted to `dtype` floats, identical to what `soundfile` reads
+        (so mono sections are 1D unless `always_2d`, as for `sf.read`).
+        """
+        section = pcm_to_float(self.section(start_time, stop_time, unit), dtype=dtype)
+        if self.channels == 1 and not always_2d:
+            section = section[:, 0]
+        return section
+
+    def __repr__(self):
+        name = type(self).__name__
+        return f"{name}({str(self.path)!r}, sr={self.sr}, frames={self.frames})"
+
+
+_mapped_wavs = OrderedDict()  # (path, modification time, size): MappedWav or None
+_mapped_wavs_lock = Lock()
+
+
+def open_mapped_wav(wav_file, max_cached=16):
+    """
+    Return the `MappedWav` of `wav_file`, reusing it (with its parsed header) if the
+    file has not changed since it was last mapped, keeping the `max_cached` most
+    recently used. Return None if the file's samples cannot be mapped.
+    """
+    path = os.path.abspath(wav_file)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _mapped_wavs_lock:
+        if key in _mapped_wavs:
+            _mapped_wavs.move_to_end(key)
+            return _mapped_wavs[key]
+    try:
+        mapped = MappedWav(path)
+    except ValueError:
+        mapped = None  # also cached, so the header is not parsed again
+    with _mapped_wavs_lock:
+        _mapped_wavs[key] = mapped
+        while len(_mapped_wavs) > max_cached:
+            _mapped_wavs.popitem(last=False)
+    return mapped
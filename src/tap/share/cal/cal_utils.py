@@ -9,7 +9,7 @@ __all__ = [
     "cal_path",
     "y_shift", "m_shift", "d_shift",
     "cal_shift", "cal_date",
-    "parse_abs_from_rel_date",
+    "parse_abs_from_rel_date", "cal_range",
 ]
 
 def cal_y(date=cal_date.today()):
@@ -71,3 +71,13 @@ def parse_abs_from_rel_date(ymd=None, ymd_ago=None):
         # else implies ymd was supplied
     # In each of the above cases `ymd` is now a `datetime.date` object
     return ymd
+
+
+def cal_range(start, stop):
+    """
+    The dates from `start` to `stop` inclusive (both `datetime.date` objects, e.g.
+    from `parse_abs_from_rel_date`), in order.
+    """
+    if start > stop:
+        raise ValueError(f"{start=} is after {stop=}")
+    return [start + DT.timedelta(days=d) for d in range((stop - start).days + 1)]
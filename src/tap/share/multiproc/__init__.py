@@ -1 +1,3 @@
+from .executor import *
 from .multiproc_utils import *
+from .pipeline import *
@@ -0,0 +1,222 @@
+import atexit
+import multiprocessing as mp
+from queue import Queue
+from threading import Lock
+from time import perf_counter
+from functools import partial
+from tqdm import tqdm
+
+__all__ = ["TaskExecutor", "get_executor", "shutdown_executors"]
+
+
+# Modules the fork server imports once, for the workers it forks (see `TaskExecutor`)
+FORKSERVER_PRELOAD = ["tap.preproc.segment.naiveseg", "tap.preproc.segment.envelope"]
+
+
+def _call(function):
+    return function()
+
+
+def _put_completed(completed, i, succeeded, result):
+    completed.put((i, succeeded, result))
+
+
+class TaskExecutor:
+    """
+    A pool of `n_workers` processes (default: one per CPU core) kept alive across
+    calls, to run lists of picklable no-argument functions (e.g. `functools.partial`
+    of a module-level function). The workers are started on first use, and each
+    takes the next `chunksize` tasks as soon as it is free, so a slow task only holds
+    up its own worker rather than the rest of a batch.
+
+    An exception raised by a task is re-raised in the caller (the remaining results
+    are abandoned). The number of tasks, time taken and throughput of the most
+    recent run are kept in `last_run`, and the totals over all runs in `totals`.
+
+    The workers are started with the "forkserver" multiprocessing `context` by
+    default (or "spawn" where there is no forkserver), not the platform default,
+    which is "fork" on Linux: since they are started lazily, possibly from a thread
+    other than the main one and after torch or TensorFlow have started their own
+    threads, a forked worker could inherit a lock held by one of those threads and
+    deadlock. The fork server is a fresh, single-threaded process which imports
+    the `FORKSERVER_PRELOAD` modules (those of the segmentation tasks) once, and
+    forks each worker from itself, so the workers start without importing them
+    again. The tasks (and their arguments) must be picklable by reference, and as
+    with "spawn", each worker imports the main module of the program: a script
+    that uses the executor must do so under `if __name__ == "__main__":`.
+
+    Use as a context manager, or call `close` when done, to stop the workers.
+    """
+    def __init__(self, n_workers=None, chunksize=1, context="forkserver"):
+        if chunksize < 1:
+            raise ValueError(f"{chunksize=} must be at least 1")
+        self.n_workers = n_workers or mp.cpu_count()
+        self.chunksize = chunksize
+        if context == "forkserver" and context not in mp.get_all_start_methods():
+            context = "spawn"
+        self._context = mp.get_context(context)
+        if context == "forkserver":
+            # Only takes effect if the fork server has not been started yet
+            self._context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        self._pool = None
+        self._lock = Lock()
+        self.last_run = None
+        self.totals = {"n_tasks": 0, "elapsed_s": 0.0}
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._context.Pool(processes=self.n_workers)
+            return self._pool
+
+    def imap(
+        self, function_list, ordered=False, chunksize=None, show_progress=True,
+        tqdm_desc=None,
+    ):
+        """
+        Run each function in `function_list` on the workers, yielding the results
+        in order of completion (or in the order of `function_list` if `ordered`).
+        Show a progress bar with tqdm unless `show_progress` is False.
+        """
+        function_list = list(function_list)
+        chunksize = chunksize or self.chunksize
+        imap = self.pool.imap if ordered else self.pool.imap_unordered
+        results = imap(_call, function_list, chunksize=chunksize)
+        pbar = tqdm(total=len(function_list), desc=tqdm_desc) if show_progress else None
+        t0 = perf_counter()
+        n_done = 0
+        try:
+            for result in results:
+                n_done += 1
+                if pbar is not None:
+                    pbar.update()
+                yield result
+        finally:
+            if pbar is not None:
+                pbar.close()
+            self._record_run(n_done, perf_counter() - t0)
+
+    def iter_keyed(
+        self, keyed_functions, ordered=False, max_in_flight=None, show_progress=True,
+        tqdm_desc=None, total=None,
+    ):
+        """
+        Run each function of the `(key, function)` pairs in `keyed_functions` on the
+        workers, yielding `(key, result)` pairs as the tasks complete (or in the
+        order of `keyed_functions` if `ordered`), so the caller can act on each
+        result while the rest are still running.
+
+        At most `max_in_flight` tasks (default: twice the number of workers) are
+        submitted but not yet yielded at once: `keyed_functions` is only consumed as
+        the caller takes results (so may be a lazy iterable), and when `ordered`, the
+        results held back waiting on an earlier one count towards the limit too.
+        Pass `total` (the number of tasks) for the progress bar if `keyed_functions`
+        has no length.
+        """
+        if max_in_flight is None:
+            max_in_flight = 2 * self.n_workers
+        if max_in_flight < 1:
+            raise ValueError(f"{max_in_flight=} must be at least 1")
+        if total is None and hasattr(keyed_functions, "__len__"):
+            total = len(keyed_functions)
+        keyed_functions = iter(keyed_functions)
+        completed = Queue()  # (submission index, succeeded, result or exception)
+        pending = {}  # submission index: key, of tasks not yet completed
+        held_back = {}  # submission index: (key, result), of completed tasks
+        n_submitted = n_yielded = 0
+        exhausted = False
+        pbar = tqdm(total=total, desc=tqdm_desc) if show_progress else None
+        t0 = perf_counter()
+        try:
+            while True:
+                while not exhausted and len(pending) + len(held_back) < max_in_flight:
+                    try:
+                        key, function = next(keyed_functions)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[n_submitted] = key
+                    self.pool.apply_async(
+                        _call,
+                        (function,),
+                        callback=partial(_put_completed, completed, n_submitted, True),
+                        error_callback=partial(_put_completed, completed, n_submitted, False),
+                    )
+                    n_submitted += 1
+                if not pending:
+                    break
+                i, succeeded, result = completed.get()
+                key = pending.pop(i)
+                if not succeeded:
+                    raise result
+                if pbar is not None:
+                    pbar.update()
+                if not ordered:
+                    n_yielded += 1
+                    yield key, result
+                    continue
+                held_back[i] = (key, result)
+                while n_yielded in held_back:
+                    yield held_back.pop(n_yielded)
+                    n_yielded += 1
+        finally:
+            if pbar is not None:
+                pbar.close()
+            self._record_run(n_yielded, perf_counter() - t0)
+
+    def map(self, function_list, **imap_opts):
+        "Run `function_list` on the workers, returning the results in order"
+        return list(self.imap(function_list, ordered=True, **imap_opts))
+
+    def _record_run(self, n_tasks, elapsed_s):
+        self.last_run = {
+            "n_tasks": n_tasks,
+            "elapsed_s": elapsed_s,
+            "tasks_per_s": n_tasks / elapsed_s if elapsed_s else float("nan"),
+        }
+        self.totals["n_tasks"] += n_tasks
+        self.totals["elapsed_s"] += elapsed_s
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        running = "running" if self._pool is not None else "not started"
+        return f"{type(self).__name__}(n_workers={self.n_workers}) [{running}]"
+
+
+_executors = {}  # Shared executors, keyed by number of workers
+_executors_lock = Lock()
+
+
+def get_executor(n_workers=None):
+    """
+    Return the shared `TaskExecutor` with `n_workers` workers (default: one per CPU
+    core), creating it on first use, so repeated calls reuse the same processes.
+    """
+    n_workers = n_workers or mp.cpu_count()
+    with _executors_lock:
+        if n_workers not in _executors:
+            _executors[n_workers] = TaskExecutor(n_workers=n_workers)
+        return _executors[n_workers]
+
+
+@atexit.register
+def shutdown_executors():
+    "Stop the workers of all the shared executors"
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.close()
@@ -1,11 +1,12 @@
 import multiprocessing as mp
-from multiprocessing import Process, Pool
-from more_itertools import chunked
-from tqdm import tqdm
-from functools import partial
+from .executor import get_executor
 
 
-__all__ = ["batch_multiprocess", "batch_multiprocess_with_dict_updates"]
+__all__ = [
+    "batch_multiprocess",
+    "batch_multiprocess_with_dict_updates",
+    "iter_multiprocess_results",
+]
 
 
 def batch_multiprocess(function_list, n_cores=mp.cpu_count(), show_progress=True,
@@ -13,24 +14,14 @@ def batch_multiprocess(function_list, n_cores=mp.cpu_count(), show_progress=True
     """
     Run a list of functions on `n_cores` (default: all CPU cores),
     with the option to show a progress bar using tqdm (default: shown).
-    """
-    iterator = [*chunked(function_list, n_cores)]
-    if show_progress:
-        iterator = tqdm(iterator, desc=tqdm_desc)
-    for func_batch in iterator:
-        procs = []
-        for f in func_batch:
-            procs.append(Process(target=f))
-        for p in procs:
-            p.start()
-        for p in procs:
-            p.join()
-
 
-def update_dict_and_pbar(new_entry, callback_dict, callback_pbar=None):
-    callback_dict.update(new_entry)
-    if callback_pbar:
-        callback_pbar.update()
+    The functions run on the shared `TaskExecutor` for `n_cores` workers, which
+    persists between calls and hands out tasks as workers become free. Any
+    exception raised by a function is re-raised here.
+    """
+    executor = get_executor(n_cores)
+    for _ in executor.imap(function_list, show_progress=show_progress, tqdm_desc=tqdm_desc):
+        pass
 
 
 def batch_multiprocess_with_dict_updates(
@@ -40,34 +31,45 @@ def batch_multiprocess_with_dict_updates(
     """
     Run a list of functions on `n_cores` (default: all CPU cores),
     with the option to show a progress bar using tqdm (default: shown).
+    Each function returns a dict, used to update `pool_results_dict`.
+
+    The functions run on the shared `TaskExecutor` for `n_cores` workers (unless
+    `sequential`), as for `batch_multiprocess`.
     """
-    iterator = [*chunked(function_list, n_cores)]
     no_preexisting_dict = pool_results_dict is None
     if no_preexisting_dict:
         pool_results_dict = {}
-    if not sequential:
-        pool = Pool(processes=n_cores)
-    if show_progress:
-        pbar = tqdm(total=len(function_list), desc=tqdm_desc)
+    if sequential:
+        results = (f() for f in function_list)
     else:
-        pbar=None
-    update_pool_results = partial(
-        update_dict_and_pbar, callback_dict=pool_results_dict, callback_pbar=pbar
-    )
-    for func_batch in iterator:
-        procs = []
-        for f in func_batch:
-            if sequential:
-                update_pool_results(f())
-            else:
-                pool.apply_async(func=f, callback=update_pool_results)
-    if not sequential:
-        pool.close()
-        pool.join()
+        results = get_executor(n_cores).imap(
+            function_list, show_progress=show_progress, tqdm_desc=tqdm_desc
+        )
+    for result in results:
+        pool_results_dict.update(result)
     # if pool_results_dict was supplied, it's been updated, otherwise return new dict
     if no_preexisting_dict:
         return pool_results_dict
 
+def iter_multiprocess_results(
+    keyed_function_list, n_cores=mp.cpu_count(), ordered=False, max_in_flight=None,
+    show_progress=True, tqdm_desc=None, total=None,
+):
+    """
+    Run the function of each `(key, function)` pair in `keyed_function_list` on
+    `n_cores` (default: all CPU cores), yielding `(key, result)` as each completes
+    (or in order, if `ordered`) rather than once all have finished, with at most
+    `max_in_flight` tasks outstanding at once (see `TaskExecutor.iter_keyed`).
+    """
+    yield from get_executor(n_cores).iter_keyed(
+        keyed_function_list,
+        ordered=ordered,
+        max_in_flight=max_in_flight,
+        show_progress=show_progress,
+        tqdm_desc=tqdm_desc,
+        total=total,
+    )
+
 #def store_dict_entry(dict_entry, result_dict):
 #    result_dict.update(dict_entry)
 #    return result_dict
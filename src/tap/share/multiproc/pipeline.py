@@ -0,0 +1,164 @@
+from queue import Queue
+from sys import stderr
+from threading import Lock, Thread
+from time import perf_counter
+import pandas as pd
+
+__all__ = ["Stage", "StagedPipeline"]
+
+_DONE = object()  # Sentinel passed down a queue once the stage above has finished
+
+
+class Stage:
+    """
+    A step of a `StagedPipeline`: `function` is called on each item's result from
+    the previous stage (or the item itself, for the first stage) on `n_workers`
+    threads, taking items from a queue holding at most `max_queued` items (so the
+    stage before it runs at most that far ahead).
+    """
+    def __init__(self, name, function, n_workers=1, max_queued=1):
+        if n_workers < 1:
+            raise ValueError(f"{n_workers=} must be at least 1")
+        if max_queued < 1:
+            raise ValueError(f"{max_queued=} must be at least 1")
+        self.name = name
+        self.function = function
+        self.n_workers = n_workers
+        self.max_queued = max_queued
+        self.reset()
+
+    def reset(self):
+        self.stats = {"items": 0, "failed": 0, "busy_s": 0.0, "starved_s": 0.0, "blocked_s": 0.0}
+        self._lock = Lock()
+        self._n_finished = 0
+
+    def record(self, **times):
+        with self._lock:
+            for stat, value in times.items():
+                self.stats[stat] += value
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, n_workers={self.n_workers})"
+
+
+class StagedPipeline:
+    """
+    Run items through a sequence of `Stage`s, each on its own threads, connected by
+    bounded queues: every stage works on the next items while the later stages work
+    on the earlier ones, e.g. downloading one episode while transcribing another, so
+    neither the network nor the CPU sits idle waiting for the other. Threads suit
+    stages whose work is I/O or happens outside the GIL (subprocesses, numpy, torch).
+
+    An item whose stage raises an exception is dropped from the rest of the pipeline
+    (its result is None), with the error kept in `failures`, unless `raise_errors`.
+
+    After a run, `report` gives the utilisation of each stage: the fraction of its
+    workers' time spent working on items, as opposed to starved (waiting for items
+    from the stage before) or blocked (waiting for room in the queue after).
+    """
+    def __init__(self, stages, raise_errors=False):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.raise_errors = raise_errors
+        self.failures = []  # (stage name, item index, exception)
+        self.elapsed_s = None
+
+    def _work(self, stage, in_queue, out_queue, n_downstream):
+        while True:
+            t0 = perf_counter()
+            entry = in_queue.get()
+            t1 = perf_counter()
+            stage.record(starved_s=t1 - t0)
+            if entry is _DONE:
+                break
+            i, value = entry
+            try:
+                result = stage.function(value)
+            except Exception as e:
+                stage.record(busy_s=perf_counter() - t1, items=1, failed=1)
+                self.failures.append((stage.name, i, e))
+                print(f"Stage {stage.name!r} failed on item {i}: {e!r}", file=stderr)
+                continue
+            t2 = perf_counter()
+            out_queue.put((i, result))
+            stage.record(busy_s=t2 - t1, blocked_s=perf_counter() - t2, items=1)
+        with stage._lock:
+            stage._n_finished += 1
+            last_to_finish = stage._n_finished == stage.n_workers
+        if last_to_finish:
+            for _ in range(n_downstream):
+                out_queue.put(_DONE)
+
+    def _feed(self, items, queue, n_workers):
+        for entry in enumerate(items):
+            queue.put(entry)
+        for _ in range(n_workers):
+            queue.put(_DONE)
+
+    def run(self, items):
+        """
+        Pass each of `items` through the stages, returning the final results in the
+        order of `items` (None for any that failed).
+        """
+        items = list(items)
+        self.failures = []
+        queues = [Queue(maxsize=stage.max_queued) for stage in self.stages]
+        results_queue = Queue()  # unbounded: the results are collected as they come
+        queues.append(results_queue)
+        threads = [
+            Thread(target=self._feed, args=(items, queues[0], self.stages[0].n_workers))
+        ]
+        for k, stage in enumerate(self.stages):
+            stage.reset()
+            n_downstream = self.stages[k + 1].n_workers if k + 1 < len(self.stages) else 1
+            threads.extend(
+                Thread(
+                    target=self._work,
+                    args=(stage, queues[k], queues[k + 1], n_downstream),
+                    name=f"{stage.name}-{w}",
+                    daemon=True,
+                )
+                for w in range(stage.n_workers)
+            )
+        t0 = perf_counter()
+        for thread in threads:
+            thread.start()
+        results = [None] * len(items)
+        while (entry := results_queue.get()) is not _DONE:
+            i, result = entry
+            results[i] = result
+        for thread in threads:
+            thread.join()
+        self.elapsed_s = perf_counter() - t0
+        if self.raise_errors and self.failures:
+            stage_name, i, e = self.failures[0]
+            raise RuntimeError(f"Stage {stage_name!r} failed on item {i}") from e
+        return results
+
+    @property
+    def report(self):
+        """
+        A DataFrame of each stage's workers, items processed and failed, and their
+        time spent busy, starved and blocked (in total over the workers, and as a
+        fraction of the workers' time over the run, `utilisation` being the busy
+        fraction).
+        """
+        if self.elapsed_s is None:
+            raise ValueError("The pipeline has not been run yet")
+        rows = []
+        for stage in self.stages:
+            worker_s = stage.n_workers * self.elapsed_s
+            rows.append(
+                {
+                    "stage": stage.name,
+                    "n_workers": stage.n_workers,
+                    **stage.stats,
+                    "utilisation": stage.stats["busy_s"] / worker_s if worker_s else 0.0,
+                }
+            )
+        return pd.DataFrame(rows).set_index("stage")
+
+    def __repr__(self):
+        stages = " -> ".join(f"{s.name}[{s.n_workers}]" for s in self.stages)
+        return f"{type(self).__name__}({stages})"
@@ -1,28 +1,35 @@
 import pandas as pd
 import numpy as np
 
+__all__ = ["insert_replacement_rows"]
+
 def insert_replacement_rows(df, replacement_rows_dict):
     """
-    A trick (suggested at https://stackoverflow.com/a/63736275/2668831)
-    to insert rows with floating point row index to put them between
-    the (standard, integer-valued) existing row indices.
+    Replace each row of `df` whose index is a key of `replacement_rows_dict` by the
+    rows in its value (a list of tuples, truncated to the number of columns of `df`),
+    returning a new DataFrame with a fresh integer index.
 
-    This is vectorised using numpy linspace (omitting the first and
-    last entries of the linspace so as not to coincide with the pre-existing
-    integer-valued row indices), and since the goal is replacement, this is
-    followed finally by a call to `drop` each row index in the
-    `replacement_rows_dict` (keys are star-expanded on the final line).
+    All the replacement rows are built into a single DataFrame, concatenated with the
+    kept rows, and put in order by a single sort on (position, sub-position), rather
+    than inserting the replacement rows one at a time.
     """
-    for row_idx, replacement_rows in replacement_rows_dict.items():
-        #if row_idx == 19:
-        #    breakpoint()
-        n_rows_plus_2 = len(replacement_rows) + 2
-        row_idx_range = np.linspace(row_idx, row_idx+1, n_rows_plus_2)[1:-1]
-        for new_idx, replacement_row in zip(row_idx_range, replacement_rows):
-            # Gives ValueError: cannot set a row with mismatched columns
-            df.loc[new_idx] = pd.Series(
-                dict(
-                    zip(df.columns.to_list(), replacement_row)
-                )
-            )
-    return df.drop(index=[*replacement_rows_dict]).sort_index().reset_index(drop=True)
+    replaced_positions = df.index.get_indexer([*replacement_rows_dict])
+    n_cols = len(df.columns)
+    replacement_rows = []
+    replacement_keys = []
+    for position, row_idx in zip(replaced_positions, replacement_rows_dict):
+        rows = replacement_rows_dict[row_idx]
+        replacement_rows.extend(row[:n_cols] for row in rows)
+        replacement_keys.extend((position, sub) for sub in range(len(rows)))
+    kept = np.ones(len(df), dtype=bool)
+    kept[replaced_positions] = False
+    kept_positions = np.flatnonzero(kept)
+    replacement_keys = np.array(replacement_keys, dtype=int).reshape(-1, 2)
+    positions = np.concatenate([kept_positions, replacement_keys[:, 0]])
+    sub_positions = np.concatenate([np.zeros_like(kept_positions), replacement_keys[:, 1]])
+    spliced = pd.concat(
+        [df.iloc[kept_positions], pd.DataFrame(replacement_rows, columns=df.columns)],
+        ignore_index=True,
+    )
+    order = np.lexsort((sub_positions, positions))
+    return spliced.iloc[order].reset_index(drop=True)
@@ -1 +1,3 @@
 from .load import *
+from .live import *
+from .transcript_store import *
@@ -0,0 +1,477 @@
+from ..preproc.merge import copy_file_contents
+from ..share.audio import load_mono_audio
+from ..stt import transcribe_batch
+from .transcript_store import TranscriptStore
+from pathlib import Path
+from queue import Queue, Empty
+from sys import stderr
+from threading import Thread
+from time import monotonic, sleep
+import os
+import re
+import ffmpeg
+import numpy as np
+import pandas as pd
+import soundfile as sf
+
+__all__ = [
+    "fragment_number",
+    "FragmentWatcher",
+    "WavFragmentDecoder",
+    "PipedFragmentDecoder",
+    "LivePauseDetector",
+    "LiveTranscription",
+    "run_live_transcription",
+]
+
+SAMPLING_RATE = 16000
+# Fewest samples Wav2Vec2 can transcribe (the receptive field of its feature encoder)
+MIN_TRANSCRIBABLE_FRAMES = 400
+
+
+def fragment_number(fragment):
+    """
+    The number at the end of a stream fragment's filename (e.g. 12 for "x-012.m4s"),
+    or None if it has none.
+    """
+    match = re.search(r"(\d+)$", Path(fragment).stem)
+    return int(match.group(1)) if match else None
+
+
+class FragmentWatcher:
+    """
+    Watch `download_dir` for stream fragments (files ending in one of `suffixes`)
+    as they are downloaded, yielding each once it is complete, in stream order: the
+    initialisation file (the one ending in `init_suffix`, unless that is None)
+    first, then the numbered fragments from `first_number` up, each one only after
+    all those before it (as they are fetched concurrently, they may arrive out of
+    order).
+
+    A fragment is taken to be complete when its size is unchanged between two polls
+    `poll_s` seconds apart, or as soon as it appears once `is_done` (a callable,
+    e.g. checking that the download has finished) returns True. The watch ends when
+    `is_done` returns True and every fragment has been yielded (any gap in the
+    numbering is then skipped with a warning), or after `idle_timeout_s` seconds
+    without a new fragment.
+
+    To test locally, drop numbered WAV files into a directory watched with
+    `suffixes=(".wav",)` and `init_suffix=None`.
+    """
+    def __init__(
+        self,
+        download_dir,
+        suffixes=(".dash", ".m4s"),
+        init_suffix=".dash",
+        first_number=1,
+        poll_s=1.0,
+        idle_timeout_s=600.0,
+        is_done=None,
+    ):
+        self.download_dir = Path(download_dir)
+        self.suffixes = suffixes
+        self.init_suffix = init_suffix
+        self.next_number = first_number
+        self.poll_s = poll_s
+        self.idle_timeout_s = idle_timeout_s
+        self.is_done = is_done or (lambda: False)
+        self.init_yielded = init_suffix is None
+        self._sizes = {}  # path: size at the last poll, of fragments not yet yielded
+
+    def complete_fragments(self, done=False):
+        """
+        Return the fragments (by number) whose downloads are complete: all of those
+        found if `done`, else those of the same size as at the last poll.
+        """
+        complete = {}
+        init = None
+        if not self.download_dir.exists():
+            return init, complete
+        for entry in os.scandir(self.download_dir):
+            path = Path(entry.path)
+            if path.suffix not in self.suffixes or not entry.is_file():
+                continue
+            if path.suffix == self.init_suffix:
+                if self.init_yielded:
+                    continue
+                number = None
+            else:
+                number = fragment_number(path)
+                if number is None or number < self.next_number:
+                    continue  # unnumbered, or already yielded
+            size = entry.stat().st_size
+            if size and (done or self._sizes.get(path) == size):
+                if number is None:
+                    init = path
+                else:
+                    complete[number] = path
+            self._sizes[path] = size
+        return init, complete
+
+    def poll(self, done=False):
+        "Return the fragments now ready to be yielded, in stream order"
+        init, complete = self.complete_fragments(done=done)
+        ready = []
+        if not self.init_yielded:
+            if init is None:
+                return ready
+            ready.append(init)
+            self.init_yielded = True
+        while complete:
+            if self.next_number not in complete:
+                if not done:
+                    break
+                missing = self.next_number
+                self.next_number = min(complete)
+                msg = f"Fragments {missing}-{self.next_number - 1} missing: skipped"
+                print(msg, file=stderr)
+            ready.append(complete.pop(self.next_number))
+            self.next_number += 1
+        for path in ready:
+            self._sizes.pop(path, None)
+        return ready
+
+    def __iter__(self):
+        last_arrival = monotonic()
+        while True:
+            # Check before polling, so fragments finished in between are included
+            done = self.is_done()
+            ready = self.poll(done=done)
+            yield from ready
+            if ready:
+                last_arrival = monotonic()
+            elif done:
+                break
+            elif monotonic() - last_arrival > self.idle_timeout_s:
+                print(f"No new fragments for {self.idle_timeout_s}s: stopping", file=stderr)
+                break
+            else:
+                sleep(self.poll_s)
+
+
+class WavFragmentDecoder:
+    """
+    Decode standalone WAV fragments (e.g. to test the live mode locally) to mono
+    float32 audio at `sr`.
+    """
+    def __init__(self, sr=SAMPLING_RATE):
+        self.sr = sr
+
+    def feed(self, fragment):
+        return [load_mono_audio(fragment, sr=self.sr)]
+
+    def close(self):
+        return []
+
+
+class PipedFragmentDecoder:
+    """
+    Decode the fragments of an MPEG-DASH stream (the ".dash" initialisation file
+    then the ".m4s" fragments, in order) with a single ffmpeg process, copying each
+    fragment into its input pipe as it arrives (see `copy_file_contents`), and
+    collecting mono float32 audio at `sr` from its output pipe on a reader thread.
+
+    `feed` returns the audio decoded so far (ffmpeg may still be decoding the
+    fragment just fed, which is then returned by the next call), `close` the rest.
+    """
+    def __init__(self, sr=SAMPLING_RATE, read_bytes=2**16):
+        self.sr = sr
+        self.process = (
+            ffmpeg.input("pipe:", format="mp4")
+            .output("pipe:", ac=1, ar=sr, format="f32le", acodec="pcm_f32le")
+            .global_args("-loglevel", "error", "-nostats")
+            .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
+        )
+        self._decoded = Queue()
+        self._reader = Thread(target=self._read_output, args=(read_bytes,), daemon=True)
+        self._reader.start()
+
+    def _read_output(self, read_bytes):
+        pending = b""  # bytes of an incomplete sample
+        fd = self.process.stdout.fileno()
+        while True:
+            data = os.read(fd, read_bytes)  # whatever is available, so no waiting
+            if not data:
+                break
+            data = pending + data
+            n_whole = len(data) - len(data) % 4
+            pending = data[n_whole:]
+            if n_whole:
+                self._decoded.put(np.frombuffer(data[:n_whole], dtype="<f4"))
+        self._decoded.put(None)
+
+    def _drain(self):
+        blocks = []
+        while True:
+            try:
+                block = self._decoded.get_nowait()
+            except Empty:
+                break
+            if block is not None:
+                blocks.append(block)
+        return [np.concatenate(blocks)] if blocks else []
+
+    def feed(self, fragment):
+        if not self.process.stdin.closed:
+            with open(fragment, "rb") as f:
+                try:
+                    copy_file_contents(f, self.process.stdin)
+                except BrokenPipeError:
+                    # The decoder exited early: its error is reported by `close`
+                    self.process.stdin.close()
+        return self._drain()
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass  # the decoder exited early: its error is reported below
+        self._reader.join()
+        stderr_output = self.process.stderr.read()
+        self.process.wait()
+        if self.process.returncode != 0:
+            msg = f"ffmpeg failed to decode the stream: {stderr_output.decode()}"
+            raise ValueError(msg)
+        return self._drain()
+
+
+class LivePauseDetector:
+    """
+    Detect where to cut audio into segments as it arrives, from the energy of each
+    `hop_s` hop (the square of its mean absolute amplitude, as for the energy
+    envelope). As for `EnergyVADEngine`, a hop is inactive if its log energy is
+    below the mean log energy plus `log(ratio)`, where the mean is a running mean
+    over all the audio so far (so settles as the stream goes on).
+
+    A segment is closed at the end of a pause (a run of at least `min_pause_s` of
+    inactive hops) once it is at least `min_s` long, the same way clips are cut at
+    pause ends by `clip_intervals_from_pause_stops`. If it reaches `max_s` with no
+    such pause, it is cut at its quietest hop after `min_s`.
+
+    `update` takes the next samples and returns the frames of any new cuts. Only
+    the energies since the last cut are kept, not the audio.
+    """
+    def __init__(
+        self, sr=SAMPLING_RATE, hop_s=0.01, ratio=0.03, min_pause_s=0.2, min_s=5.0,
+        max_s=50.0,
+    ):
+        if not 0 < min_s < max_s:
+            raise ValueError(f"{min_s=} and {max_s=} must satisfy 0 < min_s < max_s")
+        self.hop_frames = int(hop_s * sr)
+        self.log_ratio = np.log(ratio)
+        self.min_pause_hops = round(min_pause_s / hop_s)
+        self.min_hops = round(min_s / hop_s)
+        self.max_hops = round(max_s / hop_s)
+        self._partial = np.zeros(0, dtype=np.float32)  # samples short of a full hop
+        self._log_energy_total = 0.0
+        self._n_finite = 0
+        self._energies = []  # log energy of each hop since the last cut
+        self.n_hops = 0  # hops seen in total
+        self.last_cut = 0  # hop of the last cut
+        self._pause_start = None  # hop the current inactive run started at
+
+    def hop_log_energies(self, samples):
+        "Log energies of the full hops of the samples so far (keeping the rest)"
+        samples = np.concatenate([self._partial, np.abs(samples)])
+        n_full = len(samples) // self.hop_frames
+        self._partial = samples[n_full * self.hop_frames :]
+        hop_means = samples[: n_full * self.hop_frames].reshape(n_full, -1).mean(axis=1)
+        energy = np.square(hop_means.astype(np.float64))
+        return np.log(energy, out=np.full_like(energy, -np.inf), where=energy > 0)
+
+    def update(self, samples):
+        log_energy = self.hop_log_energies(samples)
+        finite = np.isfinite(log_energy)
+        self._log_energy_total += log_energy[finite].sum()
+        self._n_finite += int(finite.sum())
+        if not self._n_finite:
+            threshold = np.inf  # silence so far: every hop is inactive
+        else:
+            threshold = self._log_energy_total / self._n_finite + self.log_ratio
+        cuts = []
+        for hop_energy, active in zip(log_energy.tolist(), log_energy > threshold):
+            i = self.n_hops
+            self.n_hops += 1
+            self._energies.append(hop_energy)
+            if not active:
+                if self._pause_start is None:
+                    self._pause_start = i
+            elif self._pause_start is not None:
+                paused = i - self._pause_start >= self.min_pause_hops
+                if paused and i - self.last_cut >= self.min_hops:
+                    cuts.append(self._cut(i))
+                self._pause_start = None
+            if self.n_hops - self.last_cut > self.max_hops:
+                quietest = int(np.argmin(self._energies[self.min_hops :]))
+                cuts.append(self._cut(self.last_cut + self.min_hops + quietest))
+                if self._pause_start is not None:
+                    self._pause_start = max(self._pause_start, self.last_cut)
+        return [hop * self.hop_frames for hop in cuts]
+
+    def _cut(self, hop):
+        del self._energies[: hop - self.last_cut]
+        self.last_cut = hop
+        return hop
+
+
+class LiveTranscription:
+    """
+    Segment and transcribe audio as it arrives (passed to `feed` as mono float32
+    arrays at `sr`), keeping only a tail buffer of the audio since the last cut
+    found by a `LivePauseDetector` (to which `detector_opts` are passed, e.g. the
+    `min_s` and `max_s` segment lengths). As soon as a pause closes a segment it is
+    transcribed (by `transcribe_batch`, with `transcribe_opts`), its transcript
+    appended to the `transcript_store` (by default a `TranscriptStore` beside the
+    `txn_tsv`), its clip WAV written to `segment_dir`
+    (unless `write_clips` is False) and its row appended to the `txn_tsv` table,
+    named and laid out as by `segment_pauses_and_spread` (with clip numbers zfilled
+    to `zfill_len`, as the total is not known in advance).
+
+    The audio is also written to `input_wav` (the path recorded in the table's
+    "input" column) unless `write_input_wav` is False, via a partial file renamed
+    on `close` so an interrupted run does not leave a truncated episode WAV.
+
+    On `close`, the rest of the audio is emitted as a final segment if it is at
+    least `min_s` long (or no segment was emitted before it), else it is merged into
+    the last segment, which is transcribed again: a tail of a fraction of a second
+    would give a useless segment, and one shorter than `MIN_TRANSCRIBABLE_FRAMES`
+    cannot be transcribed at all.
+    """
+    table_columns = ["input", "output", "start", "stop", "unit"]
+
+    def __init__(
+        self,
+        input_wav,
+        segment_dir,
+        txn_tsv,
+        transcript_store=None,
+        sr=SAMPLING_RATE,
+        write_clips=True,
+        write_input_wav=True,
+        zfill_len=4,
+        transcribe_opts=None,
+        tsv_opts=None,
+        **detector_opts,
+    ):
+        self.input_wav = Path(input_wav)
+        self.segment_dir = Path(segment_dir)
+        self.txn_tsv = Path(txn_tsv)
+        if self.txn_tsv.exists():
+            raise ValueError(f"{txn_tsv=} already exists: risk of doubled output")
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        if transcript_store is None:
+            transcript_store = TranscriptStore(self.txn_tsv.parent)
+        self.transcript_store = transcript_store
+        self.transcript_store.clear()
+        self.sr = sr
+        self.write_clips = write_clips
+        self.zfill_len = zfill_len
+        self.transcribe_opts = transcribe_opts or {}
+        self.tsv_opts = tsv_opts or {"sep": "\t", "quoting": 2, "index": False}
+        self.detector = LivePauseDetector(sr=sr, **detector_opts)
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._tail_start = 0  # frame the tail starts at
+        self._last_segment = None  # audio of the last segment emitted
+        self.n_segments = 0
+        self.rows = []
+        self._partial_wav = None
+        if write_input_wav:
+            partial_path = self.input_wav.with_name(self.input_wav.name + ".partial")
+            self._partial_wav = sf.SoundFile(
+                partial_path, "w", samplerate=sr, channels=1, format="WAV"
+            )
+
+    def feed(self, samples):
+        "Add the next samples, emitting any segments closed by them"
+        samples = np.asarray(samples, dtype=np.float32)
+        if self._partial_wav is not None:
+            self._partial_wav.write(samples)
+        self._tail = np.concatenate([self._tail, samples])
+        cuts = self.detector.update(samples)
+        if cuts:
+            self.emit(cuts)
+
+    def emit(self, cuts):
+        "Transcribe and write out the segments of the tail buffer up to each cut"
+        bounds = [self._tail_start, *cuts]
+        segments = [
+            self._tail[start - self._tail_start : stop - self._tail_start]
+            for start, stop in zip(bounds, bounds[1:])
+        ]
+        transcripts = transcribe_batch(segments, **self.transcribe_opts)
+        rows = []
+        for audio, start, stop in zip(segments, bounds, bounds[1:]):
+            self.n_segments += 1
+            zf_count = str(self.n_segments).zfill(self.zfill_len)
+            output_wav = self.segment_dir / f"{self.input_wav.stem}_{zf_count}.wav"
+            if self.write_clips:
+                sf.write(output_wav, audio, self.sr)
+            rows.append((self.input_wav, output_wav, start / self.sr, stop / self.sr, "s"))
+        new_rows = pd.DataFrame(rows, columns=self.table_columns)
+        self.transcript_store.append(
+            [output_wav.stem for output_wav in new_rows.output],
+            transcripts,
+            starts=new_rows.start,
+            stops=new_rows.stop,
+        )
+        write_header = not self.txn_tsv.exists()
+        new_rows.to_csv(self.txn_tsv, mode="a", header=write_header, **self.tsv_opts)
+        self.rows.extend(rows)
+        self._last_segment = segments[-1]
+        self._tail = self._tail[cuts[-1] - self._tail_start :]
+        self._tail_start = cuts[-1]
+
+    def merge_tail(self):
+        """
+        Extend the last segment emitted to the end of the audio so far: transcribe
+        it again, overwrite its clip and replace its row of the `txn_tsv` table (the
+        transcript appended again supersedes its earlier one in the store).
+        """
+        audio = np.concatenate([self._last_segment, self._tail])
+        [transcript] = transcribe_batch([audio], **self.transcribe_opts)
+        input_wav, output_wav, start, _, unit = self.rows[-1]
+        end = self._tail_start + len(self._tail)
+        stop = end / self.sr
+        if self.write_clips:
+            sf.write(output_wav, audio, self.sr)
+        self.transcript_store.append(
+            [output_wav.stem], [transcript], starts=[start], stops=[stop]
+        )
+        self.rows[-1] = (input_wav, output_wav, start, stop, unit)
+        table = pd.DataFrame(self.rows, columns=self.table_columns)
+        table.to_csv(self.txn_tsv, **self.tsv_opts)
+        self._last_segment = audio
+        self._tail = self._tail[:0]
+        self._tail_start = end
+
+    def close(self):
+        """
+        Emit the rest of the audio as the final segment (or merge it into the last
+        one, if it is shorter than `min_s`) and finish writing the input WAV. Return
+        the table of all the segments (as in `segment_times.tsv`).
+        """
+        n_tail_frames = len(self._tail)
+        min_frames = self.detector.min_hops * self.detector.hop_frames
+        if n_tail_frames and self.rows and n_tail_frames < min_frames:
+            self.merge_tail()
+        elif n_tail_frames >= MIN_TRANSCRIBABLE_FRAMES:
+            self.emit([self._tail_start + n_tail_frames])
+        elif n_tail_frames:
+            print(f"Dropped {n_tail_frames} frames too short to transcribe", file=stderr)
+        if self._partial_wav is not None:
+            self._partial_wav.close()
+            Path(self._partial_wav.name).replace(self.input_wav)
+            self._partial_wav = None
+        return pd.DataFrame(self.rows, columns=self.table_columns)
+
+
+def run_live_transcription(watcher, decoder, live):
+    """
+    Decode each fragment from the `watcher` as it is yielded and feed its audio to
+    the `live` transcription, returning the segment table once the watch ends.
+    """
+    for fragment in watcher:
+        for samples in decoder.feed(fragment):
+            live.feed(samples)
+    for samples in decoder.close():
+        live.feed(samples)
+    return live.close()
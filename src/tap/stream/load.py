@@ -1,7 +1,10 @@
-from ..share.cal import parse_abs_from_rel_date
+from ..share.cal import parse_abs_from_rel_date, cal_range
+from ..share.multiproc import Stage, StagedPipeline
 from .streams import Stream
+from functools import partial
+from sys import stderr
 
-__all__ = ["load_stream"]
+__all__ = ["load_stream", "load_streams", "stream_pipeline"]
 
 
 def load_stream(
@@ -25,6 +28,14 @@ def load_stream(
       method is called upon initialisation
     - `reload=False` to control whether to reload the stream from disk
     - `min_s=5.`/`max_s=50.` to control the min./max. audio segment length.
+    - `transcribe_opts=None`, a dict of options for `Stream.transcribe`, e.g.
+      `{"n_workers": 4}` to transcribe on 4 CPU worker processes.
+    - `load_full_transcripts=True` to read all the transcript text on reload, or
+      False to reload near-instantly, reading each transcript from `Stream.transcripts`
+      only as it is needed.
+    - `live=False` to transcribe the episode as it downloads (segments and their
+      transcripts are written as soon as a pause closes them), with `live_opts`
+      passed to `Stream.transcribe_live`.
 
     If `reload` is True, do not pull/preprocess/transcribe: the transcripts are expected
     to already exist on disk, so just load them from there and recreate the `Stream`.
@@ -35,3 +46,137 @@ def load_stream(
     ymd = (date.year, date.month, date.day)
     stream = Stream(programme, station, broadcaster, ymd, **stream_opts)
     return stream
+
+
+def _pull_stream(job, broadcaster, stream_opts, skip_existing, load_full_transcripts):
+    """
+    Download stage: create the `Stream` deferred (so nothing is run) and pull its
+    files, or reload it instead if it was already transcribed (and `skip_existing`).
+    """
+    programme, station, date = job
+    ymd = (date.year, date.month, date.day)
+    stream = Stream(programme, station, broadcaster, ymd, defer=True, **stream_opts)
+    if skip_existing:
+        try:
+            stream.reload_segments()
+            stream.reload_transcripts()
+            stream.load_transcript_text(full_text=load_full_transcripts)
+            return stream
+        except (ValueError, FileNotFoundError):
+            # Not (fully) transcribed yet: unset what the reload set, so it is redone
+            vars(stream).pop("transcript_timings", None)
+    stream._source.pull()
+    return stream
+
+
+def _preprocess_stream(stream):
+    "Preprocessing stage: decode the pulled files (straight to a WAV) and segment them"
+    if not hasattr(stream, "transcript_timings"):
+        stream.preprocess(**stream.preproc_opts)
+    return stream
+
+
+def _transcribe_stream(stream, load_full_transcripts):
+    "Inference stage: transcribe the segments and load the transcripts"
+    if "transcripts" not in stream.transcript_timings:
+        stream.transcribe(**stream.transcribe_opts)
+        stream.load_transcript_text(full_text=load_full_transcripts)
+    return stream
+
+
+def stream_pipeline(
+    broadcaster="bbc",
+    n_downloads=2,
+    n_preprocessors=1,
+    n_transcribers=1,
+    max_queued=1,
+    transcribe=True,
+    skip_existing=True,
+    load_full_transcripts=True,
+    **stream_opts,
+):
+    """
+    The `StagedPipeline` of `load_streams`, taking `(programme, station, date)` jobs:
+    downloading (`n_downloads` at once), preprocessing (`n_preprocessors`) and, if
+    `transcribe` is True, transcribing (`n_transcribers`), with at most `max_queued`
+    streams waiting between stages.
+    """
+    stages = [
+        Stage(
+            "download",
+            partial(
+                _pull_stream,
+                broadcaster=broadcaster,
+                stream_opts=stream_opts,
+                skip_existing=skip_existing,
+                load_full_transcripts=load_full_transcripts,
+            ),
+            n_workers=n_downloads,
+            max_queued=max_queued,
+        ),
+        Stage("preprocess", _preprocess_stream, n_preprocessors, max_queued),
+    ]
+    if transcribe:
+        transcribe_stage = partial(
+            _transcribe_stream, load_full_transcripts=load_full_transcripts
+        )
+        stages.append(Stage("transcribe", transcribe_stage, n_transcribers, max_queued))
+    return StagedPipeline(stages)
+
+
+def load_streams(
+    programmes=("Today",),
+    stations=("r4",),
+    broadcaster="bbc",
+    ymd_from=None,
+    ymd_to=None,
+    ymd_ago_from=None,
+    ymd_ago_to=None,
+    report=True,
+    **pipeline_opts,
+):
+    """
+    Create (pull, preprocess and transcribe) a `Stream` for each programme in
+    `programmes` (on the station at the same position in `stations`, or on a single
+    station for all of them) on each date from the start to the end date inclusive.
+    Each of these is given as for `load_stream` by `ymd_from`/`ymd_ago_from` and
+    `ymd_to`/`ymd_ago_to`, the end date defaulting to today and the start date to
+    the end date. Return the streams in order of date then programme (None for any
+    that failed, whose errors are printed as they happen).
+
+    The episodes are run through a `StagedPipeline` (see `stream_pipeline`, which
+    takes the `pipeline_opts`) so that downloads, preprocessing and transcription
+    of different episodes overlap. `pipeline_opts` include:
+    - `n_downloads=2`, `n_preprocessors=1` and `n_transcribers=1`, the number of
+      episodes worked on at once in each stage.
+    - `max_queued=1`, the most episodes waiting between one stage and the next.
+    - `skip_existing=True` to reload episodes that were already transcribed.
+    - `transcribe=True`, `transcribe_opts` and the preprocessing options as for
+      `load_stream` (note `transcribe_opts` such as `n_workers` apply to each of
+      the `n_transcribers` at once).
+
+    If `report` is True, print the utilisation of each stage when done.
+    """
+    if broadcaster != "bbc":
+        raise NotImplementedError("Only currently supporting BBC stations")
+    if len(stations) == 1:
+        stations = stations * len(programmes)
+    elif len(stations) != len(programmes):
+        raise ValueError(f"{stations=} must be one station or one per programme")
+    stop = parse_abs_from_rel_date(ymd=ymd_to, ymd_ago=ymd_ago_to)
+    if ymd_from is ymd_ago_from is None:
+        start = stop
+    else:
+        start = parse_abs_from_rel_date(ymd=ymd_from, ymd_ago=ymd_ago_from)
+    jobs = [
+        (programme, station, date)
+        for date in cal_range(start, stop)
+        for programme, station in zip(programmes, stations)
+    ]
+    pipeline = stream_pipeline(broadcaster=broadcaster, **pipeline_opts)
+    streams = pipeline.run(jobs)
+    if report:
+        print(f"Loaded {len(jobs) - len(pipeline.failures)} of {len(jobs)} streams "
+              f"in {pipeline.elapsed_s:.1f}s", file=stderr)
+        print(pipeline.report.to_string(float_format="{:.2f}".format), file=stderr)
+    return streams
@@ -0,0 +1,24 @@
+"""
+Migrate the per-segment transcript files of stored episodes into a `TranscriptStore`
+in each episode directory (under the broadcaster store directory by default).
+"""
+from ..data.store.broadcasters import _dir_path as bc_store_dir
+from .transcript_store import migrate_transcript_dirs
+from argparse import ArgumentParser
+from pathlib import Path
+
+__all__ = ["main"]
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.strip())
+    parser.add_argument("root_dir", nargs="?", type=Path, default=bc_store_dir)
+    parser.add_argument(
+        "--remove", action="store_true", help="delete the transcript files once migrated"
+    )
+    args = parser.parse_args(argv)
+    return migrate_transcript_dirs(args.root_dir, remove=args.remove)
+
+
+if __name__ == "__main__":
+    main()
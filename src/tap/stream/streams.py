@@ -8,6 +8,16 @@ class TapHandle:
     _root_store_dir = StreamTranscriberMixIn._root_store_dir
 
 class Stream(StreamTranscriberMixIn):
+    """
+    An episode of a `programme` on a `station`, pulled and (unless deferred) then
+    preprocessed and transcribed, or reloaded if already done (see
+    `StreamTranscriberMixIn`).
+
+    Segmentation and pooled transcription run on worker processes started fresh
+    rather than forked (see `TaskExecutor` and `TranscriptionPool`), which import
+    the program's main module: a script that creates a `Stream` must do so under
+    `if __name__ == "__main__":`, or each worker runs the script again.
+    """
     def __init__(
         self,
         programme,
@@ -19,24 +29,40 @@ class Stream(StreamTranscriberMixIn):
         transcribe=True,
         reload=True,
         load_full_transcripts=True,
+        transcribe_opts=None,
+        live=False,
+        live_opts=None,
+        defer=False,
         **preproc_opts,
     ):
+        self.programme_name = programme
         custom_storage_root = self._root_store_dir / broadcaster
         if broadcaster == "bbc":
+            # Only pulled here: `preprocess` decodes the fragments straight to a WAV
             self._source = beeb.stream.Stream.from_name(
                 station=station,
                 programme_name=programme,
                 ymd=ymd,
                 ymd_ago=ymd_ago,
-                defer_pull=defer_pull,
+                defer_pull=True,
+                transcode_to_wav=False,
                 custom_storage_path=custom_storage_root,
             )
         else:
             msg = f"Only broadcaster='bbc' supported (not {broadcaster=})"
             raise NotImplementedError(msg)
+        if self.episode_wav.exists():
+            # Already decoded (and its MP4 deleted), or transcoded to WAV by beeb
+            self._source.transcode_to_wav = True
+        if not (defer_pull or live or defer):  # else pulled later (or incrementally)
+            self._source.pull()
         super().__init__(
             transcribe=transcribe,
             reload=reload,
             load_full_transcripts=load_full_transcripts,
+            transcribe_opts=transcribe_opts,
+            live=live,
+            live_opts=live_opts,
+            defer=defer,
             **preproc_opts,
         )  # call TranscribeStreamMixIn.__init__
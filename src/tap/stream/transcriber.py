@@ -1,17 +1,46 @@
 from ..data.store.broadcasters import _dir_path as bc_store_dir
-from ..preproc.segment import segment_pauses_and_spread
-from ..stt import transcribe_audio_file
+from ..preproc.format_conversion import decode_mono_audio
+from ..preproc.merge import gather_pulled_downloads
+from ..preproc.segment import segment_pauses_and_spread, export_segment_clips
+from ..share.audio import load_mono_audio, map_mono_audio, slice_audio_sections
+from ..stt import (
+    default_model,
+    iter_batch_transcriptions,
+    iter_in_order,
+    iter_queued_transcriptions,
+    TranscriptionPool,
+)
 from ..precis.summary_exporters import DocSummaryExportEnum
+from .live import (
+    FragmentWatcher,
+    LiveTranscription,
+    PipedFragmentDecoder,
+    WavFragmentDecoder,
+    run_live_transcription,
+)
+from .transcript_store import TranscriptStore, migrate_transcript_dir
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from queue import Queue
+from threading import Event
 from glob import glob
+from os.path import basename, splitext
 from pathlib import Path
 from sys import stderr
 from tqdm import tqdm
 from pandas import read_csv
 
-__all__ = ["StreamTranscriberMixIn"]
+__all__ = ["StreamTranscriberMixIn", "SegmentationCancelled"]
+
+
+class SegmentationCancelled(Exception):
+    "Raised on the segmentation thread to stop it, once transcription has failed"
 
 
 class StreamTranscriberMixIn:
+    index_for_search = True  # Add transcripts to `tap.search.search_index` once made
+    programme_name = None  # Title of the programme (the source may only have its PID)
+
     @property
     def _root_store_dir(self):
         return bc_store_dir
@@ -21,10 +50,30 @@ class StreamTranscriberMixIn:
         transcribe=False,
         reload=False,
         load_full_transcripts=True,
+        transcribe_opts=None,
+        live=False,
+        live_opts=None,
+        defer=False,
         **preproc_opts,
     ):
+        """
+        `transcribe_opts` is a dict of keyword arguments passed to `transcribe`
+        (e.g. `{"n_workers": 4}` to transcribe on a pool of CPU worker processes).
+
+        If `live` is True, the stream is transcribed as it downloads rather than
+        reloaded or preprocessed (see `transcribe_live`, passed `live_opts`). If
+        `defer` is True, nothing is run (call `preprocess` and `transcribe` when
+        ready, e.g. as stages of `load_streams`), and `preproc_opts` are kept in
+        `preproc_opts` for `preprocess`.
+        """
         self.full_text_transcripts_loaded = False
-        if reload:
+        self.transcribe_opts = transcribe_opts or {}
+        self.preproc_opts = preproc_opts
+        if defer:
+            return
+        if live:
+            self.transcribe_live(**(live_opts or {}))
+        elif reload:
             # Must have at least segments, if no transcripts then potentially create
             self.reload_segments()
             self.reload_transcripts(transcribe=transcribe)
@@ -35,31 +84,245 @@ class StreamTranscriberMixIn:
             except Exception as e:
                 msg = "Non-fatal error while trying to reload transcripts"
                 print(msg, file=stderr)
+        elif transcribe:
+            self.preprocess_and_transcribe(**self.transcribe_opts, **preproc_opts)
         else:
             self.preprocess(**preproc_opts)
-            if transcribe:
-                self.transcribe()  # Can also pass in model_to_load or `just_filenames`
+
+    @property
+    def episode_wav(self):
+        "The episode's WAV (which names its segments, even if it is not written)"
+        return self._source.episode_dir / f"{self._source.gathered_filename_stem}.wav"
+
+    def decode_audio(self):
+        """
+        The episode's mono 16 kHz audio, as a memory map of its mono 16-bit WAV (the
+        one audio file kept per episode). The first time, the WAV is decoded from the
+        pulled stream fragments, concatenated straight into the decoder so no MP4 is
+        gathered (see `gather_pulled_downloads`), or from an MP4 already gathered by
+        beeb (see `decode_mono_audio`), which is then deleted. The fragments are
+        deleted too, by the source's clean up.
+
+        Return None for an episode whose WAV is not mono 16 kHz (transcoded to stereo
+        by beeb, as before the audio was decoded directly): read the WAV instead.
+        """
+        wav = self.episode_wav
+        if wav.exists():
+            return map_mono_audio(wav)
+        mp4 = wav.with_suffix(".mp4")
+        if mp4.exists():
+            audio = decode_mono_audio(mp4, output_wav=wav)
+            mp4.unlink()
+        else:
+            gather_pulled_downloads(
+                self._source.download_dir, wav.parent, to_wav=True, filename_stem=wav.stem
+            )
+            audio = map_mono_audio(wav)
+        # Now `pull` skips the episode, and the source's `preprocess` only cleans up
+        self._source.transcode_to_wav = True
+        self._source.preprocess()
+        return audio
+
+    def load_audio(self):
+        "The episode's mono 16 kHz audio, mapped (see `decode_audio`) or read from its WAV"
+        audio = self.decode_audio()
+        return load_mono_audio(self.episode_wav) if audio is None else audio
 
     def preprocess(self, **opts):
         """
-        Gather stream files into a single MP4 file, convert to WAV, segment it
-        at pauses in the audio, and create smaller WAV files accordingly.
+        Decode the pulled stream to a mono 16 kHz WAV (see `decode_audio`), segment
+        it at pauses in the audio, and create smaller WAV files accordingly.
 
         Any kwargs passed as `opts` are passed into `segment_pauses_and_spread`
         (from the `tap.preproc.segment.inaseg` module). These are by default:
-        `csv_out_dir=None`, `segmented_out_dir=None`, `min_s=5.0`, `max_s=50.0`.
-        The latter pair control the minimum and maximum segment length (if you
-        encounter out of memory errors while running Wav2Vec2, reduce `max_s`,
-        which will cause further segmenting at the audio's minimum amplitude
-        points to bring each segment below this limit).
+        `csv_out_dir=None`, `segmented_out_dir=None`, `min_s=5.0`, `max_s=50.0`,
+        `write_clips=True`, `inaseg_workers=None`, `engine="inaseg"`. The `min_s`/`max_s`
+        pair control the minimum and maximum segment length (if you encounter out of
+        memory errors while running Wav2Vec2, reduce `max_s`, which will cause further
+        segmenting at the audio's minimum amplitude points to bring each segment below
+        this limit). Passing `write_clips=False` computes only the segment intervals
+        ("virtual segments"), which `transcribe` then slices from the episode audio in
+        memory. Passing `inaseg_workers` segments the episode in chunks across that
+        many processes, and passing `engine="energy"` detects pauses from the audio
+        energy alone (no TensorFlow, but no speech/music classification either).
+        Passing `on_segment` receives each segment as soon as it is final (see
+        `preprocess_and_transcribe`).
         """
-        transcoded_wav = self._source.preprocessed_output_file
+        audio = self.decode_audio()
         self.transcript_timings, self.segment_dir = segment_pauses_and_spread(
-            transcoded_wav, **opts
+            self.episode_wav, audio=audio, **opts
         )
         self.set_transcript_timings_config()
         self.transcript_timings.to_csv(self.txn_tsv, **self._txn_tsv_w_opts)
 
+    def preprocess_and_transcribe(
+        self,
+        model_to_load=default_model,
+        max_batch_samples=16000 * 160,
+        virtual=None,
+        n_workers=None,
+        quantise=False,
+        **preproc_opts,
+    ):
+        """
+        Run `preprocess` (passed `preproc_opts`) and `transcribe` (passed the rest)
+        concurrently: segmentation runs on a background thread, putting each segment
+        on a queue (in time order) as soon as it is final, and the segments are
+        transcribed from the queue as they arrive, so the model is busy from the first
+        finished segment rather than after the last. The transcripts are still
+        stored in segment order, and (as for `transcribe`) only replace the episode's
+        stored transcripts once all are transcribed.
+
+        If `virtual` is None (default), segments whose clip WAVs were not written are
+        sliced from the episode's audio in memory (as for `transcribe`).
+
+        If transcription fails, the segmentation is stopped when it next publishes a
+        segment (by raising `SegmentationCancelled` on its thread), so the error is
+        raised without waiting for the rest of the episode to be segmented.
+        """
+        segment_queue = Queue()
+        segment_rows = []  # (name, start, stop) of each segment put on the queue
+        audio = None
+        transcription_failed = Event()
+
+        def publish(clip):
+            "Put the segment on the queue (called on the segmentation thread)"
+            nonlocal audio
+            if transcription_failed.is_set():
+                # Stop the segmentation now, rather than when it would have finished
+                raise SegmentationCancelled("Transcription failed")
+            output, start, stop, *_ = clip
+            output = Path(output)
+            if virtual or (virtual is None and not output.exists()):
+                if audio is None:
+                    audio = self.load_audio()
+                [segment] = slice_audio_sections(audio, [start], [stop])
+            else:
+                segment = output
+            segment_rows.append((output.stem, start, stop))
+            segment_queue.put(segment)
+
+        def queued_segments():
+            "The segments put on the queue, until the None put once segmentation ends"
+            while True:
+                segment = segment_queue.get()
+                if segment is None:
+                    return
+                yield segment
+
+        print("Transcribing segmented audio clips as they are segmented", file=stderr)
+        self.set_transcript_timings_config()
+        with ThreadPoolExecutor(max_workers=1) as segmenter, ExitStack() as stack:
+            # Replaces the stored transcripts only once all are transcribed
+            store = stack.enter_context(self.transcript_store.replacement())
+            preprocessed = segmenter.submit(
+                self.preprocess, on_segment=publish, **preproc_opts
+            )
+            preprocessed.add_done_callback(lambda _: segment_queue.put(None))
+            if n_workers:
+                # Closed on exit (or terminated if transcription fails)
+                pool = stack.enter_context(
+                    TranscriptionPool(
+                        n_workers=n_workers, model_to_load=model_to_load, quantise=quantise
+                    )
+                )
+                transcriptions = pool.iter_transcriptions(queued_segments(), ordered=True)
+            else:
+                transcriptions = iter_queued_transcriptions(
+                    segment_queue,
+                    model_to_load,
+                    max_batch_samples=max_batch_samples,
+                    quantise=quantise,
+                )
+            transcripts = {}
+            try:
+                for i, transcript in tqdm(transcriptions, desc="Transcribing"):
+                    transcripts[i] = transcript
+            except BaseException:
+                # Leaving the block waits for the segmentation: stop it at its next segment
+                transcription_failed.set()
+                raise
+            preprocessed.result()  # re-raise any error from the segmentation
+            # One bulk append, in segment order
+            store.append(
+                [name for name, _, _ in segment_rows],
+                [transcripts[i] for i in range(len(segment_rows))],
+                starts=[start for _, start, _ in segment_rows],
+                stops=[stop for _, _, stop in segment_rows],
+            )
+        self.index_transcripts()
+
+    def transcribe_live(
+        self,
+        pull=True,
+        download_dir=None,
+        fragment_suffix=".m4s",
+        poll_s=1.0,
+        idle_timeout_s=600.0,
+        write_clips=True,
+        **segment_opts,
+    ):
+        """
+        Transcribe the stream incrementally as its fragments are downloaded (by
+        `self._source.pull`, run on a background thread if `pull` is True), rather
+        than once the whole episode has been gathered and segmented.
+
+        The download directory (by default the source's) is watched for fragments
+        (see `FragmentWatcher`), each of which is decoded as it arrives and fed to
+        a `LiveTranscription`, which cuts segments at pauses as soon as they close
+        (`segment_opts` are passed to its `LivePauseDetector`, e.g. `min_s=5.0` and
+        `max_s=50.0`), transcribes them with the `transcribe_opts` and appends them
+        to `segment_times.tsv`. The episode WAV is written along the way, so the
+        stream can then be reloaded as if preprocessed and transcribed in full.
+        Each batch of transcripts is appended to the episode's `TranscriptStore`.
+
+        To test locally, pass `pull=False` and a `download_dir` to drop fragments
+        into: either ".m4s" fragments (after the ".dash" initialisation file), or
+        numbered WAV files with `fragment_suffix=".wav"`. Without `pull`, the watch
+        ends after `idle_timeout_s` seconds without a new fragment.
+        """
+        self.set_transcript_timings_config()
+        self.segment_dir = self._source.episode_dir / "segmented"
+        if download_dir is None:
+            download_dir = self._source.download_dir
+        if fragment_suffix == ".wav":
+            watcher_opts = {"suffixes": (".wav",), "init_suffix": None}
+            decoder = WavFragmentDecoder()
+        else:
+            watcher_opts = {"suffixes": (".dash", fragment_suffix)}
+            decoder = PipedFragmentDecoder()
+        live = LiveTranscription(
+            input_wav=self.episode_wav,
+            segment_dir=self.segment_dir,
+            txn_tsv=self.txn_tsv,
+            transcript_store=self.transcript_store,
+            write_clips=write_clips,
+            transcribe_opts=self._live_transcribe_opts(),
+            tsv_opts=self._txn_tsv_w_opts,
+            **segment_opts,
+        )
+        with ThreadPoolExecutor(max_workers=1) as puller:
+            pulled = puller.submit(self._source.pull) if pull else None
+            watcher = FragmentWatcher(
+                download_dir,
+                poll_s=poll_s,
+                idle_timeout_s=idle_timeout_s,
+                is_done=pulled.done if pulled else None,
+                **watcher_opts,
+            )
+            self.transcript_timings = run_live_transcription(watcher, decoder, live)
+            if pulled:
+                pulled.result()  # re-raise any error from the download
+        self.index_transcripts()
+
+    def _live_transcribe_opts(self):
+        """
+        The `transcribe_opts` that apply to transcribing a batch of segments in
+        this process (`n_workers` and `virtual` only apply to `transcribe`).
+        """
+        batch_opts = ["model_to_load", "max_batch_samples", "quantise"]
+        return {k: v for k, v in self.transcribe_opts.items() if k in batch_opts}
+
     def set_transcript_timings_config(self):
         """
         Create any necessary directories
@@ -68,6 +331,7 @@ class StreamTranscriberMixIn:
         self._txn_tsv_r_opts = {"sep": "\t", "quoting": 2}
         self._txn_tsv_w_opts = {**self._txn_tsv_r_opts, "index": False}
         self._txn_tsv_r_col_map_opts = {"input": Path, "output": Path}
+        self.transcript_store = TranscriptStore(self._source.episode_dir)
 
     def reload_segments(self):
         if not hasattr(self, "segment_dir"):
@@ -77,58 +341,178 @@ class StreamTranscriberMixIn:
 
     def reload_transcripts(self, transcribe=False):
         """
-        Set the `segment_dir` and `transcript_dir` attributes which were otherwise
-        provided by a call to `segment_pauses_and_spread` in the `preprocess` method.
-
         Reload the `transcript_timings` DataFrame (with very small floating point
-        error from original values).
-        """
-        if not hasattr(self, "transcript_dir"):
-            self.transcript_dir = self.segment_dir / "transcripts"
-        if not self.transcript_dir.exists():
-            if transcribe:
-                # Retranscribe
-                self.transcribe()
-            else:
-                msg = f"No transcripts in {self.transcript_dir} and {transcribe=}"
-                raise ValueError(msg)
+        error from original values) and check the episode has a `TranscriptStore`.
+
+        Episodes transcribed before the store (to one file per segment in the
+        `segmented/transcripts` directory) are migrated to a store on first reload
+        (the files are kept: see `tap.stream.migrate_transcripts` to migrate in bulk
+        and remove them).
+        """
+        self.read_transcript_timings()
+        if self.transcript_store.exists:
+            return
+        legacy_transcript_dir = self.segment_dir / "transcripts"
+        if legacy_transcript_dir.exists():
+            migrate_transcript_dir(
+                legacy_transcript_dir, self.transcript_store, timings=self.transcript_timings
+            )
+        elif transcribe:
+            # Retranscribe
+            self.transcribe(**self.transcribe_opts)
+        else:
+            msg = f"No transcripts in {self.transcript_store} and {transcribe=}"
+            raise ValueError(msg)
+
+    def read_transcript_timings(self):
         self.set_transcript_timings_config()
         self.transcript_timings = read_csv(self.txn_tsv, **self._txn_tsv_r_opts)
         for col, mappable in self._txn_tsv_r_col_map_opts.items():
-            self.transcript_timings[col] = self.transcript_timings[col].map(mappable)
+            # Map each distinct value once (e.g. the input WAV is the same on every row)
+            values = self.transcript_timings[col]
+            mapped = {value: mappable(value) for value in values.unique()}
+            self.transcript_timings[col] = values.map(mapped)
 
     def load_transcript_text(self, full_text=True):
         """
-        To not load the transcript text itself into memory (instead just store the file
-        paths to the transcripts) set `full_text` to False (default: True).
+        Load the transcripts from the episode's `TranscriptStore` as `transcripts`,
+        a `LazyTranscripts` sequence aligned with the rows of `transcript_timings`,
+        which reads each transcript from a memory map of the store only when it is
+        accessed (or selected by time with `transcripts.between(start, stop)`).
+
+        If `full_text` is True (default), all the text is also read into the
+        `transcripts` column of `transcript_timings`. To not load the transcript text
+        itself into memory (instead just store the segment names, by which the store
+        is keyed, in the column) set `full_text` to False: this makes reloading
+        near-instant however long the episode.
         """
-        transcripts = []
+        timings = self.transcript_timings
+        # The stems of the segment paths, without parsing each path again
+        segments = [splitext(basename(wav))[0] for wav in map(str, timings.output)]
+        self._transcripts = self.transcript_store.lazy(
+            segments, starts=timings.start, stops=timings.stop
+        )
         self.full_text_transcripts_loaded = full_text
-        for wav in self.transcript_timings.output:
-            transcript_filename = wav.stem + ".txt"
-            transcript = self.transcript_dir / transcript_filename
-            if full_text:
-                with open(transcript, "r") as f:
-                    txt = f.read().rstrip("\n")
-                transcripts.append(txt)
-            else:
-                transcripts.append(transcript)
-        self.transcript_timings["transcripts"] = transcripts
+        if full_text:
+            timings["transcripts"] = self._transcripts.tolist()
+        else:
+            timings["transcripts"] = segments
 
-    def transcribe(self, model_to_load="facebook/wav2vec2-large-robust-ft-libri-960h"):
+    def transcribe(
+        self,
+        model_to_load=default_model,
+        max_batch_samples=16000 * 160,
+        virtual=None,
+        n_workers=None,
+        quantise=False,
+    ):
+        """
+        Transcribe the segmented audio in duration-bucketed batches, padded up to
+        at most `max_batch_samples` samples per batch (reduce this if you encounter
+        out of memory errors while running Wav2Vec2).
+
+        If `virtual` is True, the segments are sliced from the episode's audio in
+        memory by their interval times rather than read from clip WAVs. If None
+        (default), this is done only when no clip WAVs were written.
+
+        If `n_workers` is given, the segments are transcribed on a `TranscriptionPool`
+        of that many CPU worker processes (each with its own resident model) rather
+        than batched in this process. Pass `quantise=True` to transcribe with the
+        int8 quantised model (CPU only, see `tap.stt.benchmark` for its accuracy cost).
+
+        The transcripts are taken in segment order (each batch's as soon as those
+        of the segments before it are done), and appended in one bulk write, in
+        segment order, to a new `TranscriptStore`, which replaces the episode's once
+        all are transcribed (so if transcription fails, the episode keeps any
+        transcripts it had before).
+        """
+        if not hasattr(self, "transcript_timings"):
+            self.read_transcript_timings()
+        timings = self.transcript_timings
         files_to_transcribe = sorted(glob(str(self.segment_dir / "*.wav")))
+        if virtual is None:
+            virtual = not files_to_transcribe
+        if virtual:
+            audio = self.load_audio()
+            segments = slice_audio_sections(audio, timings.start, timings.stop)
+            segment_names = [Path(wav).stem for wav in timings.output]
+        else:
+            segments = files_to_transcribe
+            segment_names = [Path(f).stem for f in files_to_transcribe]
         # Setting `.transcripts` attr adds `transcript` column to `.transcript_timings`
-        print(
-            f"Transcribing {len(files_to_transcribe)} segmented audio files",
-            file=stderr,
-        )
-        self.transcript_dir = self.segment_dir / "transcripts"
-        self.transcript_dir.mkdir(exist_ok=True)
-        for f in tqdm(files_to_transcribe):
-            transcript = transcribe_audio_file(f, model_to_load)
-            transcript_filename = Path(f).stem + ".txt"
-            with open(self.transcript_dir / transcript_filename, "w") as fh:
-                fh.write(transcript + "\n")
+        print(f"Transcribing {len(segments)} segmented audio clips", file=stderr)
+        segment_times = {
+            Path(wav).stem: (start, stop)
+            for wav, start, stop in zip(timings.output, timings.start, timings.stop)
+        }
+        self.set_transcript_timings_config()
+        with ExitStack() as stack:
+            # Replaces the stored transcripts only once all are transcribed
+            store = stack.enter_context(self.transcript_store.replacement())
+            if n_workers:
+                # Closed on exit (or terminated if transcription fails)
+                pool = stack.enter_context(
+                    TranscriptionPool(
+                        n_workers=n_workers, model_to_load=model_to_load, quantise=quantise
+                    )
+                )
+                transcriptions = pool.iter_transcriptions(segments, ordered=True)
+            else:
+                transcriptions = iter_in_order(
+                    iter_batch_transcriptions(
+                        segments,
+                        model_to_load,
+                        max_batch_samples=max_batch_samples,
+                        quantise=quantise,
+                    )
+                )
+            transcripts = [None] * len(segments)
+            for i, transcript in tqdm(transcriptions, total=len(segments)):
+                transcripts[i] = transcript
+            # One bulk append, in segment order (whatever order the results came in)
+            nan_times = (float("nan"), float("nan"))
+            times = [segment_times.get(name, nan_times) for name in segment_names]
+            store.append(
+                segment_names,
+                transcripts,
+                starts=[start for start, _ in times],
+                stops=[stop for _, stop in times],
+            )
+        self.index_transcripts()
+
+    def index_transcripts(self):
+        """
+        Add the episode's transcripts to the cross-episode `tap.search.search_index`
+        (if `index_for_search`). A failure here is reported but not raised, as the
+        episode will be indexed by the next `search_index.update()`.
+        """
+        if not self.index_for_search:
+            return
+        from ..search import search_index  # imported here as it imports this package
+
+        try:
+            broadcaster, station, programme_pid = self._source.programme_parts
+            metadata = {
+                "broadcaster": broadcaster,
+                "station": station,
+                "programme_pid": programme_pid,
+                "date": self._source.date.strftime("%Y-%m-%d"),
+            }
+            if self.programme_name is not None:
+                metadata["programme"] = self.programme_name
+            search_index.add_episode(self._source.episode_dir, metadata=metadata)
+        except Exception as e:
+            msg = f"Non-fatal error while indexing transcripts for search: {e!r}"
+            print(msg, file=stderr)
+
+    def export_clips(self):
+        """
+        Write a WAV clip for each segment in `transcript_timings` (needed only if
+        the stream was preprocessed with `write_clips=False`).
+        """
+        if not hasattr(self, "transcript_timings"):
+            self.read_transcript_timings()
+        export_segment_clips(self.transcript_timings, audio=self.decode_audio())
 
     def export_transcripts(
         self, out_format="txt", out_dir=None, domain=None, single_file=False
@@ -158,9 +542,12 @@ class StreamTranscriberMixIn:
         out_dir = out_dir / programme_dirname
         if out_format not in DocSummaryExportEnum.__members__:
             raise ValueError(f"{out_format} is not a valid DocSummaryExportEnum")
-        if not self.full_text_transcripts_loaded:
-            self.load_transcript_text(full_text=True)
-        all_transcripts = self.transcript_timings.transcripts.tolist()
+        if not hasattr(self, "_transcripts"):
+            self.load_transcript_text(full_text=False)
+        if self.full_text_transcripts_loaded:
+            all_transcripts = self.transcript_timings.transcripts.tolist()
+        else:
+            all_transcripts = self.transcripts.tolist()  # read from the store map
         summary_exporter = DocSummaryExportEnum[out_format].value
         print(f"Exporting {len(all_transcripts)} transcripts to {out_dir}", file=stderr)
         exporter = summary_exporter(documents=all_transcripts, to=out_dir)
@@ -172,6 +559,7 @@ class StreamTranscriberMixIn:
 
     @property
     def transcripts(self):
+        "The `LazyTranscripts` of the segments (see `load_transcript_text`)"
         return self._transcripts
 
     @transcripts.setter
@@ -0,0 +1,314 @@
+from ..data.store.broadcasters import _dir_path as bc_store_dir
+from contextlib import contextmanager
+from pathlib import Path
+from sys import stderr
+import numpy as np
+import pandas as pd
+
+__all__ = [
+    "TranscriptStore",
+    "LazyTranscripts",
+    "TranscriptWriter",
+    "migrate_transcript_dir",
+    "migrate_transcript_dirs",
+]
+
+
+class TranscriptStore:
+    """
+    The transcripts of an episode's segments, kept in a single append-only UTF-8
+    text file (`<name>.txt`, each transcript followed by a newline so it reads as
+    plain text) and indexed by a TSV (`<name>.tsv`) of each segment's name, start
+    and stop time, and the byte offset and length of its transcript in the text.
+
+    Transcripts are appended in bulk (the text, then the index rows, so an
+    interrupted write leaves only unindexed text), and read back with one read of
+    each file. A segment appended again supersedes its earlier transcript.
+    """
+    index_columns = ["segment", "start", "stop", "offset", "length"]
+    _tsv_opts = {"sep": "\t"}
+
+    def __init__(self, store_dir, name="transcripts"):
+        self.store_dir = Path(store_dir)
+        self.name = name
+        self.text_path = self.store_dir / f"{name}.txt"
+        self.index_path = self.store_dir / f"{name}.tsv"
+
+    @property
+    def exists(self):
+        return self.index_path.exists()
+
+    def append(self, segments, transcripts, starts=None, stops=None):
+        """
+        Append the `transcripts` of the named `segments` (and their start and stop
+        times in seconds, if known) in a single write to each file.
+        """
+        if len(segments) != len(transcripts):
+            raise ValueError(f"{len(segments)=} does not match {len(transcripts)=}")
+        if not segments:
+            return
+        encoded = [t.encode() for t in transcripts]
+        with open(self.text_path, "ab") as f:
+            offset = f.tell()
+            f.write(b"".join(e + b"\n" for e in encoded))
+        lengths = np.array([len(e) for e in encoded], dtype=np.int64)
+        # Each transcript starts after the previous one and its newline
+        offsets = offset + np.r_[0, np.cumsum(lengths + 1)[:-1]]
+        rows = pd.DataFrame(
+            {
+                "segment": list(segments),
+                "start": float("nan") if starts is None else list(starts),
+                "stop": float("nan") if stops is None else list(stops),
+                "offset": offsets,
+                "length": lengths,
+            },
+            columns=self.index_columns,
+        )
+        write_header = not self.index_path.exists()
+        rows.to_csv(
+            self.index_path, mode="a", header=write_header, index=False, **self._tsv_opts
+        )
+
+    def writer(self, flush_every=64):
+        "A `TranscriptWriter` appending to this store every `flush_every` transcripts"
+        return TranscriptWriter(self, flush_every=flush_every)
+
+    def read_index(self):
+        """
+        The index of the latest transcript of each segment, in the order they were
+        first appended.
+        """
+        if not self.exists:
+            raise ValueError(f"No transcript store at {self.index_path}")
+        index = pd.read_csv(
+            self.index_path,
+            dtype={"segment": str, "offset": "int64", "length": "int64"},
+            **self._tsv_opts,
+        )
+        latest = index.drop_duplicates("segment", keep="last").set_index("segment")
+        first_seen = index.drop_duplicates("segment", keep="first").segment
+        return latest.loc[first_seen.to_numpy()]
+
+    def read(self):
+        """
+        The index (see `read_index`) with the text of each transcript in a
+        `transcript` column, read from the text file in one read.
+        """
+        index = self.read_index()
+        with open(self.text_path, "rb") as f:
+            text = f.read()
+        index["transcript"] = [
+            text[offset : offset + length].decode()
+            for offset, length in zip(index.offset, index.length)
+        ]
+        return index
+
+    def lazy(self, segments=None, starts=None, stops=None):
+        """
+        The transcripts of the named `segments` (default: all, in the index order)
+        as `LazyTranscripts`, read on demand from a memory map of the text file.
+        Their `starts` and `stops` (for `LazyTranscripts.between`) default to the
+        times in the index.
+        """
+        index = self.read_index()
+        if segments is not None:
+            segments = list(segments)
+            missing = index.index.get_indexer(segments) < 0
+            if missing.any():
+                missing_segments = [s for s, m in zip(segments, missing) if m][:5]
+                msg = f"No transcripts stored for {missing.sum()} segments: {missing_segments}"
+                raise ValueError(msg)
+            index = index.loc[segments]
+        return LazyTranscripts(
+            self.text_path,
+            index.offset.to_numpy(),
+            index.length.to_numpy(),
+            index.start.to_numpy(dtype=float) if starts is None else np.asarray(starts, dtype=float),
+            index.stop.to_numpy(dtype=float) if stops is None else np.asarray(stops, dtype=float),
+            names=index.index.to_numpy(),
+        )
+
+    def transcripts_for(self, segments):
+        "The transcripts of the named `segments`, in the same order"
+        return self.lazy(segments).tolist()
+
+    def clear(self):
+        "Delete the store's files"
+        self.index_path.unlink(missing_ok=True)
+        self.text_path.unlink(missing_ok=True)
+
+    @contextmanager
+    def replacement(self):
+        """
+        Yield an empty store (`<name>.partial`, beside this one) to write a new set
+        of transcripts to (e.g. when transcribing the episode again), which replaces
+        this store only if the block completes: if it raises, the partial store is
+        deleted and the existing transcripts are left as they were.
+        """
+        partial = type(self)(self.store_dir, name=f"{self.name}.partial")
+        partial.clear()  # Left over from an interrupted run
+        try:
+            yield partial
+        except BaseException:
+            partial.clear()
+            raise
+        partial.rename_over(self)
+
+    def rename_over(self, store):
+        """
+        Move this store's files over those of `store`. The index is moved last, so
+        `store` never has an index paired with the wrong text file.
+        """
+        store.index_path.unlink(missing_ok=True)
+        if self.exists:
+            self.text_path.replace(store.text_path)
+            self.index_path.replace(store.index_path)
+        else:
+            # Nothing was appended: leave `store` empty too
+            self.text_path.unlink(missing_ok=True)
+            store.text_path.unlink(missing_ok=True)
+
+    def __len__(self):
+        return len(self.read_index()) if self.exists else 0
+
+    def __repr__(self):
+        return f"{type(self).__name__}({str(self.store_dir)!r})"
+
+
+class LazyTranscripts:
+    """
+    A sequence of transcripts backed by a memory map of a `TranscriptStore`'s text
+    file and arrays of each one's byte offset and length (and start and stop time):
+    a transcript is only read and decoded when it is accessed, so creating this is
+    near-instant however long the episode.
+
+    Indexing with an integer gives a transcript's text, while indexing with a slice,
+    an array of positions or a boolean mask (or `between`, to select by time) gives
+    another `LazyTranscripts` sharing the same map, without reading any text.
+    Text appended to the store after the map was made is not visible through it.
+    """
+    def __init__(self, text, offsets, lengths, starts, stops, names=None):
+        if not isinstance(text, np.ndarray):
+            text_path = Path(text)
+            if text_path.stat().st_size:
+                text = np.memmap(text_path, dtype=np.uint8, mode="r")
+            else:
+                text = np.zeros(0, dtype=np.uint8)  # an empty file cannot be mapped
+        self._text = text
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=float)
+        self.stops = np.asarray(stops, dtype=float)
+        self.names = None if names is None else np.asarray(names, dtype=object)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            offset, length = self.offsets[key], self.lengths[key]
+            return self._text[offset : offset + length].tobytes().decode()
+        return type(self)(
+            self._text,
+            self.offsets[key],
+            self.lengths[key],
+            self.starts[key],
+            self.stops[key],
+            names=None if self.names is None else self.names[key],
+        )
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def tolist(self):
+        return list(self)
+
+    def between(self, start, stop):
+        "The transcripts of the segments overlapping `start` to `stop` (in seconds)"
+        return self[(self.stops > start) & (self.starts < stop)]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({len(self)} transcripts)"
+
+
+class TranscriptWriter:
+    """
+    Buffer transcripts as they are produced and append them to a `TranscriptStore`
+    in bulk, every `flush_every` transcripts and when closed. Use as a context
+    manager, or call `close` when done.
+    """
+    def __init__(self, store, flush_every=64):
+        self.store = store
+        self.flush_every = flush_every
+        self._pending = []  # (segment, transcript, start, stop)
+
+    def add(self, segment, transcript, start=float("nan"), stop=float("nan")):
+        self._pending.append((segment, transcript, start, stop))
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            segments, transcripts, starts, stops = map(list, zip(*self._pending))
+            self.store.append(segments, transcripts, starts=starts, stops=stops)
+            self._pending = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def migrate_transcript_dir(transcript_dir, store, timings=None, remove=False):
+    """
+    Append the transcripts of a per-segment transcript directory (one `<stem>.txt`
+    per segment) to the `store` in one bulk write, in the order of the `output`
+    column of `timings` (taking their start and stop times) if given, else by name.
+    If `remove` is True, delete the files (and the directory if left empty) after.
+    Return the number of transcripts migrated.
+    """
+    transcript_dir = Path(transcript_dir)
+    if timings is not None:
+        segments = [Path(output).stem for output in timings.output]
+        starts, stops = timings.start.tolist(), timings.stop.tolist()
+    else:
+        segments = sorted(p.stem for p in transcript_dir.glob("*.txt"))
+        starts = stops = None
+    files = [transcript_dir / f"{segment}.txt" for segment in segments]
+    transcripts = []
+    for transcript_file in files:
+        with open(transcript_file, "r") as f:
+            transcripts.append(f.read().rstrip("\n"))
+    store.append(segments, transcripts, starts=starts, stops=stops)
+    if remove:
+        for transcript_file in files:
+            transcript_file.unlink()
+        if not any(transcript_dir.iterdir()):
+            transcript_dir.rmdir()
+    return len(transcripts)
+
+
+def migrate_transcript_dirs(root_dir=bc_store_dir, remove=False):
+    """
+    Migrate every episode under `root_dir` with a `segmented/transcripts` directory
+    and no transcript store yet (see `migrate_transcript_dir`), ordering the
+    segments by the episode's `segment_times.tsv` where there is one. Return the
+    number of episodes migrated.
+    """
+    n_migrated = 0
+    for transcript_dir in sorted(Path(root_dir).rglob("segmented/transcripts")):
+        episode_dir = transcript_dir.parent.parent
+        store = TranscriptStore(episode_dir)
+        if store.exists or not transcript_dir.is_dir():
+            continue
+        txn_tsv = episode_dir / "segment_times.tsv"
+        timings = pd.read_csv(txn_tsv, sep="\t", quoting=2) if txn_tsv.exists() else None
+        n = migrate_transcript_dir(transcript_dir, store, timings=timings, remove=remove)
+        print(f"Migrated {n} transcripts in {episode_dir}", file=stderr)
+        n_migrated += 1
+    return n_migrated
+
@@ -1 +1,5 @@
+from .models import *
 from .transcribe import *
+from .batching import *
+from .streaming import *
+from .pool import *
@@ -0,0 +1,191 @@
+from queue import Empty
+import librosa
+import numpy as np
+import soundfile as sf
+import torch
+from ..share.audio import pcm_to_float
+from .models import default_model, model_registry
+
+__all__ = [
+    "load_segment_audio",
+    "segment_length",
+    "plan_batches",
+    "iter_batch_transcriptions",
+    "transcribe_batch",
+    "iter_queued_transcriptions",
+    "iter_in_order",
+]
+
+SAMPLING_RATE = 16000
+
+
+def load_segment_audio(segment, sr=SAMPLING_RATE):
+    """
+    Return `segment` as a mono float32 array at `sr`: if it is a path it is loaded
+    (and resampled) with librosa, if it is already an array it is downmixed only
+    (and integer PCM, e.g. a section of a mapped 16-bit WAV, scaled to floats).
+    """
+    if isinstance(segment, np.ndarray):
+        audio = pcm_to_float(segment, dtype=np.float32)
+        return audio if audio.ndim == 1 else audio.mean(axis=1)
+    audio, _ = librosa.load(segment, sr=sr)
+    return audio
+
+
+def segment_length(segment, sr=SAMPLING_RATE):
+    """
+    Number of samples `segment` will have at `sr`, read from the file header
+    rather than by decoding the audio when `segment` is a path.
+    """
+    if isinstance(segment, np.ndarray):
+        return len(segment)
+    info = sf.info(str(segment))
+    return int(info.frames * sr / info.samplerate)
+
+
+def plan_batches(lengths, max_batch_samples):
+    """
+    Group the indices of `lengths` into batches such that the padded size of each
+    batch (number of items times the longest item) is at most `max_batch_samples`.
+    Items are sorted by length first, so each batch holds items of similar duration
+    and little of the batch is padding. An item longer than the budget is placed
+    in a batch of its own.
+    """
+    order = np.argsort(lengths, kind="stable")
+    batches = []
+    batch = []
+    for idx in order:
+        # Sorted ascending, so the item being added is the longest in the batch
+        if batch and (len(batch) + 1) * lengths[idx] > max_batch_samples:
+            batches.append(batch)
+            batch = []
+        batch.append(int(idx))
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def iter_batch_transcriptions(
+    segments,
+    model_to_load=default_model,
+    max_batch_samples=SAMPLING_RATE * 160,
+    registry=model_registry,
+    device=None,
+    quantise=False,
+):
+    """
+    Transcribe `segments` (a list of paths and/or arrays of 16 kHz audio) in
+    duration-bucketed batches, yielding `(index, transcription)` pairs as each
+    batch finishes, where `index` is the position of the segment in `segments`.
+
+    `max_batch_samples` bounds the padded input size of a batch (default: 160
+    seconds of audio), and should be lowered if the model runs out of memory.
+    Pass `quantise=True` to use the int8 quantised model (CPU only).
+    """
+    processor, model = registry.get(model_to_load, device=device, quantise=quantise)
+    lengths = [segment_length(s) for s in segments]
+    for batch in plan_batches(lengths, max_batch_samples):
+        audio_inputs = [load_segment_audio(segments[i]) for i in batch]
+        proc = processor(
+            audio_inputs,
+            return_tensors="pt",
+            padding="longest",
+            sampling_rate=SAMPLING_RATE,
+        )
+        model_inputs = {"input_values": proc.input_values.to(model.device)}
+        if "attention_mask" in proc:
+            model_inputs["attention_mask"] = proc.attention_mask.to(model.device)
+        with torch.no_grad():
+            logits = model(**model_inputs).logits
+        predicted_ids = torch.argmax(logits, dim=-1)
+        transcriptions = processor.batch_decode(predicted_ids)
+        yield from zip(batch, transcriptions)
+
+
+def transcribe_batch(
+    segments,
+    model_to_load=default_model,
+    max_batch_samples=SAMPLING_RATE * 160,
+    registry=model_registry,
+    device=None,
+    quantise=False,
+):
+    """
+    Transcribe `segments` in batches (see `iter_batch_transcriptions`) and return
+    the transcriptions in the same order as `segments`.
+    """
+    transcriptions = [None] * len(segments)
+    for i, transcription in iter_batch_transcriptions(
+        segments,
+        model_to_load,
+        max_batch_samples=max_batch_samples,
+        registry=registry,
+        device=device,
+        quantise=quantise,
+    ):
+        transcriptions[i] = transcription
+    return transcriptions
+
+
+def iter_queued_transcriptions(
+    segment_queue,
+    model_to_load=default_model,
+    max_batch_samples=SAMPLING_RATE * 160,
+    registry=model_registry,
+    device=None,
+    quantise=False,
+):
+    """
+    Transcribe segments as they are put on `segment_queue` (a `queue.Queue`, ended
+    by putting None), yielding `(index, transcription)` pairs in the order they were
+    put, where `index` counts the segments from 0.
+
+    Only the first segment of each batch is waited for: any others already queued
+    join it, up to `max_batch_samples` samples in total (which `transcribe_batch`
+    then buckets by duration), so the model starts as soon as the first segment is
+    queued and catches up on a backlog in larger batches.
+    """
+    index = 0
+    done = False
+    while not done:
+        segment = segment_queue.get()
+        if segment is None:
+            break
+        batch = [segment]
+        n_samples = segment_length(segment)
+        while n_samples < max_batch_samples:
+            try:
+                segment = segment_queue.get_nowait()
+            except Empty:
+                break
+            if segment is None:
+                done = True
+                break
+            batch.append(segment)
+            n_samples += segment_length(segment)
+        transcriptions = transcribe_batch(
+            batch,
+            model_to_load,
+            max_batch_samples=max_batch_samples,
+            registry=registry,
+            device=device,
+            quantise=quantise,
+        )
+        for transcription in transcriptions:
+            yield index, transcription
+            index += 1
+
+
+def iter_in_order(indexed_results):
+    """
+    Yield the `(index, result)` pairs of `indexed_results` (e.g. from
+    `iter_batch_transcriptions`, which yields them by duration bucket) in order of
+    index from 0, each as soon as it and every one before it have arrived.
+    """
+    held_back = {}
+    next_index = 0
+    for i, result in indexed_results:
+        held_back[i] = result
+        while next_index in held_back:
+            yield next_index, held_back.pop(next_index)
+            next_index += 1
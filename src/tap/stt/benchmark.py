@@ -0,0 +1,102 @@
+"""
+Compare the accuracy and speed of fp32 and int8 quantised inference on a sample of
+stored segments (run as `python -m tap.stt.benchmark`).
+"""
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+from sys import stderr
+from ..data.store.broadcasters import _dir_path as bc_store_dir
+from .models import default_model, model_registry
+from .batching import SAMPLING_RATE, segment_length, transcribe_batch
+
+__all__ = ["word_error_rate", "sample_stored_segments", "compare_quantisation"]
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    Word-level edit distance between the `reference` and `hypothesis` texts,
+    divided by the number of words in the reference.
+    """
+    ref, hyp = reference.split(), hypothesis.split()
+    if not ref:
+        return float(len(hyp) > 0)
+    distances = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        prev_diag, distances[0] = distances[0], i
+        for j, hyp_word in enumerate(hyp, start=1):
+            substitution = prev_diag + (ref_word != hyp_word)
+            prev_diag = distances[j]
+            distances[j] = min(distances[j] + 1, distances[j - 1] + 1, substitution)
+    return distances[-1] / len(ref)
+
+
+def sample_stored_segments(sample_size=20, seed=0, store_dir=bc_store_dir):
+    """
+    Randomly sample `sample_size` segment WAVs from the episodes stored under
+    `store_dir` (default: the broadcaster store).
+    """
+    segment_wavs = sorted(store_dir.glob("**/segmented/*.wav"))
+    if not segment_wavs:
+        raise ValueError(f"No segmented WAVs stored in {store_dir}")
+    return Random(seed).sample(segment_wavs, min(sample_size, len(segment_wavs)))
+
+
+def compare_quantisation(
+    segments=None, model_to_load=default_model, sample_size=20, seed=0,
+):
+    """
+    Transcribe `segments` (default: a sample of `sample_size` stored segments) on
+    the CPU with the fp32 model and then the int8 quantised model, returning a dict
+    of the real-time factor (processing time over audio duration) of each, the
+    speedup from quantisation, and the word error rate of the quantised model's
+    transcripts taking the fp32 transcripts as the reference.
+    """
+    if segments is None:
+        segments = sample_stored_segments(sample_size, seed=seed)
+    audio_s = sum(map(segment_length, segments)) / SAMPLING_RATE
+    results = {"n_segments": len(segments), "audio_s": audio_s}
+    transcripts = {}
+    for label, quantise in [("fp32", False), ("int8", True)]:
+        # Load (and for int8, convert or reload) the model before timing inference
+        model_registry.prewarm(model_to_load, device="cpu", quantise=quantise)
+        t0 = perf_counter()
+        transcripts[label] = transcribe_batch(
+            segments, model_to_load, device="cpu", quantise=quantise
+        )
+        results[f"{label}_rtf"] = (perf_counter() - t0) / audio_s
+    results["speedup"] = results["fp32_rtf"] / results["int8_rtf"]
+    n_ref_words = [len(ref.split()) for ref in transcripts["fp32"]]
+    word_errors = [
+        word_error_rate(ref, hyp) * n
+        for ref, hyp, n in zip(transcripts["fp32"], transcripts["int8"], n_ref_words)
+    ]
+    results["wer"] = sum(word_errors) / max(sum(n_ref_words), 1)
+    return results
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.strip())
+    parser.add_argument("segments", nargs="*", help="WAVs (default: sample the store)")
+    parser.add_argument("-n", "--sample-size", type=int, default=20)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-m", "--model", default=default_model)
+    args = parser.parse_args(argv)
+    results = compare_quantisation(
+        segments=args.segments or None,
+        model_to_load=args.model,
+        sample_size=args.sample_size,
+        seed=args.seed,
+    )
+    print(
+        f"{results['n_segments']} segments ({results['audio_s']:.1f}s of audio)\n"
+        f"fp32 RTF: {results['fp32_rtf']:.3f}\n"
+        f"int8 RTF: {results['int8_rtf']:.3f} ({results['speedup']:.2f}x speedup)\n"
+        f"int8 WER vs. fp32: {results['wer']:.2%}",
+        file=stderr,
+    )
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+from transformers import Wav2Vec2Config, Wav2Vec2ForCTC, Wav2Vec2Processor
+from collections import OrderedDict
+from threading import RLock
+import torch
+from ..data import _dir_path as data_dir
+from ..share import device as default_device
+
+__all__ = [
+    "default_model",
+    "quantised_model_dir",
+    "quantise_model",
+    "ModelRegistry",
+    "model_registry",
+    "get_processor_and_model",
+    "prewarm_models",
+    "evict_models",
+]
+
+default_model = "facebook/wav2vec2-large-robust-ft-libri-960h"
+quantised_model_dir = data_dir / "models" / "quantised"
+
+
+def quantise_model(model):
+    """
+    Dynamically quantise the linear layers of `model` to int8 (weights are stored
+    as int8, activations quantised on the fly), for faster CPU inference.
+
+    Parametrisations (the weight norm on the positional convolution) are baked
+    into plain weights first, which is equivalent at inference time and gives the
+    quantised model a state dict that does not depend on the original weights.
+    """
+    from torch.ao.quantization import quantize_dynamic
+    from torch.nn.utils import parametrize
+    for module in model.modules():
+        if parametrize.is_parametrized(module):
+            for tensor_name in [*module.parametrizations]:
+                parametrize.remove_parametrizations(module, tensor_name)
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def quantised_model_path(model_to_load):
+    cache_name = str(model_to_load).strip("/").replace("/", "--")
+    return quantised_model_dir / f"{cache_name}.qint8.pt"
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of Wav2Vec2 processor/model pairs, keyed by the name of the
+    model to load and the device it is placed on. At most `max_models` pairs are
+    kept resident, and the least recently used pair is evicted to make room for a
+    new one (so switching between a couple of models does not reload weights on
+    every call, but memory stays bounded).
+
+    Models are put in eval mode when loaded: callers are expected to run them
+    under `torch.no_grad()` (as `transcribe_audio_file` does).
+
+    If `quantise` is True, the model is dynamically quantised to int8 (CPU only).
+    The quantised model is saved under `quantised_model_dir` after the first
+    conversion, and loaded from there in future rather than converted again.
+    """
+    def __init__(self, max_models=2):
+        if max_models < 1:
+            raise ValueError(f"{max_models=} must be at least 1")
+        self.max_models = max_models
+        self._entries = OrderedDict()
+        self._lock = RLock()
+
+    @staticmethod
+    def make_key(model_to_load, device=None, quantise=False):
+        if quantise:
+            device = "cpu"
+        return (model_to_load, str(device or default_device), quantise)
+
+    def load(self, model_to_load, device=None, quantise=False):
+        """
+        Load the processor and model from the HuggingFace Hub (or local cache),
+        place the model on `device` (default: `tap.share.device`) in eval mode.
+        """
+        if quantise and device not in (None, "cpu"):
+            raise ValueError(f"Quantised models run on the CPU only (not {device=})")
+        device = device or default_device
+        processor = Wav2Vec2Processor.from_pretrained(model_to_load)
+        if quantise:
+            model = self.load_quantised(model_to_load)
+        else:
+            model = Wav2Vec2ForCTC.from_pretrained(model_to_load).to(device)
+        model.eval()
+        return processor, model
+
+    @staticmethod
+    def load_quantised(model_to_load):
+        """
+        Load the int8 quantised model from its state dict in `quantised_model_dir`
+        into a quantised model built from the config alone (without reading the
+        fp32 weights), or on first use quantise the fp32 model and save it there.
+        """
+        cache_path = quantised_model_path(model_to_load)
+        if cache_path.exists():
+            config = Wav2Vec2Config.from_pretrained(model_to_load)
+            model = quantise_model(Wav2Vec2ForCTC(config).eval())
+            model.load_state_dict(torch.load(cache_path))
+            return model
+        model = quantise_model(Wav2Vec2ForCTC.from_pretrained(model_to_load).eval())
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so an interrupted save never leaves a corrupt cache
+        partial_path = cache_path.with_suffix(".partial")
+        torch.save(model.state_dict(), partial_path)
+        partial_path.replace(cache_path)
+        return model
+
+    def get(self, model_to_load=default_model, device=None, quantise=False):
+        """
+        Return the `(processor, model)` pair for `model_to_load` on `device`,
+        loading it on first use and marking it as most recently used.
+        """
+        key = self.make_key(model_to_load, device, quantise)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            entry = self.load(model_to_load, device=device, quantise=quantise)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_models:
+                self._entries.popitem(last=False)  # drop least recently used
+            return entry
+
+    def prewarm(self, *models_to_load, device=None, quantise=False):
+        """
+        Load each of `models_to_load` (default: `default_model`) ahead of use.
+        """
+        for model_to_load in models_to_load or [default_model]:
+            self.get(model_to_load, device=device, quantise=quantise)
+
+    def evict(self, model_to_load=None, device=None):
+        """
+        Drop `model_to_load` (on `device`, or on any device if `device` is None)
+        from the registry, or drop every entry if `model_to_load` is None.
+        Return the number of entries evicted.
+        """
+        with self._lock:
+            if model_to_load is None:
+                evicted = [*self._entries]
+            elif device is None:
+                evicted = [k for k in self._entries if k[0] == model_to_load]
+            else:
+                evicted = [
+                    k for k in self._entries if k[:2] == (model_to_load, str(device))
+                ]
+            evicted = [k for k in evicted if k in self._entries]
+            for key in evicted:
+                del self._entries[key]
+        return len(evicted)
+
+    def __contains__(self, model_to_load):
+        with self._lock:
+            return any(k[0] == model_to_load for k in self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        loaded = ", ".join(
+            f"{m} ({d}{', int8' if q else ''})" for m, d, q in self._entries
+        )
+        return f"{type(self).__name__}(max_models={self.max_models}, loaded=[{loaded}])"
+
+
+model_registry = ModelRegistry()
+
+
+def get_processor_and_model(model_to_load=default_model, device=None, quantise=False):
+    return model_registry.get(model_to_load, device=device, quantise=quantise)
+
+
+def prewarm_models(*models_to_load, device=None, quantise=False):
+    model_registry.prewarm(*models_to_load, device=device, quantise=quantise)
+
+
+def evict_models(model_to_load=None, device=None):
+    return model_registry.evict(model_to_load, device=device)
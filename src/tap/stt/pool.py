@@ -0,0 +1,98 @@
+import multiprocessing as mp
+import torch
+from .models import default_model, model_registry
+from .batching import transcribe_batch
+
+__all__ = ["TranscriptionPool"]
+
+_worker_model_opts = {}  # The model resident in this worker process
+
+
+def _init_worker(model_to_load, n_threads, quantise):
+    """
+    Pool initialiser: pin this worker's share of torch intra-op threads and load
+    the model into this process's registry once, on the CPU.
+    """
+    torch.set_num_threads(n_threads)
+    model_registry.prewarm(model_to_load, device="cpu", quantise=quantise)
+    _worker_model_opts.update(
+        model_to_load=model_to_load, device="cpu", quantise=quantise
+    )
+
+
+def _transcribe_indexed_segment(indexed_segment):
+    i, segment = indexed_segment
+    [transcription] = transcribe_batch([segment], **_worker_model_opts)
+    return i, transcription
+
+
+class TranscriptionPool:
+    """
+    A pool of `n_workers` processes (default: one per 4 CPU cores) for CPU-only
+    transcription, each holding a resident copy of the `model_to_load` model in its
+    own `model_registry` (loaded once when the worker starts) and using a share of
+    `threads_per_worker` torch threads (default: the cores divided evenly).
+    Pass `quantise=True` for the workers to use the int8 quantised model.
+
+    Segments (paths or arrays of 16 kHz audio) are fed to the workers from a queue
+    as they become free, and the results are reassembled in segment order.
+
+    Use as a context manager, or call `close` when done, to stop the workers.
+    """
+    def __init__(
+        self,
+        n_workers=None,
+        model_to_load=default_model,
+        threads_per_worker=None,
+        quantise=False,
+    ):
+        n_cores = mp.cpu_count()
+        if n_workers is None:
+            n_workers = max(n_cores // 4, 1)
+        if threads_per_worker is None:
+            threads_per_worker = max(n_cores // n_workers, 1)
+        self.n_workers = n_workers
+        self.model_to_load = model_to_load
+        self.threads_per_worker = threads_per_worker
+        self.quantise = quantise
+        # Spawn rather than fork: forking a process with torch threads running is unsafe
+        self._pool = mp.get_context("spawn").Pool(
+            processes=n_workers,
+            initializer=_init_worker,
+            initargs=(model_to_load, threads_per_worker, quantise),
+        )
+
+    def iter_transcriptions(self, segments, ordered=False):
+        """
+        Yield `(index, transcription)` pairs in order of completion (or in the order
+        of `segments` if `ordered`), where `index` is the position of the segment in
+        `segments` (which may be a lazy iterable, consumed as workers become free).
+        """
+        imap = self._pool.imap if ordered else self._pool.imap_unordered
+        yield from imap(_transcribe_indexed_segment, enumerate(segments))
+
+    def transcribe(self, segments, progress=None):
+        """
+        Transcribe `segments` across the workers, returning the transcriptions in
+        the same order as `segments`. If given, `progress` is called with the number
+        of segments done and the total after each one finishes.
+        """
+        transcriptions = [None] * len(segments)
+        for n_done, (i, transcription) in enumerate(self.iter_transcriptions(segments)):
+            transcriptions[i] = transcription
+            if progress:
+                progress(n_done + 1, len(segments))
+        return transcriptions
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self._pool.terminate()
@@ -0,0 +1,134 @@
+import numpy as np
+import soundfile as sf
+import torch
+from .models import default_model, model_registry
+
+__all__ = ["iter_strided_windows", "stream_transcribe"]
+
+SAMPLING_RATE = 16000
+
+
+def iter_strided_windows(
+    audio_file, chunk_frames, left_frames, right_frames, start_frame=0, stop_frame=None,
+):
+    """
+    Read `audio_file` from `start_frame` to `stop_frame` (default: end of track) in
+    consecutive chunks of `chunk_frames`, each extended by up to `left_frames` and
+    `right_frames` of context on either side, yielding a tuple of the mono float32
+    window and the frame offsets `(window_start, chunk_start, chunk_stop)`.
+    Only one window is held in memory at a time.
+    """
+    with sf.SoundFile(audio_file) as track:
+        if track.samplerate != SAMPLING_RATE:
+            raise ValueError(f"{track.samplerate=} (expected {SAMPLING_RATE})")
+        if stop_frame is None or stop_frame > track.frames:
+            stop_frame = track.frames
+        for chunk_start in range(start_frame, stop_frame, chunk_frames):
+            chunk_stop = min(chunk_start + chunk_frames, stop_frame)
+            window_start = max(chunk_start - left_frames, start_frame)
+            window_stop = min(chunk_stop + right_frames, stop_frame)
+            track.seek(window_start)
+            window = track.read(
+                window_stop - window_start, dtype="float32", always_2d=True
+            ).mean(axis=1)
+            yield window, (window_start, chunk_start, chunk_stop)
+
+
+def stream_transcribe(
+    audio_file,
+    model_to_load=default_model,
+    chunk_s=30.0,
+    context_s=5.0,
+    start_time=0.0,
+    stop_time=None,
+    registry=model_registry,
+    quantise=False,
+):
+    """
+    Transcribe an arbitrarily long 16 kHz WAV in windows of `chunk_s` seconds, each
+    given `context_s` seconds of overlapping audio either side so the model sees
+    the words at the window edges in context. Only the logits for the chunk itself
+    (not its context) are kept, so consecutive chunks stitch together at the stride
+    boundaries without duplicated or dropped frames, and CTC decoding continues
+    across the boundary (a character repeated either side of it is collapsed).
+
+    Memory use is bounded by the window size regardless of the length of the audio.
+
+    Yields `(start, stop, text)` as each chunk is decoded, where the text is every
+    complete word ending in the chunk (a word cut by the chunk boundary is carried
+    over to the next) and the times in seconds are relative to `start_time`.
+    """
+    processor, model = registry.get(model_to_load, quantise=quantise)
+    tokeniser = processor.tokenizer
+    ratio = model.config.inputs_to_logits_ratio  # input samples per logit frame
+    # Round the window strides to whole logit frames so the chunks align exactly
+    chunk_frames, context_frames = (
+        max(int(s * SAMPLING_RATE) // ratio, 1) * ratio for s in (chunk_s, context_s)
+    )
+    start_frame = int(start_time * SAMPLING_RATE)
+    stop_frame = None if stop_time is None else int(stop_time * SAMPLING_RATE)
+    min_window = receptive_field(model.config)  # shorter inputs give no logits
+    pending = []  # (character, frame) pairs of the word(s) not yet emitted
+    prev_id = None
+    windows = iter_strided_windows(
+        audio_file,
+        chunk_frames,
+        context_frames,
+        context_frames,
+        start_frame=start_frame,
+        stop_frame=stop_frame,
+    )
+    for window, (window_start, chunk_start, chunk_stop) in windows:
+        if len(window) < min_window:
+            window = np.pad(window, (0, min_window - len(window)))
+        proc = processor(window, return_tensors="pt", sampling_rate=SAMPLING_RATE)
+        with torch.no_grad():
+            logits = model(proc.input_values.to(model.device)).logits[0]
+        predicted_ids = torch.argmax(logits, dim=-1).cpu().numpy()
+        # Keep only the logits within the chunk (ceiling division to frame index)
+        keep_from = -(-(chunk_start - window_start) // ratio)
+        keep_to = -(-(chunk_stop - window_start) // ratio)
+        for j in range(keep_from, min(keep_to, len(predicted_ids))):
+            token_id = int(predicted_ids[j])
+            if token_id != prev_id and token_id != tokeniser.pad_token_id:
+                token = tokeniser.convert_ids_to_tokens(token_id)
+                if token == tokeniser.word_delimiter_token:
+                    token = " "
+                pending.append((token, window_start + j * ratio))
+            prev_id = token_id
+        word_ends = [k for k, (char, _) in enumerate(pending) if char == " "]
+        if word_ends:
+            emit, pending = pending[: word_ends[-1]], pending[word_ends[-1] + 1 :]
+            timed_text = chars_to_timed_text(emit, ratio, start_frame)
+            if timed_text:
+                yield timed_text
+    timed_text = chars_to_timed_text(pending, ratio, start_frame)
+    if timed_text:
+        yield timed_text
+
+
+def receptive_field(config):
+    """
+    Number of input samples spanned by one logit frame of the feature encoder.
+    """
+    field, jump = 1, 1
+    for kernel, stride in zip(config.conv_kernel, config.conv_stride):
+        field += (kernel - 1) * jump
+        jump *= stride
+    return field
+
+
+def chars_to_timed_text(chars, ratio, start_frame):
+    """
+    Join `(character, frame)` pairs into `(start, stop, text)`, with the times in
+    seconds relative to `start_frame`, or return None if there is no text.
+    """
+    text = " ".join("".join(char for char, _ in chars).split())
+    if not text:
+        return None
+    frames = [f for char, f in chars if char != " "]
+    return (
+        (frames[0] - start_frame) / SAMPLING_RATE,
+        (frames[-1] + ratio - start_frame) / SAMPLING_RATE,
+        text,
+    )
@@ -1,24 +1,30 @@
-from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
 import librosa
 import torch
-from glob import glob
+from .models import default_model, model_registry
+
+__all__ = ["transcribe_audio_file"]
 
 
 def transcribe_audio_file(
     audio_file,
     #model_to_load="facebook/wav2vec2-base-960h",
     #model_to_load="facebook/wav2vec2-large-960h-lv60-self",
-    model_to_load="facebook/wav2vec2-large-robust-ft-libri-960h",
+    model_to_load=default_model,
+    registry=model_registry,
+    quantise=False,
 ):
-    # load model and tokenizer
-    #print(f"Using {model_to_load}")
-    processor = Wav2Vec2Processor.from_pretrained(model_to_load)
-    model = Wav2Vec2ForCTC.from_pretrained(model_to_load)
+    """
+    Transcribe a single audio file with the Wav2Vec2 `model_to_load`, taken from
+    `registry` (so the weights are only loaded once per process). Pass `quantise=True`
+    to use the int8 quantised model (CPU only).
+    """
+    processor, model = registry.get(model_to_load, quantise=quantise)
     sr = 16000
     audio_input, _ = librosa.load(audio_file, sr=sr)
     proc = processor(audio_input, return_tensors="pt", padding="longest", sampling_rate=sr)
-    input_values = proc.input_values
-    logits = model(input_values).logits
+    input_values = proc.input_values.to(model.device)
+    with torch.no_grad():
+        logits = model(input_values).logits
     predicted_ids = torch.argmax(logits, dim=-1)
     transcription = processor.batch_decode(predicted_ids)[0]
     return transcription
@@ -0,0 +1,16 @@
+import numpy as np
+from tap.stt.batching import iter_in_order, load_segment_audio, plan_batches
+
+
+def test_iter_in_order_releases_bucketed_results_by_index():
+    lengths = [5, 1, 4, 2, 3, 1]
+    bucketed = [
+        (i, f"t{i}") for batch in plan_batches(lengths, max_batch_samples=4) for i in batch
+    ]
+    assert [i for i, _ in bucketed] != sorted(i for i, _ in bucketed)
+    assert list(iter_in_order(bucketed)) == [(i, f"t{i}") for i in range(len(lengths))]
+
+
+def test_load_segment_audio_scales_int16_pcm():
+    pcm = np.array([-32768, 0, 16384], dtype=np.int16)
+    np.testing.assert_array_equal(load_segment_audio(pcm), [-1.0, 0.0, 0.5])
@@ -0,0 +1,23 @@
+import numpy as np
+import soundfile as sf
+from tap.preproc.segment.envelope import EnergyEnvelope
+
+SR = 16000
+
+
+def test_envelope_is_recomputed_when_its_wav_is_regenerated(tmp_path):
+    wav = tmp_path / "episode.wav"
+    sf.write(wav, np.full(SR * 2, 0.5, dtype=np.float32), SR)
+    first = EnergyEnvelope.load_or_compute(wav)
+    assert len(first.values) == 200
+    assert EnergyEnvelope.load_or_compute(wav).values.filename == first.values.filename
+    sf.write(wav, np.full(SR * 3, 0.25, dtype=np.float32), SR)
+    second = EnergyEnvelope.load_or_compute(wav)
+    assert len(second.values) == 300
+    assert np.allclose(second.values, 0.25, atol=1e-4)
+
+
+def test_peak_of_an_empty_range_is_zero():
+    envelope = EnergyEnvelope(np.ones(100, dtype=np.float32), hop_frames=160, sr=SR)
+    assert envelope.peak(0.5, 0.5) == 0.0
+    assert envelope.peaks([(0.0, 0.5), (2.0, 3.0)]) == [1.0, 0.0]
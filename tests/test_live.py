@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+import tap.stream.live as live
+from tap.stream.live import MIN_TRANSCRIBABLE_FRAMES, LiveTranscription
+
+SR = 16000
+
+
+def fake_transcribe_batch(segments, **transcribe_opts):
+    "Stands in for `transcribe_batch`, raising on audio too short for Wav2Vec2"
+    for segment in segments:
+        if len(segment) < MIN_TRANSCRIBABLE_FRAMES:
+            raise RuntimeError(f"{len(segment)} samples is too short to transcribe")
+    return [f"{len(segment)} samples" for segment in segments]
+
+
+@pytest.fixture
+def transcription(tmp_path, monkeypatch):
+    monkeypatch.setattr(live, "transcribe_batch", fake_transcribe_batch)
+    return LiveTranscription(
+        input_wav=tmp_path / "episode.wav",
+        segment_dir=tmp_path / "segmented",
+        txn_tsv=tmp_path / "segment_times.tsv",
+    )
+
+
+def test_short_final_tail_is_merged_into_the_last_segment(transcription):
+    rng = np.random.default_rng(0)
+    speech = rng.normal(0, 0.2, SR * 8).astype(np.float32)
+    pause = np.zeros(SR // 2, dtype=np.float32)
+    tail = rng.normal(0, 0.2, 300).astype(np.float32)  # under 2 hops past the cut
+    audio = np.concatenate([speech, pause, speech, pause, tail])
+    for block in np.array_split(audio, 20):
+        transcription.feed(block)
+    assert transcription.n_segments == 2 and len(transcription._tail) < 400
+    table = transcription.close()
+    assert len(table) == 2
+    assert table.stop.iloc[-1] == len(audio) / SR
+    assert table.start.iloc[1] == table.stop.iloc[0]
+    stored = pd.read_csv(transcription.txn_tsv, sep="\t")
+    np.testing.assert_array_equal(stored.stop, table.stop)
+    transcripts = transcription.transcript_store.read().transcript.tolist()
+    last_length = round((table.stop.iloc[-1] - table.start.iloc[-1]) * SR)
+    assert transcripts[-1] == f"{last_length} samples"
+    assert len(transcripts) == 2
+
+
+def test_stream_shorter_than_a_segment_is_still_emitted(transcription):
+    transcription.feed(np.random.default_rng(1).normal(0, 0.2, SR).astype(np.float32))
+    table = transcription.close()
+    assert len(table) == 1 and table.stop.iloc[0] == 1.0
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from tap.preproc.segment.naiveseg import estimate_pauses, estimate_pauses_single_pass
+
+SR = 16000
+
+
+@pytest.fixture(scope="module")
+def episode_wav(tmp_path_factory):
+    """
+    A stereo 16-bit WAV (like an episode) of noise with quiet gaps of varying depth
+    and length, so the estimators have pauses to find and ties to break.
+    """
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 0.2, (SR * 450, 2))
+    for start in rng.uniform(1, 448, 120):
+        length = rng.uniform(0.2, 1.0)
+        audio[int(start * SR) : int((start + length) * SR)] *= rng.uniform(0.001, 0.2)
+    wav = tmp_path_factory.mktemp("episode") / "episode.wav"
+    sf.write(wav, np.clip(audio, -1, 1), SR, subtype="PCM_16")
+    return wav
+
+
+@pytest.mark.parametrize(
+    "start, stop, min_s, max_s",
+    [(0.0, 150.0, 5.0, 20.0), (150.0, 300.0, 5.0, 50.0), (300.0, 450.0, 10.0, 30.0)],
+)
+def test_single_pass_matches_estimate_pauses(episode_wav, start, stop, min_s, max_s):
+    output_wav = episode_wav.parent / "segmented" / "episode_1.wav"
+    expected = estimate_pauses(episode_wav, output_wav, start, stop, min_s, max_s)
+    result = estimate_pauses_single_pass(episode_wav, output_wav, start, stop, min_s, max_s)
+    assert len(expected) > 2  # the section was split
+    assert result == expected
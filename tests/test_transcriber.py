@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+from time import sleep
+import numpy as np
+import pandas as pd
+import pytest
+import soundfile as sf
+import tap.stream.transcriber as transcriber
+from tap.stream.transcriber import StreamTranscriberMixIn
+
+
+class ShuffledPool:
+    "Stands in for `TranscriptionPool`, completing the segments in reverse order"
+    def __init__(self, **pool_opts):
+        pass
+
+    def iter_transcriptions(self, segments, ordered=False):
+        yield from reversed([(i, f"segment {i}") for i in range(len(segments))])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def test_pooled_transcripts_are_stored_in_segment_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcriber, "TranscriptionPool", ShuffledPool)
+    segment_dir = tmp_path / "segmented"
+    segment_dir.mkdir()
+    starts = np.arange(12) * 5.0
+    outputs = [segment_dir / f"episode_{i:02}.wav" for i in range(len(starts))]
+    for output in outputs:
+        sf.write(output, np.zeros(16000, dtype=np.float32), 16000)
+    stream = StreamTranscriberMixIn.__new__(StreamTranscriberMixIn)
+    stream._source = SimpleNamespace(episode_dir=tmp_path)
+    stream.index_for_search = False
+    stream.segment_dir = segment_dir
+    stream.transcript_timings = pd.DataFrame(
+        {"output": outputs, "start": starts, "stop": starts + 5}
+    )
+    stream.transcribe(n_workers=2)
+    index = stream.transcript_store.read()
+    assert index.start.is_monotonic_increasing
+    assert index.offset.is_monotonic_increasing
+    assert index.transcript.tolist() == [f"segment {i}" for i in range(len(starts))]
+
+
+def test_failed_transcription_stops_the_segmentation_early(tmp_path, monkeypatch):
+    n_published = 0
+
+    def preprocess(on_segment, **preproc_opts):
+        "Stands in for `preprocess`, publishing a segment every 10 ms"
+        nonlocal n_published
+        for i in range(500):
+            on_segment((tmp_path / f"episode_{i:03}.wav", i * 5.0, i * 5.0 + 5))
+            n_published += 1
+            sleep(0.01)
+
+    def failing_transcriptions(segment_queue, model_to_load, **transcribe_opts):
+        segment_queue.get()
+        yield 0, "segment 0"
+        raise RuntimeError("Out of memory")
+
+    monkeypatch.setattr(transcriber, "iter_queued_transcriptions", failing_transcriptions)
+    stream = StreamTranscriberMixIn.__new__(StreamTranscriberMixIn)
+    stream._source = SimpleNamespace(episode_dir=tmp_path)
+    stream.index_for_search = False
+    stream.preprocess = preprocess
+    with pytest.raises(RuntimeError, match="Out of memory"):
+        stream.preprocess_and_transcribe(virtual=False)
+    assert n_published < 100
+    assert not stream.transcript_store.exists
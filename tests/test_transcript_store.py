@@ -0,0 +1,30 @@
+import pytest
+from tap.stream.transcript_store import TranscriptStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TranscriptStore(tmp_path)
+    store.append(["a", "b"], ["old one", "old two"], starts=[0, 5], stops=[5, 10])
+    return store
+
+
+def test_replacement_replaces_on_success(store):
+    with store.replacement() as partial:
+        with partial.writer() as writer:
+            writer.add("a", "new one", 0, 4)
+    assert store.read().transcript.tolist() == ["new one"]
+    assert sorted(p.name for p in store.store_dir.iterdir()) == [
+        "transcripts.tsv",
+        "transcripts.txt",
+    ]
+
+
+def test_replacement_keeps_old_transcripts_on_failure(store):
+    with pytest.raises(RuntimeError):
+        with store.replacement() as partial:
+            with partial.writer(flush_every=1) as writer:
+                writer.add("a", "new one", 0, 4)
+            raise RuntimeError("transcription failed")
+    assert store.read().transcript.tolist() == ["old one", "old two"]
+    assert not partial.text_path.exists() and not partial.exists